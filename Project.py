@@ -1,10 +1,47 @@
 import tkinter as tk  # 'tkinter' is a standard GUI toolkit in Python.
-from tkinter import ttk, messagebox  # 'ttk' is a themed widget set for tkinter.
+from tkinter import ttk, messagebox, filedialog  # 'ttk' is a themed widget set for tkinter.
 import psycopg2 as pg  # 'psycopg2' is used to connect to PostgreSQL databases with Python.
 import pandas as pd  # 'pandas' is a data manipulation and analysis library.
 import numpy as np  # 'numpy' is a library for numerical computations in Python.
 import matplotlib.pyplot as plt  # 'matplotlib' is a plotting library for Python.
 import datetime  # 'datetime' is a module for manipulating dates and times.
+import logging  # 'logging' is used to record query errors and slow queries.
+import base64  # 'base64' is used to hand rendered PNG charts to Tk.
+
+from academic_calendar import append_event
+from bug_dedup import (
+    create_bug_dedup,
+    fetch_cluster_reports,
+    fetch_clusters,
+    ingest_bug,
+    set_cluster_status,
+)
+from charts import draw_distribution
+from columnar import fetch_arrays
+from course_statistics import create_course_statistics, fetch_course_statistics, stddev
+from feedback_rollups import PAGE_SIZE, create_feedback_rollups, fetch_comments, fetch_rollups
+from local_replica import REPLICATED_TABLES, open_replica
+from marks_grid import MARK_COLUMNS, MarksGrid, current_marks, describe_conflicts, load_marks, save_marks
+from notifications import Dispatcher, create_notifications, enqueue_grade_notifications, fetch_notifications, mark_read
+from plot_renderer import PlotRenderer
+from provision_users import PROFILE_TABLES, provision_roster, read_roster, write_report
+from query_metrics import TracingCursor, configure_from_env, metrics, timed_operation
+from rechecking import (
+    CLAIM_TIMEOUT,
+    ClaimLostError,
+    claim_requests,
+    decide_request,
+    format_seconds,
+    held_requests,
+    queue_stats,
+    release_requests,
+)
+from registration import register_batch
+from results_changes import create_results_changes, describe_change, marks_history, set_actor
+from transactions import current_unit, unit_of_work
+from ui_profiler import install_from_env, profiling_requested
+
+logger = logging.getLogger("lms")
 
 df = pd.DataFrame()
 
@@ -16,18 +53,27 @@ DB_HOST = "localhost"
 DB_Port = "5432"
 
 
+def open_connection():
+    """Connect to the PostgreSQL database and return the connection and cursor.
+
+    Raises on failure instead of showing a dialog, so it is safe to call from
+    background threads.
+    """
+    conn = pg.connect(
+        database=DB_Name,
+        user=DB_USER,
+        password=DB_Password,
+        host=DB_HOST,
+        port=DB_Port,
+        cursor_factory=TracingCursor,  # Records timing for every statement
+    )
+    return conn, conn.cursor()
+
+
 def connect_db():
     """Connect to the PostgreSQL database and return the connection and cursor."""
     try:
-        conn = pg.connect(
-            database=DB_Name,
-            user=DB_USER,
-            password=DB_Password,
-            host=DB_HOST,
-            port=DB_Port,
-        )
-        cursor = conn.cursor()
-        return conn, cursor
+        return open_connection()
     except Exception as e:
         messagebox.showerror(
             "Database Error", f"Failed to connect to the database: {e}"
@@ -53,6 +99,9 @@ def execute_query(conn, cursor, query, params=None, fetch=False):
 
     This function handles both SELECT and non-SELECT queries. If 'fetch' is True, it fetches the results.
 
+    Inside a unit_of_work the commit is left to the unit, and errors are raised
+    so that the whole unit rolls back.
+
     Args:
         conn : The database connection object.
         cursor : The database cursor object.
@@ -62,18 +111,30 @@ def execute_query(conn, cursor, query, params=None, fetch=False):
     Returns:
         _type_: The result of the query if 'fetch' is True, otherwise None.
     """
+    unit = current_unit(conn)
     try:
         cursor.execute(query, params)
-        conn.commit()
+        if unit:
+            unit.statements += 1
+            metrics.increment("db_commits_deferred")
+        else:
+            conn.commit()
+            metrics.increment("db_commits")
         if fetch:
             return cursor.fetchall()
         return True
     except Exception as e:
+        if unit:
+            logger.error("Error executing query: %s", e)
+            raise
         conn.rollback()
+        metrics.increment("db_rollbacks")
+        logger.error("Error executing query: %s", e)
         messagebox.showerror("Query Error", f"Error executing query: {e}")
         return False
 
 
+@timed_operation("absolute_grading")
 def absolute_grading(conn, cursor, course_id):
     query = """ UPDATE Results
     SET Grade = CASE
@@ -85,88 +146,75 @@ def absolute_grading(conn, cursor, course_id):
     END
     WHERE course_id = %s
     """
-    if execute_query(conn, cursor, query, (course_id,)):
-        messagebox.showinfo("Grading", "Absolute grading applied successfully.")
+    try:
+        # Students are notified through the outbox, written in the grading
+        # transaction so that a notification exists exactly when its grade does.
+        with unit_of_work(conn):
+            execute_query(conn, cursor, query, (course_id,))
+            enqueue_grade_notifications(cursor, course_id)
+    except Exception as e:
+        messagebox.showerror("Grading Error", f"Error in absolute grading: {e}")
+        return
+    messagebox.showinfo("Grading", "Absolute grading applied successfully.")
 
 
+@timed_operation("relative_grading")
 def relative_grading(conn, cursor, course_id):
     try:
-        # Count how many marks entries exist for this course
-        cursor.execute(
-            "SELECT COUNT(*) FROM Results WHERE course_id = %s AND total_marks IS NOT NULL;",
-            (course_id,),
-        )
-        count = cursor.fetchone()[0]
-
-        if count < 2:
-            messagebox.showwarning(
-                "Grading Skipped",
-                "Not enough students with marks to apply relative grading (need at least 2).",
-            )
-            return
-
-        # Now calculate mean and stddev
-        cursor.execute(
-            "SELECT AVG(total_marks), STDDEV(total_marks) FROM Results WHERE course_id = %s;",
-            (course_id,),
-        )
-        result = cursor.fetchone()
-
-        if result and result[0] is not None and result[1] is not None:
-            mean, stddev = result
-            query = """
-                UPDATE Results
-                SET grade = CASE
-                    WHEN total_marks >= %s + 1 * %s THEN 'A'
-                    WHEN total_marks >= %s + 0.5 * %s THEN 'B'
-                    WHEN total_marks >= %s - 0.5 * %s THEN 'C'
-                    WHEN total_marks >= %s - 1 * %s THEN 'D'
-                    ELSE 'F'
-                END
-                WHERE course_id = %s
-            """
-            params = (mean, stddev, mean, stddev, mean, stddev, mean, stddev, course_id)
-            if execute_query(conn, cursor, query, params):
-                messagebox.showinfo("Grading", "Relative grading applied successfully.")
-        else:
-            messagebox.showerror(
-                "Grading Error", "Could not calculate mean and standard deviation."
-            )
+        # The statistics read and the grade update are one transaction, so the
+        # grades always come from the figures they were computed against.
+        with unit_of_work(conn):
+            # course_statistics is kept current by triggers on Results.
+            statistics = fetch_course_statistics(cursor, [course_id]).get(course_id)
+            count = statistics["count"] if statistics else 0
+            if count >= 2:
+                mean, std_dev = statistics["mean"], stddev(statistics)
+                query = """
+                    UPDATE Results
+                    SET grade = CASE
+                        WHEN total_marks >= %s + 1 * %s THEN 'A'
+                        WHEN total_marks >= %s + 0.5 * %s THEN 'B'
+                        WHEN total_marks >= %s - 0.5 * %s THEN 'C'
+                        WHEN total_marks >= %s - 1 * %s THEN 'D'
+                        ELSE 'F'
+                    END
+                    WHERE course_id = %s
+                """
+                params = (mean, std_dev, mean, std_dev, mean, std_dev, mean, std_dev, course_id)
+                execute_query(conn, cursor, query, params)
+                enqueue_grade_notifications(cursor, course_id)
     except Exception as e:
-        conn.rollback()
         messagebox.showerror("Grading Error", f"Error in relative grading: {e}")
+        return
+
+    if count < 2:
+        messagebox.showwarning(
+            "Grading Skipped",
+            "Not enough students with marks to apply relative grading (need at least 2).",
+        )
+    else:
+        messagebox.showinfo("Grading", "Relative grading applied successfully.")
 
 
 def plot_percentage_distribution(conn, cursor, course_id=None):
+    query = "SELECT total_marks FROM Results"
+    params = None
     if course_id:
-        query = "SELECT total_marks FROM Results WHERE course_id = %s;"
-        percentages = execute_query(conn, cursor, query, (course_id,), fetch=True)
-    else:
-        query = "SELECT total_marks FROM Results;"
-        percentages = execute_query(conn, cursor, query, fetch=True)
+        query += " WHERE course_id = %s"
+        params = (course_id,)
+    try:
+        # Fetched straight into a float array, with NULL marks as NaN.
+        with unit_of_work(conn, readonly=True):
+            percentages = fetch_arrays(cursor, query, {"total_marks": "float8"}, params)["total_marks"]
+    except Exception as e:
+        logger.error("Error executing query: %s", e)
+        messagebox.showerror("Query Error", f"Error executing query: {e}")
+        return
 
-    if percentages:
-        data = np.array([p[0] for p in percentages if p[0] is not None])
+    if percentages.size > 0:
+        data = percentages[~np.isnan(percentages)]
         if data.size > 0:
-            mean = np.mean(data)
-            std_dev = np.std(data)
-            plt.hist(
-                data,
-                bins=20,
-                density=True,
-                alpha=0.6,
-                color="skyblue",
-                edgecolor="black",
-            )
-            x = np.linspace(min(data), max(data), 100)
-            y = (1 / (std_dev * np.sqrt(2 * np.pi))) * np.exp(
-                -0.5 * ((x - mean) / std_dev) ** 2
-            )
-            plt.plot(x, y, color="red", linewidth=2)
-            plt.title("Normal Distribution of Total Marks")
-            plt.xlabel("Total Marks")
-            plt.ylabel("Density")
-            plt.grid(True)
+            draw_distribution(plt.gca(), data)
             plt.show()
         else:
             messagebox.showinfo("Plot", "No valid percentage data to plot.")
@@ -174,6 +222,21 @@ def plot_percentage_distribution(conn, cursor, course_id=None):
         messagebox.showinfo("Plot", "No results found to plot.")
 
 
+def course_attendance_summary(conn, cursor, course_id, start_date, end_date):
+    """Return (user_id, name, present, late, absent) per student for a course and date range."""
+    query = """SELECT a.user_id, u.name,
+            COUNT(*) FILTER (WHERE a.status = 'present'),
+            COUNT(*) FILTER (WHERE a.status = 'late'),
+            COUNT(*) FILTER (WHERE a.status = 'absent')
+        FROM Attendance a
+        JOIN Users u ON a.user_id = u.user_id
+        WHERE a.course_id = %s AND a.date BETWEEN %s AND %s
+        GROUP BY a.user_id, u.name
+        ORDER BY u.name
+    """
+    return execute_query(conn, cursor, query, (course_id, start_date, end_date), fetch=True)
+
+
 def insert_record(conn, cursor, table, columns, values):
     placeholders = ", ".join(["%s"] * len(values))
     query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders});"
@@ -193,6 +256,632 @@ def delete_record(conn, cursor, table, condition_column, condition_value):
     return execute_query(conn, cursor, query, (condition_value,))
 
 
+# Views that replace the tables which used to inherit from Users.
+IDENTITY_VIEWS = {"student": "Students", "instructor": "Instructors", "admin": "Admins"}
+
+
+def _is_legacy_identity_table(cursor, name):
+    """Return True if name is one of the old tables that inherit from Users."""
+    cursor.execute(
+        """SELECT 1 FROM pg_inherits i
+           JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = 'users'::regclass AND c.relname = %s""",
+        (name.lower(),),
+    )
+    return cursor.fetchone() is not None
+
+
+def migrate_identity_store(conn, cursor):
+    """Move accounts out of the inherited Students, Instructors and Admins tables.
+
+    Rows are copied into Users plus the matching profile table, and the old
+    child tables are dropped, all in one transaction. Nothing happens if the
+    old tables are gone already. Raises an error, without changing anything,
+    if the old layout let the same email or user_id in twice.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+    """
+    legacy = [
+        (table, PROFILE_TABLES[role][0], ", ".join(PROFILE_TABLES[role][1]))
+        for role, table in IDENTITY_VIEWS.items()
+        if _is_legacy_identity_table(cursor, table)
+    ]
+    if not legacy:
+        conn.commit()
+        return
+
+    try:
+        cursor.execute("LOCK TABLE Users IN ACCESS EXCLUSIVE MODE")
+        for column in ("email", "user_id"):
+            cursor.execute(
+                f"SELECT {column} FROM Users GROUP BY {column} HAVING COUNT(*) > 1 LIMIT 10"
+            )
+            duplicates = [str(row[0]) for row in cursor.fetchall()]
+            if duplicates:
+                raise ValueError(
+                    f"Duplicate {column} values must be fixed first: {', '.join(duplicates)}"
+                )
+
+        for table, profile_table, columns in legacy:
+            cursor.execute(
+                f"""INSERT INTO ONLY Users (user_id, name, email, password, role)
+                SELECT user_id, name, email, password, role FROM ONLY {table}"""
+            )
+            cursor.execute(
+                f"""INSERT INTO {profile_table} (user_id, {columns})
+                SELECT user_id, {columns} FROM ONLY {table}"""
+            )
+            cursor.execute(f"DROP TABLE {table}")
+        conn.commit()
+        logger.info("Migrated %s into Users", ", ".join(t for t, _, _ in legacy))
+    except Exception:
+        conn.rollback()
+        raise
+
+
+ATTENDANCE_MONTHS_AHEAD = 6  # Partitions are kept ready this many months ahead
+
+ATTENDANCE_SCRIPT = """CREATE TABLE Attendance (
+    attendance_id SERIAL,
+    user_id INT NOT NULL,
+    course_id INT NOT NULL,
+    date DATE NOT NULL,
+    status VARCHAR(10) CHECK (status IN ('present', 'absent', 'late')) NOT NULL,
+    PRIMARY KEY (attendance_id, date),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE
+) PARTITION BY RANGE (date);"""
+
+
+def attendance_partition_name(month):
+    return f"attendance_y{month.year}m{month.month:02d}"
+
+
+def _months(first, last):
+    """Yield the first day of every month from first to last, inclusive."""
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def create_attendance_partitions(cursor, first, last):
+    """Create the monthly Attendance partitions covering first to last, without committing.
+
+    A month that already has rows in the default partition, e.g. entered
+    before its partition was prepared, cannot get a partition while those rows
+    are there. The default partition is detached, the rows are moved into the
+    new partition and it is attached again.
+    """
+    cursor.execute("SELECT to_regclass('attendance_default') IS NOT NULL")
+    has_default = cursor.fetchone()[0]
+    for month in _months(first, last):
+        name = attendance_partition_name(month)
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+        if cursor.fetchone()[0]:
+            continue
+        stranded = False
+        if has_default:
+            cursor.execute(
+                "SELECT EXISTS (SELECT 1 FROM attendance_default WHERE date >= %s AND date < %s)",
+                (month, next_month),
+            )
+            stranded = cursor.fetchone()[0]
+        if stranded:
+            cursor.execute("ALTER TABLE Attendance DETACH PARTITION attendance_default")
+        cursor.execute(
+            f"""CREATE TABLE {name}
+            PARTITION OF Attendance FOR VALUES FROM ('{month}') TO ('{next_month}')"""
+        )
+        if stranded:
+            # Both tables have Attendance's columns in Attendance's order.
+            cursor.execute(
+                f"""WITH moved AS (
+                    DELETE FROM attendance_default WHERE date >= %s AND date < %s RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved""",
+                (month, next_month),
+            )
+            logger.info("Moved %d attendance row(s) from attendance_default to %s", cursor.rowcount, name)
+            cursor.execute("ALTER TABLE Attendance ATTACH PARTITION attendance_default DEFAULT")
+    if not has_default:
+        # Catches dates outside the prepared months, e.g. typos far in the past
+        # or dates past the prepared window, until their month is prepared.
+        cursor.execute("CREATE TABLE attendance_default PARTITION OF Attendance DEFAULT")
+
+
+def ensure_attendance_partitions(conn, cursor, months_ahead=ATTENDANCE_MONTHS_AHEAD):
+    """Create monthly Attendance partitions from this month to months_ahead months out."""
+    today = datetime.date.today().replace(day=1)
+    last = today
+    for _ in range(months_ahead):
+        last = (last + datetime.timedelta(days=32)).replace(day=1)
+    try:
+        create_attendance_partitions(cursor, today, last)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def detach_attendance_partition(conn, cursor, year, month, drop=False):
+    """Detach one month of attendance from the Attendance table.
+
+    Detaching only changes the catalog, so it takes the same time however
+    many rows the month holds. The detached table can be archived or dropped.
+
+    Returns:
+        str: The name of the detached table.
+    """
+    name = attendance_partition_name(datetime.date(year, month, 1))
+    try:
+        cursor.execute(f"ALTER TABLE Attendance DETACH PARTITION {name}")
+        if drop:
+            cursor.execute(f"DROP TABLE {name}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return name
+
+
+def partition_attendance(conn, cursor):
+    """Create the partitioned Attendance table, converting an old plain table if needed."""
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('attendance')")
+    row = cursor.fetchone()
+    try:
+        if row is None:
+            cursor.execute(ATTENDANCE_SCRIPT)
+        elif row[0] == "r":
+            cursor.execute("LOCK TABLE Attendance IN ACCESS EXCLUSIVE MODE")
+            cursor.execute("ALTER TABLE Attendance RENAME TO attendance_unpartitioned")
+            cursor.execute(ATTENDANCE_SCRIPT)
+            cursor.execute("SELECT MIN(date), MAX(date) FROM attendance_unpartitioned")
+            first, last = cursor.fetchone()
+            if first:
+                create_attendance_partitions(cursor, first, last)
+            else:
+                create_attendance_partitions(cursor, datetime.date.today(), datetime.date.today())
+            cursor.execute(
+                """INSERT INTO Attendance (attendance_id, user_id, course_id, date, status)
+                SELECT attendance_id, user_id, course_id, date, status FROM attendance_unpartitioned"""
+            )
+            cursor.execute(
+                """SELECT setval(pg_get_serial_sequence('attendance', 'attendance_id'),
+                    COALESCE((SELECT MAX(attendance_id) FROM Attendance), 0) + 1, false)"""
+            )
+            cursor.execute("DROP TABLE attendance_unpartitioned")
+            logger.info("Converted Attendance to a partitioned table")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    ensure_attendance_partitions(conn, cursor)
+
+
+CALENDAR_UPCOMING_DAYS = 30
+
+# How often the distribution screen checks whether its chart is ready.
+PLOT_POLL_MS = 50
+
+# view_calendar choice -> view or table to read from
+CALENDAR_RANGES = {
+    f"Next {CALENDAR_UPCOMING_DAYS} days": "upcoming_calendar_events",
+    "This term": "term_calendar_events",
+    "All events": "academic_calendar",
+}
+
+
+def calendar_range_bounds(view, today=None):
+    """Return the (start, end) dates a calendar view covers, end exclusive. None means unbounded."""
+    today = today or datetime.date.today()
+    if view == "upcoming_calendar_events":
+        return today, today + datetime.timedelta(days=CALENDAR_UPCOMING_DAYS)
+    if view == "term_calendar_events":
+        if today.month <= 6:
+            return datetime.date(today.year, 1, 1), datetime.date(today.year, 7, 1)
+        return datetime.date(today.year, 7, 1), datetime.date(today.year + 1, 1, 1)
+    return None, None
+
+
+def create_tables(conn, cursor):
+    """Create the LMS tables if they do not already exist.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+    """
+    user_script = """CREATE TABLE IF NOT EXISTS Users (
+        user_id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        email VARCHAR(100) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        role VARCHAR(20) NOT NULL CHECK (role IN ('student', 'instructor', 'admin'))
+    );"""
+    execute_query(conn, cursor, user_script)
+
+    # Every account lives in Users so that the UNIQUE index on email covers
+    # all of them; role specific columns are kept in side tables.
+    student_script = """CREATE TABLE IF NOT EXISTS StudentProfiles (
+        user_id INT PRIMARY KEY REFERENCES Users(user_id) ON DELETE CASCADE,
+        program VARCHAR(50),
+        semester INT
+    );"""
+    execute_query(conn, cursor, student_script)
+
+    instructor_script = """CREATE TABLE IF NOT EXISTS InstructorProfiles (
+        user_id INT PRIMARY KEY REFERENCES Users(user_id) ON DELETE CASCADE,
+        department VARCHAR(100),
+        designation VARCHAR(50)
+    );"""
+    execute_query(conn, cursor, instructor_script)
+
+    admin_script = """CREATE TABLE IF NOT EXISTS AdminProfiles (
+        user_id INT PRIMARY KEY REFERENCES Users(user_id) ON DELETE CASCADE,
+        role_description TEXT
+    );"""
+    execute_query(conn, cursor, admin_script)
+
+    try:
+        migrate_identity_store(conn, cursor)
+    except Exception as e:
+        logger.error("Identity store migration failed: %s", e)
+        messagebox.showerror("Migration Error", f"Could not migrate user accounts: {e}")
+
+    # Students, Instructors and Admins used to be tables inheriting from Users.
+    # They are kept as views so existing reports keep working.
+    for role, view in IDENTITY_VIEWS.items():
+        if not _is_legacy_identity_table(cursor, view):
+            profile_table, columns = PROFILE_TABLES[role]
+            view_script = f"""CREATE OR REPLACE VIEW {view} AS
+                SELECT u.user_id, u.name, u.email, u.password, u.role,
+                       {", ".join("p." + column for column in columns)}
+                FROM Users u
+                LEFT JOIN {profile_table} p ON p.user_id = u.user_id
+                WHERE u.role = '{role}';"""
+            execute_query(conn, cursor, view_script)
+
+    courses_script = """CREATE TABLE IF NOT EXISTS Courses (
+        course_id SERIAL PRIMARY KEY NOT NULL,
+        title VARCHAR(100) NOT NULL,
+        credit_hours INT NOT NULL CHECK (credit_hours BETWEEN 1 AND 4),
+        instructor_id INT,
+        semester VARCHAR(20),
+        FOREIGN KEY (instructor_id) REFERENCES Users(user_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, courses_script)
+
+    course_prerequisite_script = """CREATE TABLE IF NOT EXISTS CoursePrerequisites (
+        course_id INT NOT NULL,
+        prerequisite_id INT NOT NULL,
+        PRIMARY KEY (course_id, prerequisite_id),
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE,
+        FOREIGN KEY (prerequisite_id) REFERENCES Courses(course_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, course_prerequisite_script)
+
+    # Version counters that let in-process caches check cheaply whether a table changed.
+    cache_versions_script = """CREATE TABLE IF NOT EXISTS cache_versions (
+        name VARCHAR(50) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    );"""
+    execute_query(conn, cursor, cache_versions_script)
+    bump_version_script = """CREATE OR REPLACE FUNCTION bump_cache_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO cache_versions (name, version) VALUES (TG_ARGV[0], 1)
+        ON CONFLICT (name) DO UPDATE SET version = cache_versions.version + 1;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;"""
+    execute_query(conn, cursor, bump_version_script)
+    execute_query(conn, cursor, "DROP TRIGGER IF EXISTS prerequisites_version ON CoursePrerequisites")
+    execute_query(
+        conn,
+        cursor,
+        """CREATE TRIGGER prerequisites_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON CoursePrerequisites
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_version('course_prerequisites')""",
+    )
+
+    registration_script = """CREATE TABLE IF NOT EXISTS Registrations (
+        registration_id SERIAL PRIMARY KEY,
+        user_id INT NOT NULL,
+        course_id INT NOT NULL,
+        status VARCHAR(20) DEFAULT 'enrolled',
+        semester VARCHAR(20),
+        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE,
+        CHECK (
+            (semester = '1' AND status = 'enrolled') OR
+            (semester <> '1' AND status IN ('enrolled', 'completed', 'dropped'))
+        )
+    );"""
+    execute_query(conn, cursor, registration_script)
+    # NULL capacity means the course has no seat limit.
+    execute_query(conn, cursor, "ALTER TABLE Courses ADD COLUMN IF NOT EXISTS capacity INT CHECK (capacity >= 0)")
+    execute_query(
+        conn,
+        cursor,
+        """CREATE UNIQUE INDEX IF NOT EXISTS registrations_active_idx
+        ON Registrations (user_id, course_id, semester) WHERE status <> 'dropped'""",
+    )
+    execute_query(
+        conn, cursor, "CREATE INDEX IF NOT EXISTS registrations_course_idx ON Registrations (course_id, semester, status)"
+    )
+
+    registration_request_script = """CREATE TABLE IF NOT EXISTS registration_requests (
+        request_id BIGSERIAL PRIMARY KEY,
+        user_id INT NOT NULL,
+        course_id INT NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'enrolled', 'rejected')),
+        reason TEXT,
+        requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        processed_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, registration_request_script)
+    execute_query(
+        conn,
+        cursor,
+        """CREATE INDEX IF NOT EXISTS registration_requests_pending_idx
+        ON registration_requests (course_id, request_id) WHERE status = 'pending'""",
+    )
+
+    result_script = """CREATE TABLE IF NOT EXISTS Results (
+        result_id SERIAL PRIMARY KEY,
+        user_id INT NOT NULL,
+        course_id INT NOT NULL,
+        quiz1 FLOAT DEFAULT 0,
+        quiz2 FLOAT DEFAULT 0,
+        midterm FLOAT DEFAULT 0,
+        final FLOAT DEFAULT 0,
+        total_marks FLOAT DEFAULT 0,
+        grade VARCHAR(2),
+        UNIQUE (user_id, course_id),
+        FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, result_script)
+    execute_query(conn, cursor, "CREATE INDEX IF NOT EXISTS results_course_idx ON Results (course_id)")
+    # version moves whenever a row's marks change, so marks writers can
+    # compare-and-swap on it instead of locking rows while someone types.
+    execute_query(conn, cursor, "ALTER TABLE Results ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 0")
+    results_version_script = """CREATE OR REPLACE FUNCTION bump_results_version() RETURNS trigger AS $$
+    BEGIN
+        IF (NEW.quiz1, NEW.quiz2, NEW.midterm, NEW.final, NEW.total_marks)
+            IS DISTINCT FROM (OLD.quiz1, OLD.quiz2, OLD.midterm, OLD.final, OLD.total_marks) THEN
+            NEW.version := OLD.version + 1;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;"""
+    execute_query(conn, cursor, results_version_script)
+    execute_query(conn, cursor, "DROP TRIGGER IF EXISTS results_version ON Results")
+    execute_query(
+        conn,
+        cursor,
+        """CREATE TRIGGER results_version BEFORE UPDATE ON Results
+        FOR EACH ROW EXECUTE FUNCTION bump_results_version()""",
+    )
+    try:
+        create_results_changes(conn, cursor)
+    except Exception as e:
+        logger.error("Results change log setup failed: %s", e)
+        messagebox.showerror("Migration Error", f"Could not set up the Results change log: {e}")
+    try:
+        create_notifications(conn, cursor)
+    except Exception as e:
+        logger.error("Notification outbox setup failed: %s", e)
+        messagebox.showerror("Migration Error", f"Could not set up notifications: {e}")
+    try:
+        create_course_statistics(conn, cursor)
+    except Exception as e:
+        logger.error("Course statistics setup failed: %s", e)
+        messagebox.showerror("Migration Error", f"Could not set up course statistics: {e}")
+
+    # Attendance is range partitioned by month so each term's inserts and
+    # scans only touch that term's partitions, and old months can be detached.
+    try:
+        partition_attendance(conn, cursor)
+    except Exception as e:
+        logger.error("Attendance partitioning failed: %s", e)
+        messagebox.showerror("Migration Error", f"Could not partition Attendance: {e}")
+    execute_query(
+        conn,
+        cursor,
+        "CREATE INDEX IF NOT EXISTS attendance_user_date_idx ON Attendance (user_id, date);",
+    )
+    execute_query(
+        conn,
+        cursor,
+        "CREATE INDEX IF NOT EXISTS attendance_course_date_idx ON Attendance (course_id, date);",
+    )
+
+    bugs_script = """CREATE TABLE IF NOT EXISTS bug (
+        bug_id SERIAL PRIMARY KEY,
+        sender_id INT NOT NULL,
+        Description TEXT NOT NULL,
+        status VARCHAR(10) CHECK (status IN ('open', 'in_progress', 'closed')) NOT NULL,
+        Time TIMESTAMP,
+        FOREIGN KEY (sender_id) REFERENCES Users(user_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, bugs_script)
+    try:
+        create_bug_dedup(conn, cursor)
+    except Exception as e:
+        logger.error("Bug report clustering setup failed: %s", e)
+        messagebox.showerror("Migration Error", f"Could not set up bug report clustering: {e}")
+
+    rechecking_script = """CREATE TABLE IF NOT EXISTS rechecking (
+        recheck_id SERIAL PRIMARY KEY,
+        sender_id INT NOT NULL,
+        course_id INT NOT NULL,
+        reason TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        exam_type VARCHAR(20) CHECK (exam_type IN ('quiz', 'mid term', 'final')) NOT NULL,
+        status VARCHAR(10) CHECK (status IN ('pending', 'approved', 'rejected')) NOT NULL,
+        FOREIGN KEY (sender_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, rechecking_script)
+    # Claim and decision columns for the rechecking work queue (rechecking.py).
+    for column in (
+        "claimed_by INT REFERENCES Users(user_id) ON DELETE SET NULL",
+        "claimed_at TIMESTAMP",
+        "decided_by INT REFERENCES Users(user_id) ON DELETE SET NULL",
+        "decided_at TIMESTAMP",
+        "decision_note TEXT",
+    ):
+        execute_query(conn, cursor, f"ALTER TABLE rechecking ADD COLUMN IF NOT EXISTS {column}")
+    execute_query(
+        conn,
+        cursor,
+        """CREATE INDEX IF NOT EXISTS rechecking_pending_idx
+        ON rechecking (course_id, created_at) WHERE status = 'pending'""",
+    )
+    execute_query(
+        conn,
+        cursor,
+        "CREATE INDEX IF NOT EXISTS rechecking_decided_idx ON rechecking (decided_at) WHERE decided_at IS NOT NULL",
+    )
+
+    calendar_script = """CREATE TABLE IF NOT EXISTS academic_calendar (
+        event_id SERIAL PRIMARY KEY,
+        event_name VARCHAR(100) NOT NULL,
+        description TEXT NOT NULL,
+        event_date DATE
+    );"""
+    execute_query(conn, cursor, calendar_script)
+    execute_query(
+        conn, cursor, "CREATE INDEX IF NOT EXISTS academic_calendar_date_idx ON academic_calendar (event_date)"
+    )
+    upcoming_view_script = f"""CREATE OR REPLACE VIEW upcoming_calendar_events AS
+        SELECT event_id, event_name, description, event_date FROM academic_calendar
+        WHERE event_date >= CURRENT_DATE AND event_date < CURRENT_DATE + {CALENDAR_UPCOMING_DAYS}"""
+    execute_query(conn, cursor, upcoming_view_script)
+    # Terms run January-June and July-December.
+    term_view_script = """CREATE OR REPLACE VIEW term_calendar_events AS
+        SELECT event_id, event_name, description, event_date FROM academic_calendar
+        WHERE event_date >= make_date(
+                EXTRACT(YEAR FROM CURRENT_DATE)::int,
+                CASE WHEN EXTRACT(MONTH FROM CURRENT_DATE) <= 6 THEN 1 ELSE 7 END,
+                1)
+            AND event_date < make_date(
+                EXTRACT(YEAR FROM CURRENT_DATE)::int,
+                CASE WHEN EXTRACT(MONTH FROM CURRENT_DATE) <= 6 THEN 1 ELSE 7 END,
+                1) + INTERVAL '6 months'"""
+    execute_query(conn, cursor, term_view_script)
+
+    feedback_script = """CREATE TABLE IF NOT EXISTS feedback (
+        feedback_id SERIAL PRIMARY KEY,
+        sender_id INT NOT NULL,
+        course_id INT NOT NULL,
+        instructor_id INT,
+        rating INT CHECK (rating BETWEEN 1 AND 5),
+        comments TEXT,
+        time TIMESTAMP,
+        FOREIGN KEY (sender_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE,
+        FOREIGN KEY (instructor_id) REFERENCES Users(user_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, feedback_script)
+    try:
+        create_feedback_rollups(conn, cursor)
+    except Exception as e:
+        logger.error("Feedback rollups setup failed: %s", e)
+        messagebox.showerror("Migration Error", f"Could not set up feedback rollups: {e}")
+
+    discussion_script = """CREATE TABLE IF NOT EXISTS DiscussionThreads (
+        thread_id SERIAL PRIMARY KEY,
+        course_id INT NOT NULL,
+        instructor_id INT NOT NULL,
+        message TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        status VARCHAR(20) DEFAULT 'active' CHECK (status IN ('active', 'deleted', 'locked', 'archived')),
+        FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE,
+        FOREIGN KEY (instructor_id) REFERENCES Users(user_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, discussion_script)
+
+    reply_script = """CREATE TABLE IF NOT EXISTS DiscussionReplies (
+        reply_id SERIAL PRIMARY KEY,
+        thread_id INT NOT NULL,
+        sender_id INT NOT NULL,
+        message TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (thread_id) REFERENCES DiscussionThreads(thread_id) ON DELETE CASCADE,
+        FOREIGN KEY (sender_id) REFERENCES Users(user_id) ON DELETE CASCADE
+    );"""
+    execute_query(conn, cursor, reply_script)
+
+    create_change_tracking(conn, cursor)
+
+
+def create_change_tracking(conn, cursor):
+    """Stamp replicated rows with the writing transaction and record deletes.
+
+    The local replica (local_replica.py) uses change_txid and replica_tombstones
+    to fetch only what changed since its last sync.
+    """
+    tombstone_script = """CREATE TABLE IF NOT EXISTS replica_tombstones (
+        tombstone_id BIGSERIAL PRIMARY KEY,
+        table_name VARCHAR(50) NOT NULL,
+        row_id BIGINT NOT NULL,
+        change_txid BIGINT NOT NULL DEFAULT txid_current(),
+        deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );"""
+    execute_query(conn, cursor, tombstone_script)
+    execute_query(
+        conn, cursor, "CREATE INDEX IF NOT EXISTS replica_tombstones_txid_idx ON replica_tombstones (change_txid)"
+    )
+    stamp_script = """CREATE OR REPLACE FUNCTION stamp_change_txid() RETURNS trigger AS $$
+    BEGIN
+        NEW.change_txid := txid_current();
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;"""
+    execute_query(conn, cursor, stamp_script)
+    # The table name is passed in because TG_TABLE_NAME is the partition's name for Attendance.
+    tombstone_function_script = """CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO replica_tombstones (table_name, row_id)
+        VALUES (TG_ARGV[0], (to_jsonb(OLD) ->> TG_ARGV[1])::bigint);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;"""
+    execute_query(conn, cursor, tombstone_function_script)
+
+    for table, key, _, _ in REPLICATED_TABLES.values():
+        name = table.lower()
+        # Existing rows get 0, so a replica's first sync (from 0) copies them all.
+        execute_query(
+            conn, cursor, f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS change_txid BIGINT NOT NULL DEFAULT 0"
+        )
+        if table not in ("Results", "Attendance"):
+            # Results and Attendance are only ever synced per student, through their user_id indexes.
+            execute_query(
+                conn, cursor, f"CREATE INDEX IF NOT EXISTS {name}_change_txid_idx ON {table} (change_txid)"
+            )
+        execute_query(conn, cursor, f"DROP TRIGGER IF EXISTS {name}_stamp_change ON {table}")
+        execute_query(
+            conn,
+            cursor,
+            f"""CREATE TRIGGER {name}_stamp_change BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION stamp_change_txid()""",
+        )
+        execute_query(conn, cursor, f"DROP TRIGGER IF EXISTS {name}_tombstone ON {table}")
+        execute_query(
+            conn,
+            cursor,
+            f"""CREATE TRIGGER {name}_tombstone AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION record_tombstone('{name}', '{key}')""",
+        )
+
+
 class LMSApp:
     def __init__(self, root):
         self.root = root
@@ -201,174 +890,36 @@ class LMSApp:
         if not self.conn:
             return
         self.user = None
+        self.role = None
+        self.replica = None
+        self.plot_renderer = PlotRenderer(open_connection)
         self._execute_code1()
+        self.dispatcher = Dispatcher(open_connection).start()
         self.show_login_menu()
 
     def _execute_code1(self):
-        user_script = """CREATE TABLE IF NOT EXISTS Users (
-            user_id SERIAL PRIMARY KEY,
-            name VARCHAR(100) NOT NULL,
-            email VARCHAR(100) NOT NULL UNIQUE,
-            password VARCHAR(255) NOT NULL,
-            role VARCHAR(20) NOT NULL CHECK (role IN ('student', 'instructor', 'admin'))
-        );"""
-        execute_query(self.conn, self.cursor, user_script)
-
-        student_script = """CREATE TABLE IF NOT EXISTS Students (
-            program VARCHAR(50),
-            semester INT
-        ) INHERITS (Users);"""
-        execute_query(self.conn, self.cursor, student_script)
-
-        instructor_script = """CREATE TABLE IF NOT EXISTS Instructors (
-            department VARCHAR(100),
-            designation VARCHAR(50)
-        ) INHERITS (Users);"""
-        execute_query(self.conn, self.cursor, instructor_script)
-
-        admin_script = """CREATE TABLE IF NOT EXISTS Admins (
-            role_description TEXT
-        ) INHERITS (Users);"""
-        execute_query(self.conn, self.cursor, admin_script)
-
-        courses_script = """CREATE TABLE IF NOT EXISTS Courses (
-            course_id SERIAL PRIMARY KEY NOT NULL,
-            title VARCHAR(100) NOT NULL,
-            credit_hours INT NOT NULL CHECK (credit_hours BETWEEN 1 AND 4),
-            instructor_id INT,
-            semester VARCHAR(20),
-            FOREIGN KEY (instructor_id) REFERENCES Users(user_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, courses_script)
-
-        course_prerequisite_script = """CREATE TABLE IF NOT EXISTS CoursePrerequisites (
-            course_id INT NOT NULL,
-            prerequisite_id INT NOT NULL,
-            PRIMARY KEY (course_id, prerequisite_id),
-            FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE,
-            FOREIGN KEY (prerequisite_id) REFERENCES Courses(course_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, course_prerequisite_script)
-
-        registration_script = """CREATE TABLE IF NOT EXISTS Registrations (
-            registration_id SERIAL PRIMARY KEY,
-            user_id INT NOT NULL,
-            course_id INT NOT NULL,
-            status VARCHAR(20) DEFAULT 'enrolled',
-            semester VARCHAR(20),
-            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
-            FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE,
-            CHECK (
-                (semester = '1' AND status = 'enrolled') OR
-                (semester <> '1' AND status IN ('enrolled', 'completed', 'dropped'))
-            )
-        );"""
-        execute_query(self.conn, self.cursor, registration_script)
-
-        result_script = """CREATE TABLE IF NOT EXISTS Results (
-            result_id SERIAL PRIMARY KEY,
-            user_id INT NOT NULL,
-            course_id INT NOT NULL,
-            quiz1 FLOAT DEFAULT 0,
-            quiz2 FLOAT DEFAULT 0,
-            midterm FLOAT DEFAULT 0,
-            final FLOAT DEFAULT 0,
-            total_marks FLOAT DEFAULT 0,
-            grade VARCHAR(2),
-            UNIQUE (user_id, course_id),
-            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
-            FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, result_script)
-
-        attendance_script = """CREATE TABLE IF NOT EXISTS Attendance (
-            attendance_id SERIAL PRIMARY KEY,
-            user_id INT NOT NULL,
-            course_id INT NOT NULL,
-            date DATE NOT NULL,
-            status VARCHAR(10) CHECK (status IN ('present', 'absent', 'late')) NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
-            FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, attendance_script)
-
-        bugs_script = """CREATE TABLE IF NOT EXISTS bug (
-            bug_id SERIAL PRIMARY KEY,
-            sender_id INT NOT NULL,
-            Description TEXT NOT NULL,
-            status VARCHAR(10) CHECK (status IN ('open', 'in_progress', 'closed')) NOT NULL,
-            Time TIMESTAMP,
-            FOREIGN KEY (sender_id) REFERENCES Users(user_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, bugs_script)
-
-        rechecking_script = """CREATE TABLE IF NOT EXISTS rechecking (
-            recheck_id SERIAL PRIMARY KEY,
-            sender_id INT NOT NULL,
-            course_id INT NOT NULL,
-            reason TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            exam_type VARCHAR(20) CHECK (exam_type IN ('quiz', 'mid term', 'final')) NOT NULL,
-            status VARCHAR(10) CHECK (status IN ('pending', 'approved', 'rejected')) NOT NULL,
-            FOREIGN KEY (sender_id) REFERENCES Users(user_id) ON DELETE CASCADE,
-            FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, rechecking_script)
-
-        calendar_script = """CREATE TABLE IF NOT EXISTS academic_calendar (
-            event_id SERIAL PRIMARY KEY,
-            event_name VARCHAR(100) NOT NULL,
-            description TEXT NOT NULL,
-            event_date DATE
-        );"""
-        execute_query(self.conn, self.cursor, calendar_script)
-
-        feedback_script = """CREATE TABLE IF NOT EXISTS feedback (
-            feedback_id SERIAL PRIMARY KEY,
-            sender_id INT NOT NULL,
-            course_id INT NOT NULL,
-            instructor_id INT,
-            rating INT CHECK (rating BETWEEN 1 AND 5),
-            comments TEXT,
-            time TIMESTAMP,
-            FOREIGN KEY (sender_id) REFERENCES Users(user_id) ON DELETE CASCADE,
-            FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE,
-            FOREIGN KEY (instructor_id) REFERENCES Users(user_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, feedback_script)
+        create_tables(self.conn, self.cursor)
 
+        # Requests someone is reviewing right now are left to them.
         update_rechecking_status_script = """ UPDATE rechecking
         SET status = CASE
                             WHEN status = 'pending' AND CURRENT_TIMESTAMP - created_at > INTERVAL '10 days' THEN 'rejected'
                             WHEN status = 'pending' AND CURRENT_TIMESTAMP - created_at > INTERVAL '7 days' THEN 'approved'
                             ELSE status
-                        END
-        WHERE status = 'pending';
+                        END,
+            decided_at = CURRENT_TIMESTAMP
+        WHERE status = 'pending' AND CURRENT_TIMESTAMP - created_at > INTERVAL '7 days'
+            AND (claimed_by IS NULL OR claimed_at < CURRENT_TIMESTAMP - %s::interval);
         """
-        execute_query(self.conn, self.cursor, update_rechecking_status_script)
-
-        discussion_script = """CREATE TABLE IF NOT EXISTS DiscussionThreads (
-            thread_id SERIAL PRIMARY KEY,
-            course_id INT NOT NULL,
-            instructor_id INT NOT NULL,
-            message TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            status VARCHAR(20) DEFAULT 'active' CHECK (status IN ('active', 'deleted', 'locked', 'archived')),
-            FOREIGN KEY (course_id) REFERENCES Courses(course_id) ON DELETE CASCADE,
-            FOREIGN KEY (instructor_id) REFERENCES Users(user_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, discussion_script)
-
-        reply_script = """CREATE TABLE IF NOT EXISTS DiscussionReplies (
-            reply_id SERIAL PRIMARY KEY,
-            thread_id INT NOT NULL,
-            sender_id INT NOT NULL,
-            message TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (thread_id) REFERENCES DiscussionThreads(thread_id) ON DELETE CASCADE,
-            FOREIGN KEY (sender_id) REFERENCES Users(user_id) ON DELETE CASCADE
-        );"""
-        execute_query(self.conn, self.cursor, reply_script)
+        execute_query(self.conn, self.cursor, update_rechecking_status_script, (CLAIM_TIMEOUT,))
+
+    def student_rows(self, screen, query, params=None, start=None, end=None):
+        """Read a student screen's rows from the local replica if there is one, else from PostgreSQL."""
+        if self.replica:
+            rows = self.replica.read(screen, start, end)
+            if rows is not None:
+                return rows
+        return execute_query(self.conn, self.cursor, query, params, fetch=True)
 
     def clear_window(self):
         for widget in self.root.winfo_children():
@@ -376,6 +927,14 @@ class LMSApp:
 
     def show_login_menu(self):
         self.clear_window()
+        if self.replica:
+            self.replica.close()
+            self.replica = None
+        if self.role:
+            try:
+                set_actor(self.conn, self.cursor, None)
+            except Exception as e:
+                logger.error("Clearing the change log actor failed: %s", e)
 
     # Title label
         title_label = ttk.Label(
@@ -444,6 +1003,12 @@ class LMSApp:
             if self.role not in ["student", "admin", "instructor"]:
                 messagebox.showerror("Login Error", "Invalid role assigned to user.")
                 return
+            if self.role == "student":
+                self.replica = open_replica(self.user_id, open_connection)
+            try:
+                set_actor(self.conn, self.cursor, f"{self.role}:{self.user_id}")
+            except Exception as e:
+                logger.error("Setting the change log actor failed: %s", e)
             messagebox.showinfo("Login Successful", f"Welcome, {self.user_name}!")
             self.show_user_menu()
         else:
@@ -460,8 +1025,10 @@ class LMSApp:
 
             buttons = [
             ("View Courses", self.view_courses),
+            ("Register for Courses", self.register_courses),
             ("View Academic Calendar", self.view_calendar),
             ("View Grades", self.view_grades),
+            ("View Notifications", self.view_notifications),
             ("View Attendance", self.view_attendance),
             ("Request Rechecking", self.request_rechecking),
             ("View Discussion Threads", self.view_discussion_threads),
@@ -478,8 +1045,9 @@ class LMSApp:
             ("Manage Users", self.manage_users),
             ("Manage Courses", self.manage_courses),
             ("View Rechecking Requests", self.view_rechecking_requests),
-            ("View Percentage Distribution", lambda: plot_percentage_distribution(self.conn, self.cursor)),
+            ("View Percentage Distribution", self.view_distribution),
             ("View Feedback", self.view_feedback),
+            ("View Bug Reports", self.view_bug_reports),
             ("Update Academic Calendar", self.insert_calendar_event),
             ("Report a Bug", self.report_bug),
             ("Logout", self.show_login_menu)
@@ -491,11 +1059,13 @@ class LMSApp:
 
             buttons = [
             ("Add Marks", self.add_marks),
+            ("Marks Grid", self.marks_grid),
             ("Apply Grading", self.show_grading_options),
             ("View Rechecking Requests", self.view_rechecking_requests),
-            ("View Percentage Distribution", lambda: plot_percentage_distribution(self.conn, self.cursor)),
+            ("View Percentage Distribution", self.view_distribution),
             ("View Academic Calendar", self.view_calendar),
             ("Update Attendance", self.update_attendance),
+            ("Attendance Report", self.attendance_report),
             ("Create Discussion Thread", self.create_discussion_thread),
             ("View Discussion Threads", self.view_discussion_threads),
             ("Reply to Discussion Thread", self.reply_to_thread),
@@ -576,16 +1146,121 @@ class LMSApp:
             messagebox.showerror("Error", "All fields are required.")
             return
 
+        course_id = course.split("(")[-1].split(")")[0]
         try:
             self.cursor.execute(
-                "INSERT INTO attendance (course_id, student_id, date, status) VALUES (%s, %s, %s, %s)",
-                (course, student_id, date, status),
+                "INSERT INTO Attendance (course_id, user_id, date, status) VALUES (%s, %s, %s, %s)",
+                (course_id, student_id, date, status),
             )
             self.conn.commit()
             messagebox.showinfo("Success", "Attendance updated successfully.")
         except Exception as e:
+            self.conn.rollback()
             messagebox.showerror("Error", f"Failed to update attendance:\n{str(e)}")
 
+    def attendance_report(self):
+        self.clear_window()
+        ttk.Label(self.root, text="Attendance Report", font=("Arial", 16)).pack(pady=20)
+
+        ttk.Label(self.root, text="Course:").pack()
+        course_var = tk.StringVar()
+        course_combobox = ttk.Combobox(self.root, textvariable=course_var)
+        self.populate_course_combobox(course_combobox)
+        course_combobox.pack(pady=5)
+
+        # A bounded date range lets PostgreSQL skip the partitions outside it.
+        today = datetime.date.today()
+        ttk.Label(self.root, text="From (YYYY-MM-DD):").pack()
+        start_var = tk.StringVar(value=str(today - datetime.timedelta(days=120)))
+        ttk.Entry(self.root, textvariable=start_var).pack(pady=5)
+        ttk.Label(self.root, text="To (YYYY-MM-DD):").pack()
+        end_var = tk.StringVar(value=str(today))
+        ttk.Entry(self.root, textvariable=end_var).pack(pady=5)
+
+        results_frame = ttk.Frame(self.root)
+
+        def show_report():
+            for widget in results_frame.winfo_children():
+                widget.destroy()
+            if not course_var.get():
+                messagebox.showerror("Attendance Report", "Please select a course.")
+                return
+            try:
+                start = datetime.datetime.strptime(start_var.get().strip(), "%Y-%m-%d").date()
+                end = datetime.datetime.strptime(end_var.get().strip(), "%Y-%m-%d").date()
+            except ValueError:
+                messagebox.showerror("Attendance Report", "Dates must be in YYYY-MM-DD format.")
+                return
+            course_id = course_var.get().split("(")[-1].split(")")[0]
+            rows = course_attendance_summary(self.conn, self.cursor, course_id, start, end)
+            if rows:
+                for user_id, name, present, late, absent in rows:
+                    ttk.Label(
+                        results_frame,
+                        text=f"ID: {user_id}, Name: {name}, Present: {present}, Late: {late}, Absent: {absent}",
+                    ).pack(pady=2)
+            else:
+                ttk.Label(results_frame, text="No attendance records found.").pack(pady=10)
+
+        ttk.Button(self.root, text="Show Report", command=show_report).pack(pady=10)
+        results_frame.pack(pady=5)
+        ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(pady=10)
+
+    def view_distribution(self):
+        self.clear_window()
+        ttk.Label(self.root, text="Percentage Distribution", font=("Arial", 16)).pack(pady=20)
+
+        all_courses = "All courses"
+        course_var = tk.StringVar(value=all_courses)
+        course_combobox = ttk.Combobox(self.root, textvariable=course_var, state="readonly")
+        self.populate_course_combobox(course_combobox)
+        course_combobox["values"] = (all_courses,) + tuple(course_combobox["values"])
+        course_combobox.pack(pady=5)
+        chart_label = ttk.Label(self.root)
+        chart_label.pack(pady=5)
+        pending = {}
+
+        def display(png):
+            image = tk.PhotoImage(data=base64.b64encode(png))
+            chart_label.configure(image=image, text="")
+            chart_label.image = image  # keep a reference or Tk drops the image
+
+        def check(future):
+            # Ignore charts for a course that is no longer selected, or a screen that is gone.
+            if pending.get("future") is not future or not chart_label.winfo_exists():
+                return
+            if not future.done():
+                self.root.after(PLOT_POLL_MS, check, future)
+                return
+            try:
+                png = future.result()
+            except Exception as e:
+                logger.error("Could not render the distribution chart: %s", e)
+                chart_label.configure(image="", text=f"Could not render the chart: {e}")
+                return
+            if png:
+                display(png)
+            else:
+                chart_label.configure(image="", text="No results found to plot.")
+
+        def show_chart(event=None):
+            choice = course_var.get()
+            if choice == all_courses:
+                course_id, title = None, "Normal Distribution of Total Marks"
+            else:
+                course_id, title = int(choice.split("(")[-1].split(")")[0]), f"Total Marks: {choice}"
+            png = self.plot_renderer.cached(course_id)
+            if png:
+                display(png)
+            else:
+                chart_label.configure(image="", text="Rendering chart...")
+            pending["future"] = self.plot_renderer.submit(course_id, title)
+            self.root.after(PLOT_POLL_MS, check, pending["future"])
+
+        course_combobox.bind("<<ComboboxSelected>>", show_chart)
+        show_chart()
+        ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(pady=10)
+
     def report_bug(self):
         bug_window = tk.Toplevel(self.root)
         bug_window.title("Report a Bug")
@@ -599,9 +1274,18 @@ class LMSApp:
             if description:
                 query = """INSERT INTO bug (sender_id, Description, status, Time)
                     VALUES (%s, %s, 'open', NOW())  -- status is 'open' by default, Time is NOW()
+                    RETURNING bug_id, Time
                 """
                 params = (self.user_id, description)
-                if execute_query(self.conn, self.cursor, query, params):
+                rows = execute_query(self.conn, self.cursor, query, params, fetch=True)
+                if rows:
+                    # Clustering is best effort: the report is already saved, and
+                    # any it misses are picked up by `bug_dedup.py backfill`.
+                    try:
+                        with unit_of_work(self.conn):
+                            ingest_bug(self.cursor, rows[0][0], description, rows[0][1])
+                    except Exception as e:
+                        logger.warning("Clustering bug report %s failed: %s", rows[0][0], e)
                     messagebox.showinfo(
                         "Bug Reported", "Thank you for reporting the bug!"
                     )
@@ -615,6 +1299,91 @@ class LMSApp:
             pady=10
         )
 
+    def view_bug_reports(self):
+        self.clear_window()
+        ttk.Label(self.root, text="Bug Reports", font=("Arial", 16)).pack(pady=10)
+        ttk.Label(self.root, text="Similar reports are grouped. Select a group to see its reports.").pack()
+
+        clusters_tree = ttk.Treeview(
+            self.root, columns=("reports", "open", "first", "last", "description"), show="headings", height=10
+        )
+        for column, heading, width in (
+            ("reports", "Reports", 70),
+            ("open", "Open", 60),
+            ("first", "First Seen", 140),
+            ("last", "Last Seen", 140),
+            ("description", "Description", 380),
+        ):
+            clusters_tree.heading(column, text=heading)
+            clusters_tree.column(column, width=width)
+        clusters_tree.pack(pady=5, padx=10)
+
+        reports_tree = ttk.Treeview(
+            self.root, columns=("id", "sender", "time", "status", "description"), show="headings", height=8
+        )
+        for column, heading, width in (
+            ("id", "ID", 60),
+            ("sender", "Reported By", 140),
+            ("time", "Time", 140),
+            ("status", "Status", 80),
+            ("description", "Description", 370),
+        ):
+            reports_tree.heading(column, text=heading)
+            reports_tree.column(column, width=width)
+        reports_tree.pack(pady=5, padx=10)
+
+        def show_clusters():
+            try:
+                with unit_of_work(self.conn, readonly=True):
+                    clusters = fetch_clusters(self.cursor)
+            except Exception as e:
+                messagebox.showerror("Bug Reports", f"Could not load bug reports: {e}")
+                return
+            clusters_tree.delete(*clusters_tree.get_children())
+            reports_tree.delete(*reports_tree.get_children())
+            for cluster_id, size, first_seen, last_seen, description, open_reports in clusters:
+                clusters_tree.insert(
+                    "",
+                    tk.END,
+                    iid=str(cluster_id),
+                    values=(size, open_reports, first_seen, last_seen, (description or "").replace("\n", " ")),
+                )
+
+        def show_reports(event=None):
+            selected = clusters_tree.selection()
+            if not selected:
+                return
+            try:
+                with unit_of_work(self.conn, readonly=True):
+                    reports = fetch_cluster_reports(self.cursor, int(selected[0]))
+            except Exception as e:
+                messagebox.showerror("Bug Reports", f"Could not load the reports: {e}")
+                return
+            reports_tree.delete(*reports_tree.get_children())
+            for bug_id, sender, time, status, description in reports:
+                reports_tree.insert("", tk.END, values=(bug_id, sender, time, status, description.replace("\n", " ")))
+
+        def close_cluster():
+            selected = clusters_tree.selection()
+            if not selected:
+                messagebox.showerror("Bug Reports", "Select a group first.")
+                return
+            try:
+                changed = set_cluster_status(self.conn, self.cursor, int(selected[0]), "closed")
+            except Exception as e:
+                messagebox.showerror("Bug Reports", f"Could not close the reports: {e}")
+                return
+            messagebox.showinfo("Bug Reports", f"Closed {changed} report(s).")
+            show_clusters()
+
+        clusters_tree.bind("<<TreeviewSelect>>", show_reports)
+        buttons = ttk.Frame(self.root)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="Close All in Group", command=close_cluster).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Refresh", command=show_clusters).pack(side="left", padx=5)
+        ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(pady=5)
+        show_clusters()
+
     def show_registration_form(self):
         self.clear_window()
         title_label = ttk.Label(self.root, text="User Registration", font=("Arial", 14))
@@ -687,25 +1456,20 @@ class LMSApp:
             )
             return
 
-        # Insert new user into the appropriate table based on role
+        # Insert the account into Users and an empty profile for its role
+        if role not in PROFILE_TABLES:
+            messagebox.showerror("Registration Error", "Invalid role selected.")
+            return
         try:
-            if role == "student":
-                insert_user_query = """INSERT INTO Students (name, email, password, role, program, semester)
-                    VALUES (%s, %s, %s, %s, NULL, NULL)
-                """
-            elif role == "instructor":
-                insert_user_query = """INSERT INTO Instructors (name, email, password, role, department, designation)
-                    VALUES (%s, %s, %s, %s, NULL, NULL)
-                """
-            elif role == "admin":
-                insert_user_query = """INSERT INTO Admins (name, email, password, role, role_description)
-                    VALUES (%s, %s, %s, %s, NULL)
-                """
-            else:
-                messagebox.showerror("Registration Error", "Invalid role selected.")
-                return
-
-            self.cursor.execute(insert_user_query, (name, email, password, role))
+            self.cursor.execute(
+                """INSERT INTO Users (name, email, password, role)
+                VALUES (%s, %s, %s, %s) RETURNING user_id""",
+                (name, email, password, role),
+            )
+            user_id = self.cursor.fetchone()[0]
+            self.cursor.execute(
+                f"INSERT INTO {PROFILE_TABLES[role][0]} (user_id) VALUES (%s)", (user_id,)
+            )
             self.conn.commit()
             messagebox.showinfo(
                 "Registration Successful",
@@ -734,6 +1498,11 @@ class LMSApp:
         student_label.pack()
         self.add_marks_student_entry = ttk.Entry(self.root)
         self.add_marks_student_entry.pack(pady=5)
+        # The stored marks are loaded once course and student are chosen, and
+        # their version is what submit_marks compares against.
+        self.add_marks_base = None
+        self.add_marks_course_combobox.bind("<<ComboboxSelected>>", self.load_student_marks)
+        self.add_marks_student_entry.bind("<FocusOut>", self.load_student_marks)
 
         for label_text, attr in [
             ("Quiz 1 Marks:", "quiz1"),
@@ -757,42 +1526,150 @@ class LMSApp:
         )
         back_button.pack(pady=10)
 
+    def _add_marks_target(self):
+        course = self.add_marks_course_var.get()
+        student_id = self.add_marks_student_entry.get().strip()
+        if not course or not student_id.isdigit():
+            return None
+        return int(course.split("(")[-1].split(")")[0]), int(student_id)
+
+    def load_student_marks(self, event=None, fill=True):
+        """Load the stored marks for the chosen course and student into the form."""
+        target = self._add_marks_target()
+        if target is None or (self.add_marks_base and self.add_marks_base[0] == target):
+            return
+        course_id, student_id = target
+        try:
+            with unit_of_work(self.conn, readonly=True):
+                row = current_marks(self.cursor, course_id, [student_id])[student_id]
+        except Exception as e:
+            logger.error("Loading marks failed: %s", e)
+            return
+        self.add_marks_base = (target, row)
+        if fill:
+            for column in MARK_COLUMNS:
+                entry = getattr(self, f"add_marks_{column}_entry")
+                entry.delete(0, tk.END)
+                if row[column] is not None:
+                    entry.insert(0, f"{row[column]:g}")
+
     def submit_marks(self):
-        course_id = self.add_marks_course_var.get().split("(")[-1].split(")")[0]
-        student_id = self.add_marks_student_entry.get()
-        quiz1 = self.add_marks_quiz1_entry.get()
-        quiz2 = self.add_marks_quiz2_entry.get()
-        midterm = self.add_marks_midterm_entry.get()
-        final = self.add_marks_final_entry.get()
-
-        if not (course_id and student_id and quiz1 and quiz2 and midterm and final):
+        target = self._add_marks_target()
+        marks = {column: getattr(self, f"add_marks_{column}_entry").get() for column in MARK_COLUMNS}
+
+        if not (target and all(marks.values())):
             messagebox.showerror("Error", "All fields are required.")
             return
 
         try:
-            quiz1 = float(quiz1)
-            quiz2 = float(quiz2)
-            midterm = float(midterm)
-            final = float(final)
-            total_marks = quiz1 + quiz2 + midterm + final
-
-            query = """INSERT INTO Results (user_id, course_id, quiz1, quiz2, midterm, final, total_marks)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s)
-                   ON CONFLICT (user_id, course_id) DO UPDATE
-                   SET quiz1 = EXCLUDED.quiz1,
-                       quiz2 = EXCLUDED.quiz2,
-                       midterm = EXCLUDED.midterm,
-                       final = EXCLUDED.final,
-                       total_marks = EXCLUDED.total_marks"""
-            params = (student_id, course_id, quiz1, quiz2, midterm, final, total_marks)
-
-            if execute_query(self.conn, self.cursor, query, params):
-                messagebox.showinfo("Success", "Marks submitted successfully.")
-                self.show_user_menu()
-            else:
-                messagebox.showerror("Error", "Failed to submit marks.")
+            marks = {column: float(value) for column, value in marks.items()}
         except ValueError:
             messagebox.showerror("Error", "Marks must be numeric values.")
+            return
+
+        # Without a loaded row, the values typed are compared with what is stored now.
+        self.load_student_marks(fill=False)
+        if not self.add_marks_base:
+            messagebox.showerror("Error", "Failed to submit marks.")
+            return
+        course_id, student_id = target
+        base = self.add_marks_base[1]
+        edits = {column: value for column, value in marks.items() if value != base[column]}
+        try:
+            saved, conflicts = save_marks(
+                self.conn, self.cursor, course_id, {student_id: edits}, {student_id: base}
+            )
+        except Exception as e:
+            logger.error("Submitting marks failed: %s", e)
+            messagebox.showerror("Error", "Failed to submit marks.")
+            return
+
+        if conflicts:
+            keep_mine = messagebox.askyesno(
+                "Marks Changed",
+                "Someone else changed these marks since you loaded them:\n\n"
+                + describe_conflicts(conflicts)
+                + "\n\nOverwrite them with yours? Choose No to load theirs.",
+            )
+            self.add_marks_base = (target, conflicts[0].current)
+            if keep_mine:
+                self.submit_marks()
+            else:
+                self.add_marks_base = None
+                self.load_student_marks()
+            return
+        messagebox.showinfo("Success", "Marks submitted successfully.")
+        self.show_user_menu()
+
+    def marks_grid(self):
+        self.clear_window()
+        ttk.Label(self.root, text="Marks Grid", font=("Arial", 16)).pack(pady=10)
+
+        course_var = tk.StringVar()
+        course_combobox = ttk.Combobox(self.root, textvariable=course_var, state="readonly")
+        self.populate_course_combobox(course_combobox)
+        course_combobox.pack(pady=5)
+        status_var = tk.StringVar(value="Select a course to load its marks.")
+        ttk.Label(self.root, textvariable=status_var).pack(pady=5)
+        grid_frame = ttk.Frame(self.root)
+        grid_frame.pack(fill="both", expand=True, padx=10)
+        state = {"grid": None, "course_id": None}
+
+        def show_pending(count):
+            status_var.set(f"{count} student(s) with unsaved changes." if count else "No unsaved changes.")
+
+        def load(event=None):
+            grid = state["grid"]
+            if grid and grid.pending_count() and not messagebox.askyesno(
+                "Marks Grid", "Discard the unsaved changes?"
+            ):
+                return
+            course_id = int(course_var.get().split("(")[-1].split(")")[0])
+            try:
+                with unit_of_work(self.conn, readonly=True):
+                    rows = load_marks(self.cursor, course_id)
+            except Exception as e:
+                messagebox.showerror("Marks Grid", f"Could not load marks: {e}")
+                return
+            if grid:
+                grid.destroy()
+            state["grid"] = MarksGrid(
+                grid_frame, rows, on_change=show_pending, on_error=lambda message: status_var.set(message)
+            )
+            state["grid"].pack(fill="both", expand=True)
+            state["course_id"] = course_id
+            status_var.set(f"{len(rows)} student(s). Arrows move, Enter or a digit edits, Escape cancels.")
+
+        def save():
+            grid = state["grid"]
+            if not grid or not grid.pending_count():
+                messagebox.showinfo("Marks Grid", "There are no changes to save.")
+                return
+            try:
+                saved, conflicts = save_marks(self.conn, self.cursor, state["course_id"], grid.edits, grid.original)
+            except Exception as e:
+                logger.error("Saving marks failed: %s", e)
+                messagebox.showerror("Marks Grid", f"Failed to save marks: {e}")
+                return
+            grid.saved(saved, conflicts)
+            status_var.set(f"Saved marks for {len(saved)} student(s).")
+            if conflicts:
+                names = {c.user_id: grid.tree.set(str(c.user_id), "name") for c in conflicts}
+                keep_mine = messagebox.askyesno(
+                    "Marks Changed",
+                    "Someone else changed these marks since you loaded them:\n\n"
+                    + describe_conflicts(conflicts, names)
+                    + "\n\nKeep your values? Choose No to take theirs.",
+                )
+                grid.resolve(conflicts, keep_mine)
+                if keep_mine:
+                    status_var.set("Your values are kept. Save again to overwrite theirs.")
+
+        course_combobox.bind("<<ComboboxSelected>>", load)
+        buttons = ttk.Frame(self.root)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="Save Changes", command=save).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Back to Menu", command=self.show_user_menu).pack(side="left", padx=5)
 
     def show_grading_options(self):
         grading_window = tk.Toplevel(self.root)
@@ -847,6 +1724,8 @@ class LMSApp:
 
         # Apply the selected grading method (this updates the grade column)
         grading_function(self.conn, self.cursor, course_id)
+        # Deliver the grade notifications now rather than at the next poll.
+        self.dispatcher.wake()
 
     def view_courses(self):
         self.clear_window()
@@ -855,7 +1734,7 @@ class LMSApp:
             FROM Courses c
             JOIN Users u ON c.instructor_id = u.user_id
         """
-        courses = execute_query(self.conn, self.cursor, query, fetch=True)
+        courses = self.student_rows("view_courses", query)
         if courses:
             for course in courses:
                 course_info = f"Course ID: {course[0]}, Title: {course[1]}, Credits: {course[2]}, Instructor: {course[3]}"
@@ -866,6 +1745,45 @@ class LMSApp:
             pady=10
         )
 
+    def register_courses(self):
+        self.clear_window()
+        ttk.Label(self.root, text="Register for Courses", font=("Arial", 16)).pack(pady=20)
+        query = """SELECT c.course_id, c.title, c.semester, c.capacity,
+                (SELECT COUNT(*) FROM Registrations r
+                 WHERE r.course_id = c.course_id AND r.semester = c.semester AND r.status = 'enrolled')
+            FROM Courses c
+            WHERE NOT EXISTS (
+                SELECT 1 FROM Registrations r
+                WHERE r.user_id = %s AND r.course_id = c.course_id
+                    AND r.semester = c.semester AND r.status <> 'dropped'
+            )
+            ORDER BY c.course_id
+        """
+        courses = execute_query(self.conn, self.cursor, query, (self.user_id,), fetch=True) or []
+        listbox = tk.Listbox(self.root, selectmode=tk.MULTIPLE, width=70, height=12)
+        for course_id, title, semester, capacity, enrolled in courses:
+            seats = "unlimited" if capacity is None else f"{max(capacity - enrolled, 0)} seats left"
+            listbox.insert(tk.END, f"{title} ({course_id}) - Semester {semester}, {seats}")
+        listbox.pack(pady=5)
+
+        def submit():
+            selected = [courses[i][0] for i in listbox.curselection()]
+            if not selected:
+                messagebox.showerror("Error", "Select at least one course.")
+                return
+            results = register_batch(self.conn, self.cursor, [(self.user_id, c) for c in selected])
+            lines = [
+                f"Course {course_id}: {status}" + (f" ({reason})" if reason else "")
+                for _, course_id, status, reason in results
+            ]
+            if self.replica:
+                self.replica.request_sync()
+            messagebox.showinfo("Registration", "\n".join(lines))
+            self.register_courses()
+
+        ttk.Button(self.root, text="Register", command=submit).pack(pady=10)
+        ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(pady=10)
+
     def view_grades(self):
         self.clear_window()
         ttk.Label(self.root, text="View Grades", font=("Arial", 16)).pack(pady=20)
@@ -874,9 +1792,7 @@ class LMSApp:
             JOIN Courses c ON r.course_id = c.course_id
             WHERE r.user_id = %s
         """
-        grades = execute_query(
-            self.conn, self.cursor, query, (self.user_id,), fetch=True
-        )
+        grades = self.student_rows("view_grades", query, (self.user_id,))
         if grades:
             for grade in grades:
                 grade_info = f"Course: {grade[0]}, Quiz 1: {grade[1]}, Quiz 2: {grade[2]}, Midterm: {grade[3]}, Final: {grade[4]}, Total Marks: {grade[5]}, Grade: {grade[6]}"
@@ -887,6 +1803,34 @@ class LMSApp:
             pady=10
         )
 
+    def view_notifications(self):
+        self.clear_window()
+        ttk.Label(self.root, text="Notifications", font=("Arial", 16)).pack(pady=20)
+        try:
+            with unit_of_work(self.conn):
+                notifications = fetch_notifications(self.cursor, self.user_id)
+                mark_read(self.conn, self.cursor, self.user_id)
+        except Exception as e:
+            messagebox.showerror("Notifications", f"Could not load notifications: {e}")
+            notifications = []
+        tree = ttk.Treeview(self.root, columns=("new", "received", "subject", "message"), show="headings", height=12)
+        for column, heading, width in (
+            ("new", "", 40),
+            ("received", "Received", 150),
+            ("subject", "Subject", 200),
+            ("message", "Message", 360),
+        ):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width)
+        tree.pack(pady=5, padx=10)
+        for _, subject, body, created_at, read_at in notifications:
+            tree.insert("", tk.END, values=("New" if read_at is None else "", created_at, subject, body))
+        if not notifications:
+            ttk.Label(self.root, text="No notifications yet.").pack(pady=10)
+        ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(
+            pady=10
+        )
+
     def view_attendance(self):
         self.clear_window()
         ttk.Label(self.root, text="View Attendance", font=("Arial", 16)).pack(pady=20)
@@ -895,9 +1839,7 @@ class LMSApp:
             JOIN Courses c ON a.course_id = c.course_id
             WHERE a.user_id = %s
         """
-        attendance_records = execute_query(
-            self.conn, self.cursor, query, (self.user_id,), fetch=True
-        )
+        attendance_records = self.student_rows("view_attendance", query, (self.user_id,))
         if attendance_records:
             for record in attendance_records:
                 attendance_info = (
@@ -992,6 +1934,7 @@ class LMSApp:
         # Add functionality to view, add, edit, and delete users
         ttk.Button(self.root, text="View Users", command=self.view_users).pack(pady=5)
         ttk.Button(self.root, text="Add User", command=self.add_user).pack(pady=5)
+        ttk.Button(self.root, text="Import Users from File", command=self.import_users).pack(pady=5)
         ttk.Button(self.root, text="Edit User", command=self.edit_user).pack(pady=5)
         ttk.Button(self.root, text="Delete User", command=self.delete_user).pack(pady=5)
         ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(
@@ -1081,6 +2024,26 @@ class LMSApp:
         )
         back_button.pack(pady=10)
 
+    def import_users(self):
+        path = filedialog.askopenfilename(
+            title="Select Roster", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            created, report = provision_roster(self.conn, self.cursor, read_roster(path))
+        except Exception as e:
+            messagebox.showerror("Import Users Error", f"Failed to import users: {e}")
+            return
+
+        report_path = f"{path}.report.csv"
+        write_report(report_path, report)
+        messagebox.showinfo(
+            "Import Users",
+            f"{sum(created.values())} user(s) created.\n"
+            f"{len(report)} row(s) not created, see {report_path}.",
+        )
+
     def edit_user(self):
         self.clear_window()
         ttk.Label(self.root, text="Edit User", font=("Arial", 16)).pack(pady=20)
@@ -1386,46 +2349,48 @@ class LMSApp:
                             "Edit Course Error", "Credit hours must be a number."
                         )
                         return
-                if instructor_name:
-                    query = "SELECT user_id FROM Users WHERE name = %s"
-                    self.cursor.execute(query, (instructor_name,))
-                    instructor_id_result = self.cursor.fetchone()
-                    if instructor_id_result:
-                        instructor_id = instructor_id_result[0]
-                        update_fields["instructor_id"] = instructor_id
-                        update_values.append(instructor_id)
-                    else:
-                        messagebox.showerror(
-                            "Edit Course Error",
-                            "Instructor not found. Please select a valid instructor.",
-                        )
-                        return
                 if semester:
                     update_fields["semester"] = semester
                     update_values.append(semester)
 
-                if update_fields:
-                    columns = list(update_fields.keys())
-                    values = update_values
-                    if update_record(
-                        self.conn,
-                        self.cursor,
-                        "Courses",
-                        columns,
-                        values,
-                        "course_id",
-                        course_id,
-                    ):
-                        messagebox.showinfo(
-                            "Edit Course", "Course updated successfully."
-                        )
-                        self.manage_courses()
-                    else:
-                        messagebox.showerror(
-                            "Edit Course Error", "Failed to update course."
-                        )
-                else:
+                if not (update_fields or instructor_name):
                     messagebox.showinfo("Edit Course", "No fields to update.")
+                    return
+                # The instructor lookup and the update are one transaction, so
+                # the instructor cannot be deleted in between.
+                try:
+                    with unit_of_work(self.conn):
+                        if instructor_name:
+                            query = "SELECT user_id FROM Users WHERE name = %s FOR KEY SHARE"
+                            instructor_id_result = execute_query(
+                                self.conn, self.cursor, query, (instructor_name,), fetch=True
+                            )
+                            if not instructor_id_result:
+                                raise LookupError(instructor_name)
+                            update_fields["instructor_id"] = instructor_id_result[0][0]
+                            update_values.append(instructor_id_result[0][0])
+                        update_record(
+                            self.conn,
+                            self.cursor,
+                            "Courses",
+                            list(update_fields.keys()),
+                            update_values,
+                            "course_id",
+                            course_id,
+                        )
+                except LookupError:
+                    messagebox.showerror(
+                        "Edit Course Error",
+                        "Instructor not found. Please select a valid instructor.",
+                    )
+                    return
+                except Exception as e:
+                    messagebox.showerror(
+                        "Edit Course Error", f"Failed to update course: {e}"
+                    )
+                    return
+                messagebox.showinfo("Edit Course", "Course updated successfully.")
+                self.manage_courses()
             else:
                 messagebox.showerror("Edit Course Error", "Course ID is required.")
 
@@ -1498,20 +2463,146 @@ class LMSApp:
 
     def view_rechecking_requests(self):
         self.clear_window()
-        ttk.Label(self.root, text="View Rechecking Requests", font=("Arial", 16)).pack(
-            pady=20
+        ttk.Label(self.root, text="Rechecking Queue", font=("Arial", 16)).pack(pady=10)
+
+        # Instructors work on their own courses' requests, admins on everyone's.
+        course_ids = None
+        if self.role.strip().lower() == "instructor":
+            rows = execute_query(
+                self.conn, self.cursor, "SELECT course_id FROM Courses WHERE instructor_id = %s", (self.user_id,), fetch=True
+            )
+            course_ids = [course_id for (course_id,) in rows or []]
+
+        stats_tree = ttk.Treeview(
+            self.root, columns=("course", "pending", "claimed", "oldest", "decided", "median"), show="headings", height=5
         )
-        query = """SELECT * FROM Rechecking"""
-        requests = execute_query(self.conn, self.cursor, query, fetch=True)
-        if requests:
-            for request in requests:
-                request_info = f"ID: {request[0]}, Student: {request[1]}, Course: {request[2]}, Exam Type: {request[3]}, Reason: {request[4]}, Status: {request[5]}, Requested At: {request[6]}"
-                ttk.Label(self.root, text=request_info).pack(pady=2)
-        else:
-            ttk.Label(self.root, text="No rechecking requests found.").pack(pady=10)
-            ttk.Button(
-                self.root, text="Back to Menu", command=self.show_user_menu
-            ).pack(pady=10)
+        for column, heading, width in (
+            ("course", "Course", 220),
+            ("pending", "Pending", 70),
+            ("claimed", "Being Reviewed", 100),
+            ("oldest", "Oldest Wait", 90),
+            ("decided", "Decided (7 days)", 110),
+            ("median", "Median Review", 100),
+        ):
+            stats_tree.heading(column, text=heading)
+            stats_tree.column(column, width=width)
+        stats_tree.pack(pady=5, padx=10)
+
+        ttk.Label(self.root, text="Your claimed requests:").pack()
+        claims_tree = ttk.Treeview(
+            self.root, columns=("id", "student", "course", "exam", "reason", "requested"), show="headings", height=8
+        )
+        for column, heading, width in (
+            ("id", "ID", 50),
+            ("student", "Student", 140),
+            ("course", "Course", 160),
+            ("exam", "Exam", 70),
+            ("reason", "Reason", 260),
+            ("requested", "Requested At", 140),
+        ):
+            claims_tree.heading(column, text=heading)
+            claims_tree.column(column, width=width)
+        claims_tree.pack(pady=5, padx=10)
+
+        ttk.Label(self.root, text="Decision note (optional):").pack()
+        note_entry = ttk.Entry(self.root, width=60)
+        note_entry.pack(pady=5)
+
+        claimed = {}
+
+        def show(claims=None):
+            try:
+                with unit_of_work(self.conn, readonly=True):
+                    stats = queue_stats(self.cursor, course_ids)
+                    if claims is None:
+                        claims = held_requests(self.cursor, self.user_id)
+            except Exception as e:
+                messagebox.showerror("Rechecking Queue", f"Could not load the queue: {e}")
+                return
+            stats_tree.delete(*stats_tree.get_children())
+            for course_id, title, pending, claimed, oldest, decided, median in stats:
+                stats_tree.insert(
+                    "",
+                    tk.END,
+                    values=(f"{title} ({course_id})", pending, claimed, format_seconds(oldest), decided, format_seconds(median)),
+                )
+            claims_tree.delete(*claims_tree.get_children())
+            claimed.clear()
+            for recheck_id, sender_id, name, course_id, title, exam_type, reason, created_at in claims:
+                claimed[str(recheck_id)] = (sender_id, name, course_id, title)
+                claims_tree.insert(
+                    "",
+                    tk.END,
+                    iid=str(recheck_id),
+                    values=(recheck_id, f"{name} ({sender_id})", f"{title} ({course_id})", exam_type, reason, created_at),
+                )
+
+        def claim():
+            try:
+                claims = claim_requests(self.conn, self.cursor, self.user_id, course_ids)
+            except Exception as e:
+                messagebox.showerror("Rechecking Queue", f"Could not claim requests: {e}")
+                return
+            if not claims:
+                messagebox.showinfo("Rechecking Queue", "No pending requests are waiting.")
+            show(claims)
+
+        def decide(status):
+            selected = claims_tree.selection()
+            if not selected:
+                messagebox.showerror("Rechecking Queue", "Select a claimed request first.")
+                return
+            try:
+                decide_request(self.conn, self.cursor, self.user_id, int(selected[0]), status, note_entry.get().strip())
+            except ClaimLostError as e:
+                messagebox.showwarning("Rechecking Queue", f"{e} It may have been picked up by someone else.")
+            except Exception as e:
+                messagebox.showerror("Rechecking Queue", f"Could not record the decision: {e}")
+                return
+            note_entry.delete(0, tk.END)
+            show()
+
+        def history():
+            selected = claims_tree.selection()
+            if not selected:
+                messagebox.showerror("Rechecking Queue", "Select a claimed request first.")
+                return
+            sender_id, name, course_id, title = claimed[selected[0]]
+            try:
+                with unit_of_work(self.conn, readonly=True):
+                    changes = marks_history(self.cursor, sender_id, course_id)
+            except Exception as e:
+                messagebox.showerror("Rechecking Queue", f"Could not load the marks history: {e}")
+                return
+            window = tk.Toplevel(self.root)
+            window.title(f"Marks History - {name}, {title}")
+            tree = ttk.Treeview(window, columns=("when", "by", "change"), show="headings", height=12)
+            for column, heading, width in (("when", "When", 150), ("by", "By", 120), ("change", "Change", 480)):
+                tree.heading(column, text=heading)
+                tree.column(column, width=width)
+            tree.pack(padx=10, pady=10, fill="both", expand=True)
+            for _, _, changed_at, actor, operation, _, _, _, old_values, new_values in changes:
+                tree.insert("", tk.END, values=(changed_at, actor, describe_change(operation, old_values, new_values)))
+            if not changes:
+                tree.insert("", tk.END, values=("", "", "No recorded changes."))
+
+        def back():
+            # Unfinished claims go back in the queue rather than waiting for the lease to run out.
+            try:
+                release_requests(self.conn, self.cursor, self.user_id)
+            except Exception as e:
+                logger.error("Releasing rechecking claims failed: %s", e)
+            self.show_user_menu()
+
+        buttons = ttk.Frame(self.root)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="Claim Next Requests", command=claim).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Approve", command=lambda: decide("approved")).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Reject", command=lambda: decide("rejected")).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Marks History", command=history).pack(side="left", padx=5)
+        ttk.Button(buttons, text="Refresh", command=show).pack(side="left", padx=5)
+        ttk.Button(self.root, text="Back to Menu", command=back).pack(pady=5)
+        show()
 
     def submit_feedback(self):
         self.clear_window()
@@ -1579,58 +2670,111 @@ class LMSApp:
 
     def view_feedback(self):
         self.clear_window()
-        ttk.Label(self.root, text="Submitted Feedback", font=("Arial", 16)).pack(
-            pady=20
+        ttk.Label(self.root, text="Feedback Summary", font=("Arial", 16)).pack(pady=10)
+
+        levels = {"By Instructor": "instructor", "By Instructor and Semester": "semester", "By Course": "course"}
+        filters = ttk.Frame(self.root)
+        filters.pack(pady=5)
+        level_var = tk.StringVar(value=next(iter(levels)))
+        ttk.Combobox(filters, textvariable=level_var, values=list(levels), state="readonly").pack(side="left", padx=5)
+        ttk.Label(filters, text="Semester:").pack(side="left")
+        semester_var = tk.StringVar(value="All")
+        semesters = execute_query(
+            self.conn, self.cursor, "SELECT DISTINCT semester FROM Courses WHERE semester IS NOT NULL ORDER BY 1", fetch=True
         )
-
-        try:
-            query = "SELECT sender_id, course_id, instructor_id, rating, comments, time FROM feedback ORDER BY time DESC"
-            self.cursor.execute(query)
-            feedbacks = self.cursor.fetchall()
-
-            if not feedbacks:
-                ttk.Label(self.root, text="No feedback submitted yet.").pack(pady=10)
-            else:
-                canvas = tk.Canvas(self.root)
-                scrollbar = ttk.Scrollbar(
-                    self.root, orient="vertical", command=canvas.yview
-                )
-                scroll_frame = ttk.Frame(canvas)
-
-                scroll_frame.bind(
-                    "<Configure>",
-                    lambda e: canvas.configure(scrollregion=canvas.bbox("all")),
-                )
-
-            canvas.create_window((0, 0), window=scroll_frame, anchor="nw")
-            canvas.configure(yscrollcommand=scrollbar.set)
-
-            canvas.pack(side="left", fill="both", expand=True)
-            scrollbar.pack(side="right", fill="y")
-
-            for fb in feedbacks:
-                sender_id, course_id, instructor_id, rating, comments, time = fb
-                frame = ttk.LabelFrame(
-                    scroll_frame, text=f"Course {course_id}", padding=10
-                )
-                frame.pack(padx=10, pady=5, fill="x", expand=True)
-
-                ttk.Label(frame, text=f"Sender ID: {sender_id}").pack(anchor="w")
-                ttk.Label(frame, text=f"Instructor ID: {instructor_id}").pack(
-                    anchor="w"
+        ttk.Combobox(
+            filters, textvariable=semester_var, values=["All"] + [row[0] for row in semesters or []], state="readonly", width=10
+        ).pack(side="left", padx=5)
+
+        columns = ("instructor", "course", "semester", "responses", "average") + tuple(f"r{r}" for r in range(1, 6))
+        summary_tree = ttk.Treeview(self.root, columns=columns, show="headings", height=10)
+        for column, heading, width in (
+            ("instructor", "Instructor", 160),
+            ("course", "Course", 180),
+            ("semester", "Semester", 70),
+            ("responses", "Responses", 80),
+            ("average", "Average", 70),
+        ) + tuple((f"r{r}", f"{r}★", 45) for r in range(1, 6)):
+            summary_tree.heading(column, text=heading)
+            summary_tree.column(column, width=width)
+        summary_tree.pack(pady=5, padx=10)
+
+        ttk.Label(self.root, text="Double-click a row to read its comments.").pack()
+        comments_tree = ttk.Treeview(
+            self.root, columns=("time", "course", "rating", "comments"), show="headings", height=8
+        )
+        for column, heading, width in (
+            ("time", "Submitted", 140),
+            ("course", "Course", 160),
+            ("rating", "Rating", 60),
+            ("comments", "Comments", 440),
+        ):
+            comments_tree.heading(column, text=heading)
+            comments_tree.column(column, width=width)
+        comments_tree.pack(pady=5, padx=10)
+        state = {"rollups": {}, "filter": None, "last_id": None}
+
+        def semester():
+            return None if semester_var.get() == "All" else semester_var.get()
+
+        def show_summary(event=None):
+            try:
+                with unit_of_work(self.conn, readonly=True):
+                    rollups = fetch_rollups(self.cursor, levels[level_var.get()], semester())
+            except Exception as e:
+                messagebox.showerror("Feedback", f"Could not fetch feedback: {e}")
+                return
+            summary_tree.delete(*summary_tree.get_children())
+            comments_tree.delete(*comments_tree.get_children())
+            more_button.configure(state="disabled")
+            state.update(rollups={}, filter=None, last_id=None)
+            for index, rollup in enumerate(rollups):
+                state["rollups"][str(index)] = rollup
+                course = f"{rollup['title']} ({rollup['course_id']})" if rollup["course_id"] else ""
+                average = f"{rollup['average']:.2f}" if rollup["average"] is not None else "-"
+                summary_tree.insert(
+                    "",
+                    tk.END,
+                    iid=str(index),
+                    values=(rollup["instructor"] or "-", course, rollup["semester"] or "", rollup["responses"], average)
+                    + tuple(rollup["histogram"]),
                 )
-                ttk.Label(frame, text=f"Rating: {rating}/5").pack(anchor="w")
-                ttk.Label(frame, text=f"Comments: {comments}").pack(anchor="w")
-                ttk.Label(
-                    frame, text=f"Submitted on: {time.strftime('%Y-%m-%d %H:%M:%S')}"
-                ).pack(anchor="w")
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Could not fetch feedback: {e}")
 
-        ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(
-            pady=10
-        )
+        def show_comments(more=False):
+            if not more:
+                selected = summary_tree.selection()
+                if not selected:
+                    return
+                rollup = state["rollups"][selected[0]]
+                state["filter"] = {
+                    "instructor_id": rollup["instructor_id"],
+                    "course_id": rollup["course_id"],
+                    "semester": rollup["semester"] or semester(),
+                }
+                state["last_id"] = None
+                comments_tree.delete(*comments_tree.get_children())
+            elif state["filter"] is None:
+                return
+            try:
+                with unit_of_work(self.conn, readonly=True):
+                    rows = fetch_comments(self.cursor, before=state["last_id"], **state["filter"])
+            except Exception as e:
+                messagebox.showerror("Feedback", f"Could not fetch comments: {e}")
+                return
+            for feedback_id, time, title, rating, comments in rows:
+                submitted = time.strftime("%Y-%m-%d %H:%M:%S") if time else ""
+                comments_tree.insert("", tk.END, values=(submitted, title, rating, (comments or "").replace("\n", " ")))
+            if rows:
+                state["last_id"] = rows[-1][0]
+            more_button.configure(state="normal" if len(rows) == PAGE_SIZE else "disabled")
+
+        summary_tree.bind("<Double-1>", lambda e: show_comments())
+        for combobox in filters.winfo_children():
+            combobox.bind("<<ComboboxSelected>>", show_summary)
+        more_button = ttk.Button(self.root, text="Load More Comments", command=lambda: show_comments(more=True), state="disabled")
+        more_button.pack(pady=5)
+        ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(pady=5)
+        show_summary()
 
     def insert_calendar_event(self):
         self.clear_window()
@@ -1678,10 +2822,23 @@ class LMSApp:
             return
 
         query = """INSERT INTO academic_calendar (event_name, description, event_date)
-               VALUES (%s, %s, %s)"""
+               VALUES (%s, %s, %s) RETURNING event_id"""
         params = (name, description, date_str)
 
-        if execute_query(self.conn, self.cursor, query, params):
+        rows = execute_query(self.conn, self.cursor, query, params, fetch=True)
+        if rows:
+            try:
+                append_event(
+                    self.cursor,
+                    rows[0][0],
+                    name,
+                    description,
+                    datetime.datetime.strptime(date_str, "%Y-%m-%d").date(),
+                )
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                logger.warning("Could not update the calendar feed: %s", e)
             messagebox.showinfo("Calendar Event", "Event added successfully!")
             self.show_user_menu()
         else:
@@ -1691,17 +2848,36 @@ class LMSApp:
         self.clear_window()
         ttk.Label(self.root, text="Academic Calendar", font=("Arial", 16)).pack(pady=20)
 
-        query = """SELECT event_name, description, event_date FROM academic_calendar"""
-        events = execute_query(self.conn, self.cursor, query, fetch=True)
+        range_var = tk.StringVar(value=next(iter(CALENDAR_RANGES)))
+        range_combobox = ttk.Combobox(
+            self.root, textvariable=range_var, values=list(CALENDAR_RANGES), state="readonly"
+        )
+        range_combobox.pack(pady=5)
+
+        tree = ttk.Treeview(self.root, columns=("date", "event", "description"), show="headings", height=15)
+        tree.heading("date", text="Date")
+        tree.heading("event", text="Event")
+        tree.heading("description", text="Description")
+        tree.column("date", width=100)
+        tree.column("description", width=350)
+        tree.pack(pady=5, padx=10)
+        empty_label = ttk.Label(self.root, text="No events found in the calendar.")
+
+        def show_events(event=None):
+            tree.delete(*tree.get_children())
+            view = CALENDAR_RANGES[range_var.get()]
+            query = f"""SELECT event_name, description, event_date FROM {view}
+                ORDER BY event_date, event_id"""
+            events = self.student_rows("view_calendar", query, None, *calendar_range_bounds(view))
+            for name, description, event_date in events or []:
+                tree.insert("", tk.END, values=(event_date, name, description))
+            if events:
+                empty_label.pack_forget()
+            else:
+                empty_label.pack(pady=10, after=tree)
 
-        if events:
-            for event in events:
-                event_info = (
-                    f"Event: {event[0]}, Description: {event[1]}, Date: {event[2]}"
-                )
-                ttk.Label(self.root, text=event_info).pack(pady=2)
-        else:
-            ttk.Label(self.root, text="No events found in the calendar.").pack(pady=10)
+        range_combobox.bind("<<ComboboxSelected>>", show_events)
+        show_events()
 
         ttk.Button(self.root, text="Back to Menu", command=self.show_user_menu).pack(
             pady=5
@@ -1759,7 +2935,7 @@ class LMSApp:
                JOIN Courses c ON d.course_id = c.course_id
                JOIN Users u ON d.instructor_id = u.user_id
                WHERE d.status = 'active' ORDER BY d.created_at DESC"""
-        threads = execute_query(self.conn, self.cursor, query, fetch=True)
+        threads = self.student_rows("view_discussion_threads", query)
 
         if threads:
             for t in threads:
@@ -1829,7 +3005,11 @@ class LMSApp:
 
 # Starting the GUI Application
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    configure_from_env()
     root = tk.Tk()
+    if profiling_requested():
+        install_from_env(root)  # Must run before any widgets are created
     app = LMSApp(root)
     root.mainloop()
     root.destroy()
@@ -0,0 +1,140 @@
+"""ICS feed for the academic calendar.
+
+The feed is a static file that students' calendar apps can subscribe to, so
+polling them never reaches the database. append_event() adds one event to an
+existing feed without querying anything; write_feed() rebuilds the whole file
+and is used when the feed is missing or unreadable.
+
+Settings (environment variables):
+    LMS_CALENDAR_FEED: Where to write the feed. Defaults to academic_calendar.ics.
+
+Usage:
+    python academic_calendar.py --output academic_calendar.ics
+"""
+
+import argparse
+import datetime
+import os
+
+FEED_HEADER = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//LMS//Academic Calendar//EN\r\nCALSCALE:GREGORIAN\r\n"
+FEED_FOOTER = "END:VCALENDAR\r\n"
+
+
+def feed_path():
+    return os.environ.get("LMS_CALENDAR_FEED", "academic_calendar.ics")
+
+
+def calendar_events(cursor, start=None, end=None):
+    """Return (event_id, event_name, description, event_date) rows, ordered by date.
+
+    Args:
+        cursor : The database cursor object.
+        start (date, optional): First day to include.
+        end (date, optional): Day after the last one to include.
+    """
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append("event_date >= %s")
+        params.append(start)
+    if end is not None:
+        conditions.append("event_date < %s")
+        params.append(end)
+    query = "SELECT event_id, event_name, description, event_date FROM academic_calendar"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    cursor.execute(query + " ORDER BY event_date, event_id", params)
+    return cursor.fetchall()
+
+
+def _escape(text):
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """Fold a content line at 75 octets as RFC 5545 requires."""
+    encoded = line.encode("utf-8")
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # Do not split a multi-byte character.
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def format_event(event_id, name, description, event_date, stamp=None):
+    """Return the VEVENT block for one calendar row."""
+    stamp = stamp or datetime.datetime.now(datetime.timezone.utc)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:academic-calendar-{event_id}@lms",
+        f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART;VALUE=DATE:{event_date.strftime('%Y%m%d')}",
+        f"DTEND;VALUE=DATE:{(event_date + datetime.timedelta(days=1)).strftime('%Y%m%d')}",
+        f"SUMMARY:{_escape(name)}",
+        f"DESCRIPTION:{_escape(description or '')}",
+        "END:VEVENT",
+    ]
+    return "".join(_fold(line) for line in lines)
+
+
+def _replace(path, content):
+    # Write then rename, so a client polling the feed never reads half a file.
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def write_feed(cursor, path=None):
+    """Rebuild the whole feed from academic_calendar."""
+    path = path or feed_path()
+    events = [row for row in calendar_events(cursor) if row[3] is not None]
+    _replace(path, FEED_HEADER + "".join(format_event(*row) for row in events) + FEED_FOOTER)
+    return len(events)
+
+
+def append_event(cursor, event_id, name, description, event_date, path=None):
+    """Add one new event to the feed, rebuilding it first if it is missing."""
+    path = path or feed_path()
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            content = f.read()
+    except OSError:
+        content = ""
+    if not (content.startswith(FEED_HEADER) and content.endswith(FEED_FOOTER)):
+        # The rebuild already includes the new event.
+        write_feed(cursor, path)
+        return
+    if event_date is None:
+        return
+    body = content[: -len(FEED_FOOTER)]
+    _replace(path, body + format_event(event_id, name, description, event_date) + FEED_FOOTER)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Feed file. Defaults to LMS_CALENDAR_FEED.")
+    args = parser.parse_args()
+
+    from Project import close_db, connect_db
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        count = write_feed(cursor, args.output)
+        conn.commit()
+    finally:
+        close_db(conn, cursor)
+    print(f"Wrote {count} event(s) to {args.output or feed_path()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""Archive a closed semester out of the hot tables.
+
+Results, Attendance, feedback, DiscussionThreads and DiscussionReplies rows
+for the semester's courses are moved in bounded batches into tables in the
+'archive' schema. A per-course summary is kept in semester_summaries so
+dashboards still work, and the rows can be moved back on demand for a
+transcript or an audit.
+
+Courses.semester is a program level that every intake goes through, so the
+term is also given as a date range: only rows from that term are archived.
+Attendance, feedback and threads are matched by their dates, replies by
+their thread, and Results by the students who attended the course in the
+term or whose marks changed during it, unless they have taken it again since.
+
+Usage:
+    python archive_semester.py archive 3 --from 2025-07-01 --to 2026-01-01 --vacuum
+    python archive_semester.py rehydrate 3 --from 2025-07-01 --to 2026-01-01 --user 1042
+"""
+
+import argparse
+import datetime
+
+from Project import close_db, connect_db, create_attendance_partitions
+
+_THREADS = "course_id = ANY(%(courses)s) AND created_at >= %(start)s AND created_at < %(end)s"
+_ATTENDANCE = "course_id = ANY(%(courses)s) AND date >= %(start)s AND date < %(end)s"
+
+# live table -> (archive table, key columns, how to find the term's rows)
+ARCHIVED_TABLES = {
+    "DiscussionReplies": (
+        "archive.discussion_replies",
+        ("reply_id",),
+        # Threads are archived after, and rehydrated before, their replies.
+        f"thread_id IN (SELECT thread_id FROM DiscussionThreads WHERE {_THREADS})",
+    ),
+    "DiscussionThreads": ("archive.discussion_threads", ("thread_id",), _THREADS),
+    "feedback": (
+        "archive.feedback",
+        ("feedback_id",),
+        "course_id = ANY(%(courses)s) AND time >= %(start)s AND time < %(end)s",
+    ),
+    # Results have no date of their own. They are archived before, and
+    # rehydrated after, the attendance that places them in the term. A student
+    # retaking the course has one row for both runs, and it stays live while
+    # it has attendance or changes after the term.
+    "Results": (
+        "archive.results",
+        ("result_id",),
+        f"""course_id = ANY(%(courses)s) AND (
+            (user_id, course_id) IN (SELECT user_id, course_id FROM Attendance WHERE {_ATTENDANCE})
+            OR result_id IN (
+                SELECT result_id FROM results_changes
+                WHERE course_id = ANY(%(courses)s) AND changed_at >= %(start)s AND changed_at < %(end)s
+            )
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM Attendance l
+            WHERE l.user_id = t.user_id AND l.course_id = t.course_id AND l.date >= %(end)s
+        )
+        AND NOT EXISTS (SELECT 1 FROM results_changes ch WHERE ch.result_id = t.result_id AND ch.changed_at >= %(end)s)""",
+    ),
+    "Attendance": ("archive.attendance", ("attendance_id", "date"), _ATTENDANCE),
+}
+
+# Rows that cannot be moved back while a live row holds their unique key.
+# They stay archived and are counted rather than aborting the rehydration.
+REHYDRATE_CONFLICTS = {
+    "Results": "EXISTS (SELECT 1 FROM Results l WHERE l.user_id = t.user_id AND l.course_id = t.course_id)",
+}
+
+# Column holding the student for per-student rehydration.
+STUDENT_COLUMNS = {"Results": "user_id", "Attendance": "user_id", "feedback": "sender_id"}
+
+SUMMARY_SCRIPT = """CREATE TABLE IF NOT EXISTS semester_summaries (
+    course_id INT NOT NULL,
+    semester VARCHAR(20) NOT NULL,
+    term_start DATE NOT NULL,
+    term_end DATE,
+    students INT,
+    mean_marks FLOAT,
+    stddev_marks FLOAT,
+    grade_counts JSONB,
+    attendance_rate FLOAT,
+    threads INT,
+    replies INT,
+    feedback_count INT,
+    feedback_rating FLOAT,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (course_id, semester, term_start)
+);"""
+
+# Summaries written before terms were tracked are kept under term_start -infinity.
+SUMMARY_MIGRATION_SCRIPT = """DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'semester_summaries' AND column_name = 'term_start'
+    ) THEN
+        ALTER TABLE semester_summaries ADD COLUMN term_start DATE, ADD COLUMN term_end DATE;
+        UPDATE semester_summaries SET term_start = '-infinity';
+        ALTER TABLE semester_summaries ALTER COLUMN term_start SET NOT NULL;
+        ALTER TABLE semester_summaries DROP CONSTRAINT semester_summaries_pkey;
+        ALTER TABLE semester_summaries ADD PRIMARY KEY (course_id, semester, term_start);
+    END IF;
+END;
+$$;"""
+
+
+def create_archive_tables(conn, cursor):
+    cursor.execute("CREATE SCHEMA IF NOT EXISTS archive")
+    for table, (archive_table, keys, _) in ARCHIVED_TABLES.items():
+        # LIKE copies the columns but not the defaults or foreign keys.
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {archive_table} (LIKE {table} INCLUDING CONSTRAINTS)")
+        cursor.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {archive_table.split('.')[1]}_key ON {archive_table} ({', '.join(keys)})"
+        )
+    for archive_table in ("archive.results", "archive.attendance", "archive.feedback"):
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {archive_table.split('.')[1]}_course_idx ON {archive_table} (course_id)"
+        )
+    cursor.execute(SUMMARY_SCRIPT)
+    cursor.execute(SUMMARY_MIGRATION_SCRIPT)
+    conn.commit()
+
+
+def _columns(cursor, table, archive_table):
+    """Return the columns the live and archive tables have in common.
+
+    Columns added to a live table after its archive table was created are
+    left out rather than breaking the move.
+    """
+    schema, name = archive_table.split(".")
+    cursor.execute(
+        """SELECT l.column_name FROM information_schema.columns l
+        JOIN information_schema.columns a
+            ON a.column_name = l.column_name AND a.table_schema = %s AND a.table_name = %s
+        WHERE l.table_schema = 'public' AND l.table_name = %s
+        ORDER BY l.ordinal_position""",
+        (schema, name, table.lower()),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _move(conn, cursor, source, target, keys, condition, params, batch_size, columns):
+    """Move rows matching condition from source to target, committing every batch."""
+    column_list = ", ".join(columns)
+    key_list = ", ".join(keys)
+    moved = 0
+    while True:
+        cursor.execute(
+            f"""WITH batch AS (
+                DELETE FROM {source}
+                WHERE ({key_list}) IN (SELECT {key_list} FROM {source} AS t WHERE {condition} LIMIT %(limit)s)
+                RETURNING {column_list}
+            )
+            INSERT INTO {target} ({column_list}) SELECT {column_list} FROM batch""",
+            dict(params, limit=batch_size),
+        )
+        count = cursor.rowcount
+        conn.commit()
+        moved += count
+        if count < batch_size:
+            return moved
+
+
+def semester_courses(cursor, semester):
+    cursor.execute("SELECT course_id FROM Courses WHERE semester = %s", (str(semester),))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _term_rows(table):
+    """SQL for the term's rows of a live table, as archive_semester selects them."""
+    return f"SELECT * FROM {table} AS t WHERE {ARCHIVED_TABLES[table][2]}"
+
+
+def summarize_semester(conn, cursor, semester, courses, start, end):
+    """Store per-course summaries of the term's hot data.
+
+    A term that was already summarized keeps its first summary, so re-running
+    an interrupted archive does not overwrite it with the rows that were left.
+    """
+    cursor.execute(
+        f"""WITH r AS ({_term_rows("Results")}),
+            a AS ({_term_rows("Attendance")}),
+            d AS ({_term_rows("DiscussionThreads")}),
+            dr AS ({_term_rows("DiscussionReplies")}),
+            f AS ({_term_rows("feedback")})
+        INSERT INTO semester_summaries (course_id, semester, term_start, term_end, students, mean_marks,
+                stddev_marks, grade_counts, attendance_rate, threads, replies, feedback_count, feedback_rating)
+        SELECT c.course_id, %(semester)s, %(start)s, %(end)s,
+            (SELECT COUNT(*) FROM r WHERE r.course_id = c.course_id),
+            (SELECT AVG(total_marks) FROM r WHERE r.course_id = c.course_id),
+            (SELECT STDDEV(total_marks) FROM r WHERE r.course_id = c.course_id),
+            (SELECT jsonb_object_agg(grade, n) FROM (
+                SELECT COALESCE(grade, '-') AS grade, COUNT(*) AS n FROM r
+                WHERE r.course_id = c.course_id GROUP BY 1) g),
+            (SELECT AVG(CASE WHEN status = 'absent' THEN 0 ELSE 1 END) FROM a WHERE a.course_id = c.course_id),
+            (SELECT COUNT(*) FROM d WHERE d.course_id = c.course_id),
+            (SELECT COUNT(*) FROM dr JOIN d ON d.thread_id = dr.thread_id WHERE d.course_id = c.course_id),
+            (SELECT COUNT(*) FROM f WHERE f.course_id = c.course_id),
+            (SELECT AVG(rating) FROM f WHERE f.course_id = c.course_id)
+        FROM Courses c
+        WHERE c.course_id = ANY(%(courses)s)
+        ON CONFLICT (course_id, semester, term_start) DO NOTHING""",
+        {"semester": str(semester), "courses": courses, "start": start, "end": end},
+    )
+    conn.commit()
+
+
+def _check_term(start, end):
+    if start >= end:
+        raise ValueError(f"The term must end after it starts ({start} to {end}).")
+
+
+def archive_semester(conn, cursor, semester, start, end, batch_size=5000, force=False):
+    """Move one term's rows for a closed semester into the archive tables.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        semester (str): The semester to archive, as stored in Courses.semester.
+        start (datetime.date): The first day of the term.
+        end (datetime.date): The day after the term's last day.
+        batch_size (int, optional): Rows moved per transaction. Defaults to 5000.
+        force (bool, optional): Archive even if the term looks open.
+    Returns:
+        dict: Rows moved per table.
+    """
+    _check_term(start, end)
+    create_archive_tables(conn, cursor)
+    courses = semester_courses(cursor, semester)
+    if not force:
+        if end > datetime.date.today():
+            raise ValueError(f"The term has not ended yet (it runs until {end}).")
+        # Registrations carry no term either, so count the enrollments of the
+        # term's students that were never closed. Students who have attended
+        # since belong to a later run of the course.
+        cursor.execute(
+            """SELECT COUNT(*) FROM Registrations r
+            WHERE r.course_id = ANY(%(courses)s) AND r.status = 'enrolled'
+                AND EXISTS (
+                    SELECT 1 FROM Attendance a
+                    WHERE a.user_id = r.user_id AND a.course_id = r.course_id
+                        AND a.date >= %(start)s AND a.date < %(end)s
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM Attendance a
+                    WHERE a.user_id = r.user_id AND a.course_id = r.course_id AND a.date >= %(end)s
+                )""",
+            {"courses": courses, "start": start, "end": end},
+        )
+        enrolled = cursor.fetchone()[0]
+        conn.commit()
+        if enrolled:
+            raise ValueError(f"The term still has {enrolled} enrolled registration(s).")
+
+    summarize_semester(conn, cursor, semester, courses, start, end)
+    params = {"courses": courses, "start": start, "end": end}
+    moved = {}
+    # Replies go before their threads so the cascade never deletes unarchived rows.
+    for table, (archive_table, keys, condition) in ARCHIVED_TABLES.items():
+        moved[table] = _move(
+            conn,
+            cursor,
+            table,
+            archive_table,
+            keys,
+            condition,
+            params,
+            batch_size,
+            _columns(cursor, table, archive_table),
+        )
+    return moved
+
+
+def rehydrate_semester(conn, cursor, semester, start, end, user_id=None, batch_size=5000):
+    """Move one term's archived rows for a semester back into the hot tables.
+
+    If user_id is given only that student's results, attendance and feedback
+    are brought back, e.g. for a transcript. Archived results whose student
+    has a live row for the course again stay archived.
+
+    Returns:
+        dict: Rows moved back per table, and the results left archived.
+    """
+    _check_term(start, end)
+    create_archive_tables(conn, cursor)
+    courses = semester_courses(cursor, semester)
+
+    # Make sure the months being restored have their own Attendance partitions.
+    cursor.execute(
+        "SELECT MIN(date), MAX(date) FROM archive.attendance WHERE course_id = ANY(%s) AND date >= %s AND date < %s",
+        (courses, start, end),
+    )
+    first, last = cursor.fetchone()
+    if first:
+        create_attendance_partitions(cursor, first, last)
+    conn.commit()
+
+    moved = {}
+    # Threads must exist again before their replies.
+    for table, (archive_table, keys, condition) in reversed(ARCHIVED_TABLES.items()):
+        params = {"courses": courses, "start": start, "end": end}
+        if user_id is not None:
+            if table not in STUDENT_COLUMNS:
+                continue
+            condition = f"{condition} AND {STUDENT_COLUMNS[table]} = %(user_id)s"
+            params["user_id"] = user_id
+        if table in REHYDRATE_CONFLICTS:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {archive_table} AS t WHERE {condition} AND {REHYDRATE_CONFLICTS[table]}", params
+            )
+            moved[f"{table} left archived"] = cursor.fetchone()[0]
+            conn.commit()
+            condition = f"{condition} AND NOT {REHYDRATE_CONFLICTS[table]}"
+        moved[table] = _move(
+            conn,
+            cursor,
+            archive_table,
+            table,
+            keys,
+            condition,
+            params,
+            batch_size,
+            _columns(cursor, table, archive_table),
+        )
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("archive", "rehydrate"))
+    parser.add_argument("semester")
+    parser.add_argument("--from", dest="start", type=datetime.date.fromisoformat, required=True,
+                        help="First day of the term, YYYY-MM-DD.")
+    parser.add_argument("--to", dest="end", type=datetime.date.fromisoformat, required=True,
+                        help="Day after the term's last day, YYYY-MM-DD.")
+    parser.add_argument("--user", type=int, help="Only rehydrate this student's rows.")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--force", action="store_true", help="Archive even if the term looks open.")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM ANALYZE the hot tables afterwards.")
+    args = parser.parse_args()
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        if args.action == "archive":
+            moved = archive_semester(conn, cursor, args.semester, args.start, args.end, args.batch_size, args.force)
+        else:
+            moved = rehydrate_semester(
+                conn, cursor, args.semester, args.start, args.end, args.user, args.batch_size
+            )
+        for table, n in moved.items():
+            print(f"{table}: {n} row(s)")
+        if args.vacuum:
+            conn.autocommit = True
+            for table in ARCHIVED_TABLES:
+                cursor.execute(f"VACUUM ANALYZE {table}")
+    finally:
+        close_db(conn, cursor)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,635 @@
+"""Benchmark suite for the LMS database.
+
+Creates a throwaway PostgreSQL cluster, fills the LMS schema with synthetic
+data using COPY and times every query the application runs.
+
+Usage:
+    python benchmark.py --scale 10 --scale 100 --output bench_report.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import psycopg2 as pg
+
+from Project import create_tables
+from bulk_copy import copy_rows
+from columnar import fetch_arrays
+from course_statistics import COLUMNS as STATISTICS_COLUMNS
+from feedback_rollups import COUNT_COLUMNS, LEVELS, PAGE_SIZE
+from rechecking import CLAIM_TIMEOUT, STATS_WINDOW
+
+# Approximate size of the current deployment. --scale multiplies these.
+BASE_COUNTS = {
+    "admins": 5,
+    "instructors": 25,
+    "students": 500,
+    "courses": 50,
+    "registrations_per_student": 5,
+    "attendance_days": 30,
+    "threads_per_course": 10,
+    "replies_per_thread": 5,
+    "feedback_ratio": 0.3,
+    "calendar_events": 40,
+    "rechecking_ratio": 0.05,
+    "bugs": 100,
+}
+
+# Synthetic attendance starts this month, inside the partitions the app prepares.
+TERM_START = datetime.date.today().replace(day=1)
+
+
+class TempCluster:
+    """A local PostgreSQL cluster that lives in a temporary directory.
+
+    Args:
+        pg_bin (str, optional): Directory containing initdb and pg_ctl. Defaults to the PATH.
+        keep (bool, optional): Leave the data directory on disk after stopping. Defaults to False.
+        max_connections (int, optional): Server connection limit. Defaults to 100.
+    """
+
+    def __init__(self, pg_bin=None, keep=False, max_connections=100):
+        self.pg_bin = pg_bin
+        self.keep = keep
+        self.max_connections = max_connections
+        self.data_dir = None
+        self.port = None
+
+    def _bin(self, name):
+        if self.pg_bin:
+            return os.path.join(self.pg_bin, name)
+        path = shutil.which(name)
+        if not path:
+            raise RuntimeError(f"Could not find '{name}'. Pass --pg-bin or add it to PATH.")
+        return path
+
+    def __enter__(self):
+        self.data_dir = tempfile.mkdtemp(prefix="lms_bench_")
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+
+        subprocess.run(
+            [self._bin("initdb"), "-D", self.data_dir, "-U", "postgres", "-A", "trust"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        options = (
+            f"-p {self.port} -k {self.data_dir} -c listen_addresses='' -c fsync=off"
+            f" -c max_connections={self.max_connections}"
+        )
+        subprocess.run(
+            [
+                self._bin("pg_ctl"),
+                "-D",
+                self.data_dir,
+                "-o",
+                options,
+                "-l",
+                os.path.join(self.data_dir, "server.log"),
+                "-w",
+                "start",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run(
+            [self._bin("pg_ctl"), "-D", self.data_dir, "-m", "fast", "-w", "stop"],
+            stdout=subprocess.DEVNULL,
+        )
+        if not self.keep:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def connect(self, database="postgres"):
+        return pg.connect(
+            database=database, user="postgres", host=self.data_dir, port=self.port
+        )
+
+    def create_database(self, name):
+        conn = self.connect()
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS {name}")
+            cursor.execute(f"CREATE DATABASE {name}")
+        conn.close()
+        return self.connect(name)
+
+
+def scaled_counts(scale):
+    counts = dict(BASE_COUNTS)
+    for key in ("admins", "instructors", "students", "courses", "calendar_events", "bugs"):
+        counts[key] = max(1, int(BASE_COUNTS[key] * scale))
+    return counts
+
+
+def generate_data(conn, cursor, counts, seed=0):
+    """Fill an empty LMS schema with synthetic data.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        counts (dict): Row counts, see BASE_COUNTS.
+        seed (int, optional): Random seed. Defaults to 0.
+    Returns:
+        dict: Seconds spent loading each table.
+    """
+    rng = random.Random(seed)
+    timings = {}
+
+    admins = range(1, counts["admins"] + 1)
+    instructors = range(admins.stop, admins.stop + counts["instructors"])
+    students = range(instructors.stop, instructors.stop + counts["students"])
+    courses = range(1, counts["courses"] + 1)
+    course_semester = {c: str(rng.randint(1, 8)) for c in courses}
+    course_instructor = {c: instructors[c % len(instructors)] for c in courses}
+
+    def timed(table, columns, rows):
+        start = time.perf_counter()
+        copy_rows(cursor, table, columns, rows)
+        timings[table] = time.perf_counter() - start
+
+    def users():
+        for role, ids in (("admin", admins), ("instructor", instructors), ("student", students)):
+            for user_id in ids:
+                yield (user_id, f"{role} {user_id}", f"{role}{user_id}@lms.test", f"pw{user_id}", role)
+
+    timed("Users", ("user_id", "name", "email", "password", "role"), users())
+    timed(
+        "StudentProfiles",
+        ("user_id", "program", "semester"),
+        ((s, "BSCS", rng.randint(1, 8)) for s in students),
+    )
+    timed(
+        "InstructorProfiles",
+        ("user_id", "department", "designation"),
+        ((i, "Computer Science", "Lecturer") for i in instructors),
+    )
+
+    timed(
+        "Courses",
+        ("course_id", "title", "credit_hours", "instructor_id", "semester"),
+        (
+            (c, f"Course {c}", rng.randint(1, 4), course_instructor[c], course_semester[c])
+            for c in courses
+        ),
+    )
+
+    per_student = min(counts["registrations_per_student"], len(courses))
+    enrollment = [(s, c) for s in students for c in rng.sample(courses, per_student)]
+
+    def registrations():
+        for s, c in enrollment:
+            semester = course_semester[c]
+            status = "enrolled" if semester == "1" else rng.choice(("enrolled", "completed", "dropped"))
+            yield (s, c, status, semester)
+
+    timed("Registrations", ("user_id", "course_id", "status", "semester"), registrations())
+
+    def results():
+        for s, c in enrollment:
+            marks = [round(rng.uniform(0, 10), 1), round(rng.uniform(0, 10), 1),
+                     round(rng.uniform(0, 30), 1), round(rng.uniform(0, 50), 1)]
+            yield (s, c, *marks, round(sum(marks), 1))
+
+    timed(
+        "Results",
+        ("user_id", "course_id", "quiz1", "quiz2", "midterm", "final", "total_marks"),
+        results(),
+    )
+
+    def attendance():
+        for s, c in enrollment:
+            for day in range(counts["attendance_days"]):
+                date = TERM_START + datetime.timedelta(days=day * 2)
+                yield (s, c, date.isoformat(), rng.choices(("present", "absent", "late"), (8, 1, 1))[0])
+
+    timed("Attendance", ("user_id", "course_id", "date", "status"), attendance())
+
+    thread_ids = range(1, len(courses) * counts["threads_per_course"] + 1)
+    thread_course = {t: courses[(t - 1) // counts["threads_per_course"]] for t in thread_ids}
+    timed(
+        "DiscussionThreads",
+        ("thread_id", "course_id", "instructor_id", "message"),
+        ((t, thread_course[t], course_instructor[thread_course[t]], f"Thread {t}") for t in thread_ids),
+    )
+    timed(
+        "DiscussionReplies",
+        ("thread_id", "sender_id", "message"),
+        (
+            (t, rng.choice(students), f"Reply {r} to thread {t}")
+            for t in thread_ids
+            for r in range(counts["replies_per_thread"])
+        ),
+    )
+
+    timed(
+        "feedback",
+        ("sender_id", "course_id", "instructor_id", "rating", "comments", "time"),
+        (
+            (s, c, course_instructor[c], rng.randint(1, 5), f"Feedback from {s}", f"{TERM_START} 12:00:00")
+            for s, c in enrollment
+            if rng.random() < counts["feedback_ratio"]
+        ),
+    )
+    timed(
+        "rechecking",
+        ("sender_id", "course_id", "reason", "exam_type", "status"),
+        (
+            (s, c, "Please recheck", rng.choice(("quiz", "mid term", "final")), "pending")
+            for s, c in enrollment
+            if rng.random() < counts["rechecking_ratio"]
+        ),
+    )
+    timed(
+        "academic_calendar",
+        ("event_name", "description", "event_date"),
+        (
+            (f"Event {e}", "Synthetic event", (TERM_START + datetime.timedelta(days=e)).isoformat())
+            for e in range(counts["calendar_events"])
+        ),
+    )
+    timed(
+        "bug",
+        ("sender_id", "Description", "status", "Time"),
+        ((rng.choice(students), f"Bug report {b}", "open", f"{TERM_START} 09:00:00") for b in range(counts["bugs"])),
+    )
+
+    # Explicit ids were loaded, so move the sequences past them.
+    for table, column in (("Users", "user_id"), ("Courses", "course_id"), ("DiscussionThreads", "thread_id")):
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), (SELECT MAX({column}) FROM {table}))"
+        )
+    conn.commit()
+
+    conn.autocommit = True
+    cursor.execute("VACUUM ANALYZE")
+    conn.autocommit = False
+    return timings
+
+
+def query_paths(counts):
+    """Return (name, kind, query, params_fn) for every query path the application runs.
+
+    Write paths are rolled back after each run so the data stays the same.
+    """
+    first_student = counts["admins"] + counts["instructors"] + 1
+    last_student = first_student + counts["students"] - 1
+    n_courses = counts["courses"]
+    n_threads = n_courses * counts["threads_per_course"]
+    n_results = counts["students"] * min(counts["registrations_per_student"], n_courses)
+
+    def student(rng):
+        return rng.randint(first_student, last_student)
+
+    def course(rng):
+        return rng.randint(1, n_courses)
+
+    def instructor(rng):
+        return rng.randint(counts["admins"] + 1, counts["admins"] + counts["instructors"])
+
+    def login(rng):
+        s = student(rng)
+        return (f"student{s}@lms.test", f"pw{s}")
+
+    def rechecking_queue(rng):
+        # An instructor's view of one of their courses, as rechecking.py is called.
+        return {
+            "all": False,
+            "courses": [course(rng)],
+            "staff": instructor(rng),
+            "timeout": CLAIM_TIMEOUT,
+            "window": STATS_WINDOW,
+            "limit": 5,
+        }
+
+    group, shown = LEVELS["instructor"]
+    free = "(claimed_by IS NULL OR claimed_at < CURRENT_TIMESTAMP - %(timeout)s::interval)"
+    free_r = "(r.claimed_by IS NULL OR r.claimed_at < CURRENT_TIMESTAMP - %(timeout)s::interval)"
+
+    return [
+        ("authenticate_user", "read",
+         "SELECT user_id, name, role FROM Users WHERE email = %s AND password = %s", login),
+        ("register_user.email_check", "read",
+         "SELECT email FROM Users WHERE email = %s", lambda rng: (login(rng)[0],)),
+        ("view_courses", "read",
+         """SELECT c.course_id, c.title, c.credit_hours, u.name as instructor_name
+            FROM Courses c JOIN Users u ON c.instructor_id = u.user_id""", None),
+        ("view_all_courses", "read",
+         """SELECT c.course_id, c.title, c.credit_hours, u.name as instructor_name, c.semester
+            FROM Courses c JOIN Users u ON c.instructor_id = u.user_id""", None),
+        ("populate_course_combobox", "read", "SELECT course_id, title FROM Courses", None),
+        ("view_grades", "read",
+         """SELECT c.title, r.quiz1, r.quiz2, r.midterm, r.final, r.total_marks, r.grade
+            FROM Results r JOIN Courses c ON r.course_id = c.course_id
+            WHERE r.user_id = %s""", lambda rng: (student(rng),)),
+        ("view_attendance", "read",
+         """SELECT c.title, a.date, a.status
+            FROM Attendance a JOIN Courses c ON a.course_id = c.course_id
+            WHERE a.user_id = %s""", lambda rng: (student(rng),)),
+        ("view_calendar", "read",
+         """SELECT event_name, description, event_date FROM upcoming_calendar_events
+            ORDER BY event_date, event_id""", None),
+        ("view_discussion_threads", "read",
+         """SELECT d.thread_id, c.title, u.name, d.message, d.status, d.created_at
+            FROM DiscussionThreads d
+            JOIN Courses c ON d.course_id = c.course_id
+            JOIN Users u ON d.instructor_id = u.user_id
+            WHERE d.status = 'active' ORDER BY d.created_at DESC""", None),
+        ("view_thread_replies", "read",
+         """SELECT reply_id, sender_id, message, created_at FROM DiscussionReplies
+            WHERE thread_id = %s ORDER BY created_at""", lambda rng: (rng.randint(1, n_threads),)),
+        # feedback_rollups.fetch_rollups at instructor level, then fetch_comments' first page.
+        ("view_feedback", "read",
+         f"""SELECT r.instructor_id, MAX(u.name), {shown}, {", ".join(f"SUM(r.{c})" for c in COUNT_COLUMNS)}
+            FROM feedback_rollups r
+            JOIN Courses c ON c.course_id = r.course_id
+            LEFT JOIN Users u ON u.user_id = r.instructor_id
+            GROUP BY {group}
+            ORDER BY SUM(r.rating_sum)::float / NULLIF(SUM(r.rating_count), 0) DESC NULLS LAST, 1""", None),
+        ("view_feedback.comments", "read",
+         """SELECT f.feedback_id, f.time, c.title, f.rating, f.comments
+            FROM feedback f
+            JOIN Courses c ON c.course_id = f.course_id
+            WHERE f.instructor_id = %s
+            ORDER BY f.feedback_id DESC
+            LIMIT %s""",
+         lambda rng: (instructor(rng), PAGE_SIZE)),
+        # rechecking.queue_stats, held_requests and claim_requests.
+        ("view_rechecking_requests", "read",
+         f"""SELECT c.course_id, c.title,
+                COUNT(*) FILTER (WHERE r.status = 'pending'),
+                COUNT(*) FILTER (WHERE r.status = 'pending' AND NOT {free_r}),
+                EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(r.created_at) FILTER (WHERE r.status = 'pending')),
+                COUNT(*) FILTER (WHERE r.decided_at IS NOT NULL),
+                percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM r.decided_at - r.claimed_at))
+            FROM rechecking r
+            JOIN Courses c ON c.course_id = r.course_id
+            WHERE (r.status = 'pending' OR r.decided_at >= CURRENT_TIMESTAMP - %(window)s::interval)
+                AND (%(all)s OR r.course_id = ANY(%(courses)s))
+            GROUP BY c.course_id, c.title
+            ORDER BY 3 DESC, c.course_id""", rechecking_queue),
+        ("view_rechecking_requests.held", "read",
+         """SELECT r.recheck_id, r.sender_id, u.name, r.course_id, c.title, r.exam_type, r.reason, r.created_at
+            FROM rechecking r
+            JOIN Users u ON u.user_id = r.sender_id
+            JOIN Courses c ON c.course_id = r.course_id
+            WHERE r.status = 'pending' AND r.claimed_by = %(staff)s
+                AND r.claimed_at >= CURRENT_TIMESTAMP - %(timeout)s::interval
+            ORDER BY r.created_at, r.recheck_id""", rechecking_queue),
+        ("view_users", "read", "SELECT user_id, name, email, role FROM Users", None),
+        ("plot_percentage_distribution.course", "read",
+         "SELECT total_marks FROM Results WHERE course_id = %s;", lambda rng: (course(rng),)),
+        ("plot_percentage_distribution.all", "read", "SELECT total_marks FROM Results;", None),
+        # course_statistics.fetch_course_statistics, then the grade update it drives.
+        ("relative_grading.stats", "read",
+         f"SELECT {', '.join(STATISTICS_COLUMNS)} FROM course_statistics WHERE course_id = ANY(%s)",
+         lambda rng: ([course(rng)],)),
+        # marks_grid.current_marks, then marks_grid._write's compare-and-swap update or insert.
+        ("submit_marks.load", "read",
+         """SELECT user_id, version, quiz1, quiz2, midterm, final, total_marks FROM Results
+            WHERE course_id = %s AND user_id = ANY(%s)""", lambda rng: (course(rng), [student(rng)])),
+        # The edited row is picked by result_id, at the version it was just loaded at.
+        ("submit_marks", "write",
+         """UPDATE Results r SET
+                quiz1 = COALESCE(v.quiz1, r.quiz1),
+                quiz2 = COALESCE(v.quiz2, r.quiz2),
+                midterm = COALESCE(v.midterm, r.midterm),
+                final = COALESCE(v.final, r.final),
+                total_marks = COALESCE(v.quiz1, r.quiz1, 0) + COALESCE(v.quiz2, r.quiz2, 0)
+                    + COALESCE(v.midterm, r.midterm, 0) + COALESCE(v.final, r.final, 0)
+            FROM (SELECT user_id, course_id, version, 5::float8, 5::float8, 20::float8, 40::float8
+                  FROM Results WHERE result_id = %s) AS v (user_id, course_id, version, quiz1, quiz2, midterm, final)
+            WHERE r.user_id = v.user_id AND r.course_id = v.course_id AND r.version = v.version
+            RETURNING r.user_id, r.version, r.quiz1, r.quiz2, r.midterm, r.final, r.total_marks""",
+         lambda rng: (rng.randint(1, n_results),)),
+        ("submit_marks.insert", "write",
+         """INSERT INTO Results AS r (user_id, course_id, quiz1, quiz2, midterm, final, total_marks)
+            SELECT v.user_id, v.course_id, COALESCE(v.quiz1, 0), COALESCE(v.quiz2, 0),
+                COALESCE(v.midterm, 0), COALESCE(v.final, 0),
+                COALESCE(v.quiz1, 0) + COALESCE(v.quiz2, 0) + COALESCE(v.midterm, 0) + COALESCE(v.final, 0)
+            FROM (VALUES (%s::int, %s::int, NULL::int, 5::float8, 5::float8, 20::float8, 40::float8))
+                AS v (user_id, course_id, version, quiz1, quiz2, midterm, final)
+            ON CONFLICT (user_id, course_id) DO NOTHING
+            RETURNING r.user_id, r.version, r.quiz1, r.quiz2, r.midterm, r.final, r.total_marks""",
+         lambda rng: (student(rng), course(rng))),
+        ("absolute_grading", "write",
+         """UPDATE Results SET Grade = CASE
+                WHEN total_marks >= 80 THEN 'A' WHEN total_marks >= 70 THEN 'B'
+                WHEN total_marks >= 60 THEN 'C' WHEN total_marks >= 50 THEN 'D' ELSE 'F' END
+            WHERE course_id = %s""", lambda rng: (course(rng),)),
+        ("relative_grading", "write",
+         """UPDATE Results SET grade = CASE
+                WHEN total_marks >= %s + 1 * %s THEN 'A' WHEN total_marks >= %s + 0.5 * %s THEN 'B'
+                WHEN total_marks >= %s - 0.5 * %s THEN 'C' WHEN total_marks >= %s - 1 * %s THEN 'D' ELSE 'F' END
+            WHERE course_id = %s""", lambda rng: (60, 15) * 4 + (course(rng),)),
+        ("claim_rechecking_requests", "write",
+         f"""WITH next AS (
+                SELECT recheck_id FROM rechecking
+                WHERE status = 'pending' AND {free}
+                    AND (%(all)s OR course_id = ANY(%(courses)s))
+                ORDER BY created_at, recheck_id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE rechecking r SET claimed_by = %(staff)s, claimed_at = CURRENT_TIMESTAMP
+            FROM next WHERE r.recheck_id = next.recheck_id""", rechecking_queue),
+        ("submit_attendance", "write",
+         "INSERT INTO Attendance (course_id, user_id, date, status) VALUES (%s, %s, CURRENT_DATE, 'present')",
+         lambda rng: (course(rng), student(rng))),
+        ("submit_recheck_request", "write",
+         """INSERT INTO rechecking (sender_id, course_id, reason, exam_type, status)
+            VALUES (%s, %s, 'bench', 'final', 'pending')""", lambda rng: (student(rng), course(rng))),
+        ("insert_feedback", "write",
+         """INSERT INTO feedback (sender_id, course_id, instructor_id, rating, comments, time)
+            VALUES (%s, %s, NULL, 4, 'bench', CURRENT_TIMESTAMP)""", lambda rng: (student(rng), course(rng))),
+        ("report_bug", "write",
+         "INSERT INTO bug (sender_id, Description, status, Time) VALUES (%s, 'bench', 'open', NOW())",
+         lambda rng: (student(rng),)),
+        ("reply_to_thread", "write",
+         "INSERT INTO DiscussionReplies (thread_id, sender_id, message) VALUES (%s, %s, 'bench')",
+         lambda rng: (rng.randint(1, n_threads), student(rng))),
+    ]
+
+
+def percentiles(samples):
+    """Summarise latency samples (in seconds) as milliseconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p50_ms": pick(50),
+        "p90_ms": pick(90),
+        "p95_ms": pick(95),
+        "p99_ms": pick(99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def run_queries(conn, cursor, counts, iterations, seed=0):
+    """Time every query path and return a dict of latency summaries."""
+    rng = random.Random(seed)
+    report = {}
+    for name, kind, query, params_fn in query_paths(counts):
+        samples = []
+        for i in range(iterations + 1):
+            params = params_fn(rng) if params_fn else None
+            start = time.perf_counter()
+            cursor.execute(query, params)
+            if cursor.description:
+                cursor.fetchall()
+            elapsed = time.perf_counter() - start
+            conn.rollback()
+            if i:  # the first run warms the cache
+                samples.append(elapsed)
+        report[name] = dict(kind=kind, **percentiles(samples))
+    return report
+
+
+def compare_login_layouts(conn, cursor, counts, iterations, seed=0):
+    """Time the login query against the old inherited tables and the current Users table.
+
+    The old layout (Students, Instructors and Admins inheriting from Users,
+    with the email index only on the parent) is rebuilt from the loaded users
+    in a separate 'legacy' schema.
+    """
+    cursor.execute("DROP SCHEMA IF EXISTS legacy CASCADE")
+    cursor.execute("CREATE SCHEMA legacy")
+    cursor.execute(
+        """CREATE TABLE legacy.users (
+            user_id SERIAL PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) NOT NULL UNIQUE,
+            password VARCHAR(255) NOT NULL,
+            role VARCHAR(20) NOT NULL
+        );
+        CREATE TABLE legacy.students (program VARCHAR(50), semester INT) INHERITS (legacy.users);
+        CREATE TABLE legacy.instructors (department VARCHAR(100), designation VARCHAR(50)) INHERITS (legacy.users);
+        CREATE TABLE legacy.admins (role_description TEXT) INHERITS (legacy.users);"""
+    )
+    for role, table in (("student", "students"), ("instructor", "instructors"), ("admin", "admins")):
+        cursor.execute(
+            f"""INSERT INTO legacy.{table} (user_id, name, email, password, role)
+            SELECT user_id, name, email, password, role FROM Users WHERE role = %s""",
+            (role,),
+        )
+    conn.commit()
+    conn.autocommit = True
+    cursor.execute("ANALYZE legacy.users, legacy.students, legacy.instructors, legacy.admins")
+    conn.autocommit = False
+
+    login = dict((name, fn) for name, _, _, fn in query_paths(counts))["authenticate_user"]
+    report = {}
+    for layout, table in (("inherited", "legacy.users"), ("global_index", "Users")):
+        rng = random.Random(seed)
+        samples = []
+        for i in range(iterations + 1):
+            params = login(rng)
+            start = time.perf_counter()
+            cursor.execute(f"SELECT user_id, name, role FROM {table} WHERE email = %s AND password = %s", params)
+            cursor.fetchall()
+            elapsed = time.perf_counter() - start
+            if i:
+                samples.append(elapsed)
+        conn.rollback()
+        report[layout] = percentiles(samples)
+    return report
+
+
+def compare_fetch(conn, cursor, iterations):
+    """Time reading every Results total into a float array, through row tuples and through fetch_arrays.
+
+    Peak Python memory is measured with tracemalloc on a separate, untimed run.
+    """
+    query = "SELECT total_marks FROM Results"
+
+    def tuples():
+        cursor.execute(query)
+        return np.array([row[0] for row in cursor.fetchall() if row[0] is not None])
+
+    def columnar():
+        marks = fetch_arrays(cursor, query, {"total_marks": "float8"})["total_marks"]
+        return marks[~np.isnan(marks)]
+
+    report = {}
+    for method, fetch in (("row_tuples", tuples), ("columnar", columnar)):
+        samples = []
+        for i in range(iterations + 1):
+            start = time.perf_counter()
+            fetch()
+            elapsed = time.perf_counter() - start
+            conn.rollback()
+            if i:
+                samples.append(elapsed)
+        tracemalloc.start()
+        rows = fetch().size
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        conn.rollback()
+        report[method] = dict(rows=rows, peak_mb=peak / 1e6, **percentiles(samples))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, action="append", help="Multiple of BASE_COUNTS (repeatable).")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed runs per query.")
+    parser.add_argument("--output", default="bench_report.json", help="Where to write the JSON report.")
+    parser.add_argument("--pg-bin", default=os.environ.get("PG_BIN"), help="Directory with initdb and pg_ctl.")
+    parser.add_argument("--keep-cluster", action="store_true", help="Keep the data directory afterwards.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--compare-login", action="store_true", help="Also time login on the old inherited user tables."
+    )
+    parser.add_argument(
+        "--compare-fetch", action="store_true", help="Also time fetching all marks as row tuples and as arrays."
+    )
+    args = parser.parse_args()
+
+    report = {"generated_at": datetime.datetime.now().isoformat(), "runs": []}
+    with TempCluster(args.pg_bin, args.keep_cluster) as cluster:
+        for scale in args.scale or [1]:
+            counts = scaled_counts(scale)
+            conn = cluster.create_database(f"lms_bench_{str(scale).replace('.', '_')}")
+            cursor = conn.cursor()
+            create_tables(conn, cursor)
+            print(f"Scale {scale}: generating data...")
+            load_seconds = generate_data(conn, cursor, counts, args.seed)
+            print(f"Scale {scale}: timing {args.iterations} runs per query...")
+            queries = run_queries(conn, cursor, counts, args.iterations, args.seed)
+            cursor.execute("SELECT version()")
+            report["server_version"] = cursor.fetchone()[0]
+            run = {"scale": scale, "counts": counts, "load_seconds": load_seconds, "queries": queries}
+            if args.compare_login:
+                run["login_layouts"] = compare_login_layouts(conn, cursor, counts, args.iterations, args.seed)
+            if args.compare_fetch:
+                run["marks_fetch"] = compare_fetch(conn, cursor, args.iterations)
+            report["runs"].append(run)
+            cursor.close()
+            conn.close()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
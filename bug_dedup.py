@@ -0,0 +1,243 @@
+"""Near-duplicate grouping of bug reports.
+
+Each report's description is normalised and cut into character 5-grams. A
+MinHash signature of NUM_PERM values estimates how similar two reports are
+without comparing their text: the share of equal positions approximates the
+Jaccard similarity of their 5-gram sets. The signature is split into BANDS
+bands, and each band is hashed into bug_lsh. Two reports land in the same
+bucket of at least one band with high probability when they are similar, and
+rarely otherwise. A new report is therefore compared only with the reports in
+its BANDS buckets, found through the primary-key index, however many reports
+there are. It joins the cluster of the most similar one if that is at least
+THRESHOLD similar, and starts a new cluster otherwise.
+
+Only the first INDEXED_PER_CLUSTER reports of a cluster go into bug_lsh.
+Those are enough to catch further duplicates, and this keeps buckets small
+during an outage, when hundreds of identical reports arrive.
+
+Usage:
+    python bug_dedup.py backfill --batch-size 1000
+"""
+
+import argparse
+import hashlib
+import random
+import re
+import zlib
+
+from psycopg2.extras import execute_values
+
+from transactions import unit_of_work
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # 16 bands of 4 match pairs above roughly 0.5 similarity
+SHINGLE = 5
+THRESHOLD = 0.6
+INDEXED_PER_CLUSTER = 8
+
+_PRIME = (1 << 61) - 1
+# Fixed seed: signatures stored in the database must stay comparable across runs.
+_rng = random.Random(232)
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+_WORDS = re.compile(r"[a-z0-9]+")
+
+SCHEMA_SCRIPT = """
+CREATE TABLE IF NOT EXISTS bug_clusters (
+    cluster_id INT PRIMARY KEY,
+    size INT NOT NULL DEFAULT 1,
+    first_seen TIMESTAMP,
+    last_seen TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS bug_clusters_last_seen_idx ON bug_clusters (last_seen);
+CREATE TABLE IF NOT EXISTS bug_signatures (
+    bug_id INT PRIMARY KEY REFERENCES bug(bug_id) ON DELETE CASCADE,
+    cluster_id INT NOT NULL,
+    signature BIGINT[] NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bug_signatures_cluster_idx ON bug_signatures (cluster_id);
+CREATE TABLE IF NOT EXISTS bug_lsh (
+    band SMALLINT NOT NULL,
+    bucket BIGINT NOT NULL,
+    bug_id INT NOT NULL REFERENCES bug(bug_id) ON DELETE CASCADE,
+    cluster_id INT NOT NULL,
+    PRIMARY KEY (band, bucket, bug_id)
+);
+"""
+
+
+def create_bug_dedup(conn, cursor):
+    """Create the cluster, signature and LSH tables."""
+    with unit_of_work(conn):
+        cursor.execute(SCHEMA_SCRIPT)
+
+
+def shingles(text):
+    """Return the set of character 5-grams of text, ignoring case, punctuation and spacing."""
+    normal = " ".join(_WORDS.findall(text.lower()))
+    if len(normal) <= SHINGLE:
+        return {normal} if normal else set()
+    return {normal[i : i + SHINGLE] for i in range(len(normal) - SHINGLE + 1)}
+
+
+def signature(text):
+    """Return the MinHash signature of text as NUM_PERM integers."""
+    hashes = [zlib.crc32(s.encode()) for s in shingles(text)] or [0]
+    return [min((a * x + b) % _PRIME for x in hashes) for a, b in PERMUTATIONS]
+
+
+def band_buckets(sig):
+    """Return one signed 64-bit bucket per band."""
+    buckets = []
+    for band in range(BANDS):
+        part = ",".join(map(str, sig[band * ROWS : (band + 1) * ROWS]))
+        digest = hashlib.blake2b(part.encode(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, "big", signed=True))
+    return buckets
+
+
+def similarity(a, b):
+    """Estimate the Jaccard similarity of two reports from their signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def ingest_bug(cursor, bug_id, description, reported_at):
+    """Sign a report and add it to a cluster. Runs in the caller's transaction.
+
+    Returns:
+        int: The cluster_id, which is the bug_id of the cluster's first report.
+    """
+    # The report's row lock makes the backfill and report_bug take turns on a
+    # report, and whoever comes second finds it already clustered.
+    cursor.execute("SELECT 1 FROM bug WHERE bug_id = %s FOR NO KEY UPDATE", (bug_id,))
+    cursor.execute("SELECT cluster_id FROM bug_signatures WHERE bug_id = %s", (bug_id,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    sig = signature(description)
+    buckets = band_buckets(sig)
+    cursor.execute(
+        """SELECT l.cluster_id, s.signature
+        FROM bug_lsh l
+        JOIN bug_signatures s ON s.bug_id = l.bug_id
+        WHERE (l.band, l.bucket) IN (SELECT * FROM unnest(%s::smallint[], %s::bigint[]))""",
+        (list(range(BANDS)), buckets),
+    )
+    score, cluster_id = max(((similarity(sig, other), cluster) for cluster, other in cursor.fetchall()), default=(0, None))
+
+    size = 1
+    if score >= THRESHOLD:
+        cursor.execute(
+            """UPDATE bug_clusters SET size = size + 1, last_seen = GREATEST(last_seen, %s)
+            WHERE cluster_id = %s RETURNING size""",
+            (reported_at, cluster_id),
+        )
+        row = cursor.fetchone()
+        size = row[0] if row else None
+    if score < THRESHOLD or size is None:
+        cluster_id = bug_id
+        size = 1
+        cursor.execute(
+            "INSERT INTO bug_clusters (cluster_id, size, first_seen, last_seen) VALUES (%s, 1, %s, %s)",
+            (bug_id, reported_at, reported_at),
+        )
+    cursor.execute(
+        "INSERT INTO bug_signatures (bug_id, cluster_id, signature) VALUES (%s, %s, %s)",
+        (bug_id, cluster_id, sig),
+    )
+    if size <= INDEXED_PER_CLUSTER:
+        execute_values(
+            cursor,
+            "INSERT INTO bug_lsh (band, bucket, bug_id, cluster_id) VALUES %s",
+            [(band, bucket, bug_id, cluster_id) for band, bucket in enumerate(buckets)],
+        )
+    return cluster_id
+
+
+def ingest_pending(conn, cursor, batch_size=1000):
+    """Cluster reports that have no signature yet, oldest first, one transaction per batch.
+
+    Covers reports filed before clustering existed and any whose clustering failed.
+
+    Returns:
+        int: The number of reports clustered.
+    """
+    total = 0
+    after = 0
+    while True:
+        with unit_of_work(conn):
+            cursor.execute(
+                """SELECT b.bug_id, b.Description, COALESCE(b.Time, CURRENT_TIMESTAMP) FROM bug b
+                WHERE b.bug_id > %s AND NOT EXISTS (SELECT 1 FROM bug_signatures s WHERE s.bug_id = b.bug_id)
+                ORDER BY b.bug_id
+                LIMIT %s""",
+                (after, batch_size),
+            )
+            rows = cursor.fetchall()
+            for bug_id, description, reported_at in rows:
+                ingest_bug(cursor, bug_id, description, reported_at)
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+        after = rows[-1][0]
+
+
+def fetch_clusters(cursor, limit=200):
+    """Return (cluster_id, size, first_seen, last_seen, first description, open reports), most recent first."""
+    cursor.execute(
+        """SELECT c.cluster_id, c.size, c.first_seen, c.last_seen, b.Description,
+            (SELECT COUNT(*) FROM bug_signatures s JOIN bug o ON o.bug_id = s.bug_id
+             WHERE s.cluster_id = c.cluster_id AND o.status <> 'closed')
+        FROM (SELECT * FROM bug_clusters ORDER BY last_seen DESC LIMIT %s) c
+        LEFT JOIN bug b ON b.bug_id = c.cluster_id
+        ORDER BY c.last_seen DESC""",
+        (limit,),
+    )
+    return cursor.fetchall()
+
+
+def fetch_cluster_reports(cursor, cluster_id, limit=200):
+    """Return (bug_id, sender name, Time, status, Description) for a cluster's latest reports."""
+    cursor.execute(
+        """SELECT b.bug_id, u.name, b.Time, b.status, b.Description
+        FROM bug_signatures s
+        JOIN bug b ON b.bug_id = s.bug_id
+        LEFT JOIN Users u ON u.user_id = b.sender_id
+        WHERE s.cluster_id = %s
+        ORDER BY b.Time DESC NULLS LAST, b.bug_id DESC
+        LIMIT %s""",
+        (cluster_id, limit),
+    )
+    return cursor.fetchall()
+
+
+def set_cluster_status(conn, cursor, cluster_id, status):
+    """Set the status of every report in a cluster. Returns the number changed."""
+    with unit_of_work(conn):
+        cursor.execute(
+            """UPDATE bug SET status = %s
+            WHERE bug_id IN (SELECT bug_id FROM bug_signatures WHERE cluster_id = %s) AND status <> %s""",
+            (status, cluster_id, status),
+        )
+        return cursor.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("backfill",))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from Project import close_db, connect_db
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        print(f"Clustered {ingest_pending(conn, cursor, args.batch_size)} report(s).")
+    finally:
+        close_db(conn, cursor)
+
+
+if __name__ == "__main__":
+    main()
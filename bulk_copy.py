@@ -0,0 +1,39 @@
+"""Helpers for loading rows into PostgreSQL with COPY."""
+
+import csv
+import io
+
+
+class RowStream(io.TextIOBase):
+    """File-like object that renders rows as CSV on demand for COPY FROM STDIN."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        while size < 0 or len(self.buffer) + out.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            writer.writerow(row)
+        data = self.buffer + out.getvalue()
+        if size < 0:
+            self.buffer = ""
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Bulk load rows into a table with COPY and return the number of rows."""
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        RowStream(rows),
+    )
+    return cursor.rowcount
@@ -0,0 +1,57 @@
+"""Chart drawing shared by the distribution screen and the grade reports.
+
+Only the matplotlib Axes API is used here, so the same code draws into the
+interactive pyplot window and into headless Agg figures.
+"""
+
+import numpy as np
+
+
+def draw_distribution(ax, marks, title="Normal Distribution of Total Marks"):
+    """Draw a histogram of total marks with the fitted normal curve on ax."""
+    data = np.asarray(marks, dtype=float)
+    mean = np.mean(data)
+    std_dev = np.std(data)
+    ax.hist(data, bins=20, density=True, alpha=0.6, color="skyblue", edgecolor="black")
+    if std_dev > 0:
+        x = np.linspace(data.min(), data.max(), 100)
+        y = (1 / (std_dev * np.sqrt(2 * np.pi))) * np.exp(-0.5 * ((x - mean) / std_dev) ** 2)
+        ax.plot(x, y, color="red", linewidth=2)
+    ax.set_title(title)
+    ax.set_xlabel("Total Marks")
+    ax.set_ylabel("Density")
+    ax.grid(True)
+
+
+def draw_bucket_distribution(ax, buckets, mean, std_dev, title="Normal Distribution of Total Marks", bins=20):
+    """Draw the same chart as draw_distribution from a histogram of whole-mark buckets.
+
+    Args:
+        ax : The matplotlib Axes to draw on.
+        buckets (list): Count of marks in [i, i + 1) for each whole mark i.
+        mean (float): Mean mark.
+        std_dev (float): Population standard deviation of the marks.
+    """
+    used = [i for i, count in enumerate(buckets) if count]
+    low, high = used[0], used[-1] + 1
+    width = max(1, -(-(high - low) // bins))
+    edges = list(range(low, high, width))
+    counts = [sum(buckets[edge:edge + width]) for edge in edges]
+    total = sum(counts)
+    ax.bar(
+        edges,
+        [count / (total * width) for count in counts],
+        width=width,
+        align="edge",
+        alpha=0.6,
+        color="skyblue",
+        edgecolor="black",
+    )
+    if std_dev:
+        x = np.linspace(low, high, 100)
+        y = (1 / (std_dev * np.sqrt(2 * np.pi))) * np.exp(-0.5 * ((x - mean) / std_dev) ** 2)
+        ax.plot(x, y, color="red", linewidth=2)
+    ax.set_title(title)
+    ax.set_xlabel("Total Marks")
+    ax.set_ylabel("Density")
+    ax.grid(True)
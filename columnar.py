@@ -0,0 +1,150 @@
+"""Columnar query results.
+
+fetch_arrays() runs a query through COPY ... TO STDOUT (FORMAT binary) and
+returns one typed NumPy array per column. Every column is cast to a fixed
+width type and NULLs are replaced with a sentinel plus a null flag, so each
+row of the COPY stream has the same layout. The whole stream is then read as
+one NumPy structured array, and no Python object is created per row or per
+value. A million marks cost about 19 MB in transit and 8 MB as an array,
+against roughly 100 MB for the row tuples fetchall() would build.
+
+fetch_frame() returns a pandas DataFrame built the same way. Queries with
+columns that have no fixed width, such as text, go through CSV COPY and
+pandas.read_csv instead, which still parses column by column in C.
+
+    marks = fetch_arrays(cursor, "SELECT total_marks FROM Results", {"total_marks": "float8"})["total_marks"]
+"""
+
+import io
+
+import numpy as np
+import pandas as pd
+
+# type -> (COPY binary dtype, NumPy dtype, NULL sentinel). Floats carry NULL as
+# NaN; the other types get a null flag column next to them.
+TYPES = {
+    "float8": (">f8", "float64", "'NaN'"),
+    "float4": (">f4", "float32", "'NaN'"),
+    "int8": (">i8", "int64", "0"),
+    "int4": (">i4", "int32", "0"),
+    "int2": (">i2", "int16", "0"),
+    "bool": ("?", "bool", "false"),
+    "date": (">i4", "datetime64[D]", "'2000-01-01'"),
+    "timestamp": (">i8", "datetime64[us]", "'2000-01-01'"),
+}
+
+_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_EPOCH = {"date": np.datetime64("2000-01-01", "D"), "timestamp": np.datetime64("2000-01-01T00:00:00", "us")}
+
+
+def _select(columns):
+    """The fixed-width select list wrapped around the caller's query, and its fields."""
+    exprs = []
+    fields = []
+    for name, kind in columns.items():
+        wire, _, sentinel = TYPES[kind]
+        exprs.append(f'COALESCE(q."{name}"::{kind}, {sentinel}::{kind})')
+        fields.append((name, kind, wire))
+        if not kind.startswith("float"):
+            exprs.append(f'q."{name}" IS NULL')
+            fields.append((name + "__null", "bool", "?"))
+    return ", ".join(exprs), fields
+
+
+def _parse(buffer, fields):
+    """Read a binary COPY stream whose rows all have the given fixed-width fields."""
+    data = buffer.getbuffer()
+    if bytes(data[: len(_SIGNATURE)]) != _SIGNATURE:
+        raise ValueError("Not a binary COPY stream.")
+    # Signature, flags, then a header extension of the stated length.
+    start = len(_SIGNATURE) + 8 + int.from_bytes(data[len(_SIGNATURE) + 4 : len(_SIGNATURE) + 8], "big")
+    layout = [("count", ">i2")]
+    for i, (_, _, wire) in enumerate(fields):
+        layout += [(f"length{i}", ">i4"), (f"value{i}", wire)]
+    row = np.dtype(layout)
+    body = len(data) - start - 2  # the stream ends with a field count of -1
+    if body % row.itemsize:
+        raise ValueError("COPY rows are not fixed width.")
+    rows = np.frombuffer(data, dtype=row, count=body // row.itemsize, offset=start)
+    if len(rows) and (np.any(rows["count"] != len(fields)) or any(
+        np.any(rows[f"length{i}"] != np.dtype(wire).itemsize) for i, (_, _, wire) in enumerate(fields)
+    )):
+        raise ValueError("COPY rows are not fixed width.")
+    return rows
+
+
+def _series(values):
+    """A DataFrame column for a fetch_arrays() array, nullable if it is masked."""
+    if not np.ma.isMaskedArray(values):
+        return values
+    if values.dtype == bool:
+        return pd.arrays.BooleanArray(values.data, values.mask)
+    return pd.arrays.IntegerArray(values.data, values.mask)
+
+
+def fetch_arrays(cursor, query, columns, params=None):
+    """Run a query and return its columns as NumPy arrays.
+
+    Args:
+        cursor : The database cursor object.
+        query (str): The query. Its output column names must match columns.
+        columns (dict): Column name -> type, one of TYPES.
+        params (tuple, optional): Parameters for the query.
+    Returns:
+        dict: Column name -> array, in the order of columns. Float NULLs are NaN,
+        date and timestamp NULLs NaT; integer and bool columns with NULLs are
+        masked arrays.
+    """
+    if params is not None:
+        query = cursor.mogrify(query, params).decode()
+    select, fields = _select(columns)
+    buffer = io.BytesIO()
+    cursor.copy_expert(f"COPY (SELECT {select} FROM ({query}) AS q) TO STDOUT WITH (FORMAT binary)", buffer)
+    rows = _parse(buffer, fields)
+
+    arrays = {}
+    index = {name: i for i, (name, _, _) in enumerate(fields)}
+    for name, kind in columns.items():
+        wire, dtype, _ = TYPES[kind]
+        values = rows[f"value{index[name]}"]
+        if kind in _EPOCH:
+            # Days or microseconds since PostgreSQL's epoch.
+            values = _EPOCH[kind] + values.astype(f"timedelta64[{np.datetime_data(dtype)[0]}]")
+        else:
+            values = values.astype(dtype)
+        if kind.startswith("float"):
+            arrays[name] = values
+            continue
+        nulls = rows[f"value{index[name + '__null']}"]
+        if not nulls.any():
+            arrays[name] = values
+        elif kind in _EPOCH:
+            values[nulls] = np.datetime64("NaT")
+            arrays[name] = values
+        else:
+            arrays[name] = np.ma.MaskedArray(values, mask=nulls.copy())
+    return arrays
+
+
+def fetch_frame(cursor, query, columns=None, params=None):
+    """Run a query and return its rows as a pandas DataFrame.
+
+    Args:
+        cursor : The database cursor object.
+        query (str): The query.
+        columns (dict, optional): Column name -> type. With every type in TYPES the rows
+            come through binary COPY; otherwise, or without columns, through CSV COPY.
+        params (tuple, optional): Parameters for the query.
+    Returns:
+        pandas.DataFrame: One column per query column. Integer and bool columns
+        with NULLs use pandas' nullable dtypes.
+    """
+    if columns and all(kind in TYPES for kind in columns.values()):
+        arrays = fetch_arrays(cursor, query, columns, params)
+        return pd.DataFrame({name: _series(values) for name, values in arrays.items()})
+    if params is not None:
+        query = cursor.mogrify(query, params).decode()
+    buffer = io.BytesIO()
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer)
@@ -0,0 +1,248 @@
+"""Per-course marks statistics kept up to date by triggers on Results.
+
+course_statistics holds, for every course, the number of marks entered, their
+sum, mean and M2 (sum of squared deviations from the mean), the minimum and
+maximum, and a histogram with one bucket per whole mark from 0 to 100 that
+doubles as a quantile sketch. Statement-level triggers with transition tables
+fold each statement's changed rows into these figures with the parallel
+(Chan et al.) form of Welford's update, so a bulk load costs one merge per
+course rather than one per row. Reading a course's figures is then a
+primary-key lookup, however large the course is.
+
+version is the last transaction that touched the course's Results rows, grade
+changes included, so it can be used as a cache key.
+"""
+
+import math
+
+from transactions import create_statement_triggers
+
+BUCKETS = 101  # whole marks 0..100; marks outside the range go in the end buckets
+
+STATISTICS_SCRIPT = f"""CREATE TABLE IF NOT EXISTS course_statistics (
+    course_id INT PRIMARY KEY,
+    count BIGINT NOT NULL DEFAULT 0,
+    total FLOAT NOT NULL DEFAULT 0,
+    mean FLOAT NOT NULL DEFAULT 0,
+    m2 FLOAT NOT NULL DEFAULT 0,
+    min FLOAT,
+    max FLOAT,
+    buckets INT[] NOT NULL DEFAULT array_fill(0, ARRAY[{BUCKETS}]),
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);"""
+
+# No foreign key to Courses: when a course is deleted, its statistics row may be
+# cascaded away before the Results delete trigger runs, and merging would
+# recreate it. The merge removes rows for missing courses instead.
+MERGE_FUNCTION_SCRIPT = f"""CREATE OR REPLACE FUNCTION course_statistics_merge(
+    p_courses INT[], p_marks FLOAT8[], p_sign INT
+) RETURNS void AS $$
+DECLARE
+    b RECORD;
+    s course_statistics%ROWTYPE;
+    n BIGINT;
+    new_mean FLOAT8;
+    delta FLOAT8;
+    bucket INT;
+BEGIN
+    FOR b IN
+        SELECT c AS course_id, COUNT(m) AS n, COALESCE(AVG(m), 0) AS mean,
+            COALESCE(VAR_POP(m) * COUNT(m), 0) AS m2, MIN(m) AS lo, MAX(m) AS hi,
+            array_agg(LEAST(GREATEST(floor(m)::int, 0), {BUCKETS - 1}) + 1) FILTER (WHERE m IS NOT NULL) AS buckets
+        FROM unnest(p_courses, p_marks) AS t (c, m)
+        GROUP BY c
+        -- Sorted so that concurrent statements lock statistics rows in the same order.
+        ORDER BY c
+    LOOP
+        IF NOT EXISTS (SELECT 1 FROM Courses WHERE course_id = b.course_id) THEN
+            DELETE FROM course_statistics WHERE course_id = b.course_id;
+            CONTINUE;
+        END IF;
+        INSERT INTO course_statistics (course_id) VALUES (b.course_id) ON CONFLICT (course_id) DO NOTHING;
+        SELECT * INTO s FROM course_statistics WHERE course_id = b.course_id FOR UPDATE;
+
+        IF b.n > 0 THEN
+            IF p_sign > 0 THEN
+                n := s.count + b.n;
+                delta := b.mean - s.mean;
+                s.mean := s.mean + delta * b.n / n;
+                s.m2 := s.m2 + b.m2 + delta * delta * s.count * b.n / n;
+                s.min := LEAST(s.min, b.lo);
+                s.max := GREATEST(s.max, b.hi);
+            ELSE
+                n := s.count - b.n;
+                IF n <= 0 THEN
+                    n := 0;
+                    s.mean := 0;
+                    s.m2 := 0;
+                    s.min := NULL;
+                    s.max := NULL;
+                ELSE
+                    new_mean := (s.count * s.mean - b.n * b.mean) / n;
+                    delta := b.mean - new_mean;
+                    s.m2 := GREATEST(s.m2 - b.m2 - delta * delta * n * b.n / s.count, 0);
+                    s.mean := new_mean;
+                    -- The old extreme may be gone; Results already holds the new rows.
+                    IF b.lo <= s.min OR b.hi >= s.max THEN
+                        SELECT MIN(total_marks), MAX(total_marks) INTO s.min, s.max
+                        FROM Results WHERE course_id = b.course_id;
+                    END IF;
+                END IF;
+            END IF;
+            s.count := n;
+            FOREACH bucket IN ARRAY b.buckets LOOP
+                s.buckets[bucket] := s.buckets[bucket] + p_sign;
+            END LOOP;
+        END IF;
+
+        UPDATE course_statistics
+        SET count = s.count, total = s.mean * s.count, mean = s.mean, m2 = s.m2,
+            min = s.min, max = s.max, buckets = s.buckets,
+            version = txid_current(), updated_at = CURRENT_TIMESTAMP
+        WHERE course_id = b.course_id;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;"""
+
+TRIGGER_FUNCTION_SCRIPT = """CREATE OR REPLACE FUNCTION maintain_course_statistics() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM course_statistics_merge(array_agg(course_id), array_agg(total_marks), 1) FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM course_statistics_merge(array_agg(course_id), array_agg(total_marks), -1) FROM old_rows;
+    ELSE
+        -- Every touched course is locked up front in course order, as in the merge,
+        -- so two grading runs over the same courses cannot deadlock.
+        PERFORM 1 FROM course_statistics
+        WHERE course_id IN (SELECT course_id FROM new_rows UNION SELECT course_id FROM old_rows)
+        ORDER BY course_id
+        FOR UPDATE;
+        -- Only rows whose marks moved change the figures.
+        PERFORM course_statistics_merge(array_agg(o.course_id), array_agg(o.total_marks), -1)
+        FROM old_rows o JOIN new_rows n ON n.result_id = o.result_id
+        WHERE o.total_marks IS DISTINCT FROM n.total_marks OR o.course_id <> n.course_id;
+        PERFORM course_statistics_merge(array_agg(n.course_id), array_agg(n.total_marks), 1)
+        FROM old_rows o JOIN new_rows n ON n.result_id = o.result_id
+        WHERE o.total_marks IS DISTINCT FROM n.total_marks OR o.course_id <> n.course_id;
+        -- Grades may have changed on their own, so every touched course gets a new version.
+        UPDATE course_statistics SET version = txid_current()
+        WHERE course_id IN (SELECT DISTINCT course_id FROM new_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;"""
+
+REBUILD_SCRIPT = f"""WITH marks AS (
+        SELECT course_id, total_marks FROM Results
+        WHERE total_marks IS NOT NULL AND (%(all)s OR course_id = ANY(%(courses)s))
+    ),
+    summary AS (
+        SELECT course_id, COUNT(*) AS n, SUM(total_marks) AS total, AVG(total_marks) AS mean,
+            COALESCE(VAR_POP(total_marks) * COUNT(*), 0) AS m2, MIN(total_marks) AS lo, MAX(total_marks) AS hi
+        FROM marks GROUP BY course_id
+    ),
+    counts AS (
+        SELECT course_id, LEAST(GREATEST(floor(total_marks)::int, 0), {BUCKETS - 1}) + 1 AS bucket, COUNT(*) AS n
+        FROM marks GROUP BY 1, 2
+    ),
+    histograms AS (
+        SELECT c.course_id, array_agg(COALESCE(counts.n, 0)::int ORDER BY b) AS buckets
+        FROM Courses c
+        CROSS JOIN generate_series(1, {BUCKETS}) AS b
+        LEFT JOIN counts ON counts.course_id = c.course_id AND counts.bucket = b
+        WHERE %(all)s OR c.course_id = ANY(%(courses)s)
+        GROUP BY c.course_id
+    )
+    INSERT INTO course_statistics (course_id, count, total, mean, m2, min, max, buckets, version)
+    SELECT h.course_id, COALESCE(s.n, 0), COALESCE(s.total, 0), COALESCE(s.mean, 0), COALESCE(s.m2, 0),
+        s.lo, s.hi, h.buckets, txid_current()
+    FROM histograms h
+    LEFT JOIN summary s ON s.course_id = h.course_id
+    ON CONFLICT (course_id) DO UPDATE SET
+        count = EXCLUDED.count, total = EXCLUDED.total, mean = EXCLUDED.mean, m2 = EXCLUDED.m2,
+        min = EXCLUDED.min, max = EXCLUDED.max, buckets = EXCLUDED.buckets,
+        version = EXCLUDED.version, updated_at = CURRENT_TIMESTAMP"""
+
+COLUMNS = ("course_id", "count", "total", "mean", "m2", "min", "max", "buckets", "version")
+
+
+def create_course_statistics(conn, cursor):
+    """Create course_statistics and its triggers, filling it from Results the first time."""
+    try:
+        cursor.execute("SELECT to_regclass('course_statistics') IS NULL")
+        new = cursor.fetchone()[0]
+        cursor.execute(STATISTICS_SCRIPT)
+        cursor.execute(MERGE_FUNCTION_SCRIPT)
+        cursor.execute(TRIGGER_FUNCTION_SCRIPT)
+        create_statement_triggers(cursor, "Results", "maintain_course_statistics", "results_statistics")
+        if new:
+            # Lock out writers so no change slips in between the fill and the triggers.
+            cursor.execute("LOCK TABLE Results IN SHARE MODE")
+            cursor.execute(REBUILD_SCRIPT, {"all": True, "courses": []})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def rebuild_course_statistics(conn, cursor, course_ids=None):
+    """Recompute the statistics exactly from Results, for some courses or all of them."""
+    try:
+        cursor.execute("LOCK TABLE Results IN SHARE MODE")
+        cursor.execute(REBUILD_SCRIPT, {"all": course_ids is None, "courses": list(course_ids or [])})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def fetch_course_statistics(cursor, course_ids=None):
+    """Return {course_id: statistics dict}, for some courses or all of them."""
+    query = f"SELECT {', '.join(COLUMNS)} FROM course_statistics"
+    if course_ids is None:
+        cursor.execute(query)
+    else:
+        cursor.execute(query + " WHERE course_id = ANY(%s)", (list(course_ids),))
+    return {row[0]: dict(zip(COLUMNS, row)) for row in cursor.fetchall()}
+
+
+def combine(statistics):
+    """Merge several courses' statistics into one, e.g. for the all-courses chart."""
+    combined = {"count": 0, "total": 0.0, "mean": 0.0, "m2": 0.0, "min": None, "max": None, "buckets": [0] * BUCKETS}
+    for s in statistics:
+        if not s["count"]:
+            continue
+        n = combined["count"] + s["count"]
+        delta = s["mean"] - combined["mean"]
+        combined["mean"] += delta * s["count"] / n
+        combined["m2"] += s["m2"] + delta * delta * combined["count"] * s["count"] / n
+        combined["count"] = n
+        combined["total"] += s["total"]
+        combined["min"] = s["min"] if combined["min"] is None else min(combined["min"], s["min"])
+        combined["max"] = s["max"] if combined["max"] is None else max(combined["max"], s["max"])
+        combined["buckets"] = [a + b for a, b in zip(combined["buckets"], s["buckets"])]
+    return combined
+
+
+def stddev(statistics, sample=True):
+    """Standard deviation from M2. sample=True matches PostgreSQL's STDDEV."""
+    n = statistics["count"] - (1 if sample else 0)
+    return math.sqrt(statistics["m2"] / n) if n > 0 else None
+
+
+def quantile(statistics, q):
+    """Approximate the q-quantile from the histogram, to within one mark."""
+    buckets = statistics["buckets"]
+    total = sum(buckets)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for mark, count in enumerate(buckets):
+        if count and seen + count >= target:
+            # Interpolate inside the bucket, then clamp to the exact extremes.
+            value = mark + (target - seen) / count
+            return min(max(value, statistics["min"]), statistics["max"])
+        seen += count
+    return statistics["max"]
@@ -0,0 +1,199 @@
+"""Streaming export of grades, attendance, feedback and registrations.
+
+CSV exports are streamed straight from COPY ... TO STDOUT into the output
+file. Parquet exports read the rows through a server-side cursor in fixed-size
+chunks, so memory use stays the same however large the table is.
+
+Usage:
+    python export_data.py results --semester 3 --output results_s3.csv
+    python export_data.py attendance --course 12 --format parquet --output attendance_c12
+"""
+
+import argparse
+import gzip
+import os
+
+from Project import close_db, connect_db
+
+# name -> (query, course column, semester column)
+EXPORTS = {
+    "results": (
+        """SELECT r.result_id, r.user_id, r.course_id, c.semester, r.quiz1, r.quiz2,
+               r.midterm, r.final, r.total_marks, r.grade
+        FROM Results r
+        JOIN Courses c ON r.course_id = c.course_id""",
+        "r.course_id",
+        "c.semester",
+    ),
+    "attendance": (
+        """SELECT a.attendance_id, a.user_id, a.course_id, c.semester, a.date, a.status
+        FROM Attendance a
+        JOIN Courses c ON a.course_id = c.course_id""",
+        "a.course_id",
+        "c.semester",
+    ),
+    "feedback": (
+        """SELECT f.feedback_id, f.sender_id, f.course_id, c.semester, f.instructor_id,
+               f.rating, f.comments, f.time
+        FROM feedback f
+        JOIN Courses c ON f.course_id = c.course_id""",
+        "f.course_id",
+        "c.semester",
+    ),
+    # Registrations carry their own semester.
+    "registrations": (
+        """SELECT r.registration_id, r.user_id, r.course_id, r.semester, r.status
+        FROM Registrations r""",
+        "r.course_id",
+        "r.semester",
+    ),
+}
+
+# PostgreSQL type OIDs -> pyarrow type names.
+ARROW_TYPES = {
+    16: "bool_",
+    20: "int64",
+    21: "int16",
+    23: "int32",
+    700: "float32",
+    701: "float64",
+    1082: "date32",
+}
+
+
+def arrow_schema(description):
+    """Build a pyarrow schema from a cursor description."""
+    import pyarrow as pa
+
+    fields = []
+    for column in description:
+        if column.type_code in ARROW_TYPES:
+            arrow_type = getattr(pa, ARROW_TYPES[column.type_code])()
+        elif column.type_code == 1114:  # timestamp
+            arrow_type = pa.timestamp("us")
+        else:
+            arrow_type = pa.string()
+        fields.append((column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def export_query(cursor, name, course_id=None, semester=None):
+    """Return the SELECT statement for an export with its filters bound in."""
+    query, course_column, semester_column = EXPORTS[name]
+    conditions = []
+    params = []
+    if course_id is not None:
+        conditions.append(f"{course_column} = %s")
+        params.append(course_id)
+    if semester is not None:
+        conditions.append(f"{semester_column} = %s")
+        params.append(str(semester))
+    if conditions:
+        query += "\n        WHERE " + " AND ".join(conditions)
+    return cursor.mogrify(query, params).decode()
+
+
+def export_csv(conn, cursor, name, path, course_id=None, semester=None, compress=False):
+    """Stream an export into a CSV file with COPY TO STDOUT.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        name (str): One of EXPORTS.
+        path (str): Output file. Written gzip-compressed if compress is True.
+        course_id (int, optional): Only export this course.
+        semester (str, optional): Only export this semester.
+    """
+    query = export_query(cursor, name, course_id, semester)
+    opener = gzip.open if compress else open
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    conn.commit()
+
+
+def export_parquet(
+    conn, name, directory, course_id=None, semester=None, chunk_rows=50000, rows_per_file=1000000
+):
+    """Stream an export into a directory of Parquet files.
+
+    Rows are fetched through a server-side cursor chunk_rows at a time and
+    each chunk becomes one row group. A new part file is started every
+    rows_per_file rows.
+
+    Returns:
+        list: Paths of the files written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    writer = None
+    rows_in_file = 0
+
+    with conn.cursor() as cursor:
+        query = export_query(cursor, name, course_id, semester)
+    cursor = conn.cursor(name=f"export_{name}")
+    cursor.itersize = chunk_rows
+    try:
+        cursor.execute(query)
+        schema = None
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if schema is None:
+                # The description is only available after the first fetch on a named cursor.
+                schema = arrow_schema(cursor.description)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            table = pa.table(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema,
+            )
+            if writer is None or rows_in_file >= rows_per_file:
+                if writer:
+                    writer.close()
+                paths.append(os.path.join(directory, f"{name}-part-{len(paths):05d}.parquet"))
+                writer = pq.ParquetWriter(paths[-1], schema, compression="zstd")
+                rows_in_file = 0
+            writer.write_table(table)
+            rows_in_file += len(rows)
+        if writer is None:
+            # Still write an empty file so consumers see the schema.
+            paths.append(os.path.join(directory, f"{name}-part-00000.parquet"))
+            pq.write_table(schema.empty_table(), paths[-1])
+    finally:
+        if writer:
+            writer.close()
+        cursor.close()
+        conn.commit()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("--course", type=int, help="Only export this course_id.")
+    parser.add_argument("--semester", help="Only export this semester.")
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--gzip", action="store_true", help="Compress CSV output.")
+    parser.add_argument("--chunk-rows", type=int, default=50000, help="Rows per Parquet row group.")
+    parser.add_argument("--output", required=True, help="CSV file, or directory for Parquet parts.")
+    args = parser.parse_args()
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        if args.format == "csv":
+            export_csv(conn, cursor, args.table, args.output, args.course, args.semester, args.gzip)
+            print(f"Wrote {args.output}")
+        else:
+            paths = export_parquet(conn, args.table, args.output, args.course, args.semester, args.chunk_rows)
+            print(f"Wrote {len(paths)} file(s) to {args.output}")
+    finally:
+        close_db(conn, cursor)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Feedback rating rollups per instructor and course.
+
+feedback_rollups holds, for every (instructor_id, course_id) pair, the number
+of responses, the number and sum of ratings, and how many ratings were 1, 2,
+3, 4 and 5. Statement-level triggers with transition tables fold each
+statement's inserted, updated and deleted feedback into it, so it is always
+current without recounting. Feedback without an instructor is kept under
+instructor_id 0.
+
+Instructor and semester figures are sums over these rows, one per course,
+so even an instructor with thousands of responses costs a handful of rows
+to read. The comments behind a figure are read a page at a time.
+"""
+
+from transactions import create_statement_triggers, unit_of_work
+
+RATINGS = range(1, 6)
+PAGE_SIZE = 50
+
+ROLLUP_SCRIPT = f"""CREATE TABLE IF NOT EXISTS feedback_rollups (
+    instructor_id INT NOT NULL,
+    course_id INT NOT NULL,
+    responses INT NOT NULL DEFAULT 0,
+    rating_count INT NOT NULL DEFAULT 0,
+    rating_sum INT NOT NULL DEFAULT 0,
+    {", ".join(f"rating_{r} INT NOT NULL DEFAULT 0" for r in RATINGS)},
+    PRIMARY KEY (instructor_id, course_id)
+);"""
+
+COUNT_COLUMNS = ("responses", "rating_count", "rating_sum") + tuple(f"rating_{r}" for r in RATINGS)
+
+
+def _apply(source):
+    """SQL that adds the signed rows of source (instructor_id, course_id, rating, sign) to the rollups."""
+    counts = ", ".join(
+        f"COALESCE({expression}, 0)"
+        for expression in ["SUM(sign)", "SUM(sign) FILTER (WHERE rating IS NOT NULL)", "SUM(sign * rating)"]
+        + [f"SUM(sign) FILTER (WHERE rating = {r})" for r in RATINGS]
+    )
+    updates = ", ".join(f"{c} = r.{c} + EXCLUDED.{c}" for c in COUNT_COLUMNS)
+    # Sorted so that concurrent statements lock rollup rows in the same order.
+    return f"""INSERT INTO feedback_rollups AS r (instructor_id, course_id, {", ".join(COUNT_COLUMNS)})
+        SELECT COALESCE(instructor_id, 0), course_id, {counts}
+        FROM ({source}) AS changes
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (instructor_id, course_id) DO UPDATE SET {updates};"""
+
+
+# A course's rollup may be touched by a cascaded delete after the course is
+# gone, so there is no foreign key; emptied rows are removed instead.
+TRIGGER_FUNCTION_SCRIPT = f"""CREATE OR REPLACE FUNCTION maintain_feedback_rollups() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {_apply("SELECT instructor_id, course_id, rating, 1 AS sign FROM new_rows")}
+    ELSIF TG_OP = 'DELETE' THEN
+        {_apply("SELECT instructor_id, course_id, rating, -1 AS sign FROM old_rows")}
+    ELSE
+        {_apply(
+            "SELECT instructor_id, course_id, rating, -1 AS sign FROM old_rows "
+            "UNION ALL SELECT instructor_id, course_id, rating, 1 FROM new_rows"
+        )}
+    END IF;
+    DELETE FROM feedback_rollups WHERE responses <= 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;"""
+
+REBUILD_SCRIPT = "DELETE FROM feedback_rollups; " + _apply(
+    "SELECT instructor_id, course_id, rating, 1 AS sign FROM feedback"
+)
+
+# Level -> (GROUP BY columns, the course_id, title and semester columns returned).
+LEVELS = {
+    "instructor": ("r.instructor_id", "NULL::int, NULL::text, NULL::varchar"),
+    "semester": ("r.instructor_id, c.semester", "NULL::int, NULL::text, c.semester"),
+    "course": ("r.instructor_id, r.course_id, c.title, c.semester", "r.course_id, c.title, c.semester"),
+}
+
+
+def create_feedback_rollups(conn, cursor):
+    """Create feedback_rollups and its triggers, filling it from feedback the first time."""
+    with unit_of_work(conn):
+        cursor.execute("SELECT to_regclass('feedback_rollups') IS NULL")
+        new = cursor.fetchone()[0]
+        cursor.execute(ROLLUP_SCRIPT)
+        cursor.execute(TRIGGER_FUNCTION_SCRIPT)
+        create_statement_triggers(cursor, "feedback", "maintain_feedback_rollups", "feedback_rollups")
+        cursor.execute("CREATE INDEX IF NOT EXISTS feedback_instructor_idx ON feedback (instructor_id, feedback_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS feedback_course_idx ON feedback (course_id, feedback_id)")
+        if new:
+            # Lock out writers so no feedback slips in between the fill and the triggers.
+            cursor.execute("LOCK TABLE feedback IN SHARE MODE")
+            cursor.execute(REBUILD_SCRIPT)
+
+
+def rebuild_feedback_rollups(conn, cursor):
+    """Recompute the rollups exactly from feedback."""
+    with unit_of_work(conn):
+        cursor.execute("LOCK TABLE feedback IN SHARE MODE")
+        cursor.execute(REBUILD_SCRIPT)
+
+
+def fetch_rollups(cursor, level="instructor", semester=None):
+    """Return rating figures per instructor, per instructor and semester, or per course.
+
+    Args:
+        cursor : The database cursor object.
+        level (str, optional): 'instructor', 'semester' or 'course'. Defaults to 'instructor'.
+        semester (str, optional): Only count courses in this semester.
+    Returns:
+        list: Dicts with instructor_id, instructor, course_id, title, semester, responses,
+        rating_count, rating_sum, average and histogram (counts of ratings 1-5), best average first.
+    """
+    group, shown = LEVELS[level]
+    sums = ", ".join(f"SUM(r.{c})" for c in COUNT_COLUMNS)
+    where = "WHERE c.semester = %s" if semester is not None else ""
+    cursor.execute(
+        f"""SELECT r.instructor_id, MAX(u.name), {shown}, {sums}
+        FROM feedback_rollups r
+        JOIN Courses c ON c.course_id = r.course_id
+        LEFT JOIN Users u ON u.user_id = r.instructor_id
+        {where}
+        GROUP BY {group}
+        ORDER BY SUM(r.rating_sum)::float / NULLIF(SUM(r.rating_count), 0) DESC NULLS LAST, 1""",
+        [] if semester is None else [str(semester)],
+    )
+    rollups = []
+    for instructor_id, name, course_id, title, course_semester, *counts in cursor.fetchall():
+        counts = dict(zip(COUNT_COLUMNS, counts))
+        rollups.append(
+            {
+                "instructor_id": instructor_id,
+                "instructor": name,
+                "course_id": course_id,
+                "title": title,
+                "semester": course_semester,
+                "responses": counts["responses"],
+                "rating_count": counts["rating_count"],
+                "rating_sum": counts["rating_sum"],
+                "average": counts["rating_sum"] / counts["rating_count"] if counts["rating_count"] else None,
+                "histogram": [counts[f"rating_{r}"] for r in RATINGS],
+            }
+        )
+    return rollups
+
+
+def fetch_comments(cursor, instructor_id=None, course_id=None, semester=None, before=None, limit=PAGE_SIZE):
+    """Return one page of feedback behind a rollup, newest first.
+
+    Pages are keyed on feedback_id rather than an offset, so every page is an
+    index range scan however deep the caller has paged.
+
+    Args:
+        cursor : The database cursor object.
+        instructor_id (int, optional): Only this instructor's feedback; 0 for feedback without one.
+        course_id (int, optional): Only this course's feedback.
+        semester (str, optional): Only feedback for courses in this semester.
+        before (int, optional): The last feedback_id of the previous page.
+        limit (int, optional): Page size. Defaults to PAGE_SIZE.
+    Returns:
+        list: (feedback_id, time, course title, rating, comments).
+    """
+    conditions = []
+    params = []
+    if instructor_id == 0:
+        conditions.append("f.instructor_id IS NULL")
+    elif instructor_id is not None:
+        conditions.append("f.instructor_id = %s")
+        params.append(instructor_id)
+    if course_id is not None:
+        conditions.append("f.course_id = %s")
+        params.append(course_id)
+    if semester is not None:
+        conditions.append("c.semester = %s")
+        params.append(str(semester))
+    if before is not None:
+        conditions.append("f.feedback_id < %s")
+        params.append(before)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    cursor.execute(
+        f"""SELECT f.feedback_id, f.time, c.title, f.rating, f.comments
+        FROM feedback f
+        JOIN Courses c ON c.course_id = f.course_id
+        {where}
+        ORDER BY f.feedback_id DESC
+        LIMIT %s""",
+        params + [limit],
+    )
+    return cursor.fetchall()
@@ -0,0 +1,243 @@
+"""Batch per-course grade reports.
+
+Every course's statistics, including its marks histogram, are read from
+course_statistics with one query. Courses whose statistics version matches the
+manifest from the previous run are skipped. Grade counts for the remaining
+courses are fetched with a second query, and their reports are rendered in a
+process pool with matplotlib's headless Agg backend. Each report has a
+distribution chart and a statistics table. An index.html listing every report
+is written at the end.
+
+Usage:
+    python grade_reports.py --output reports --semester 3 --format png pdf
+"""
+
+import argparse
+import html
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from charts import draw_bucket_distribution
+from course_statistics import quantile, stddev
+
+GRADES = ("A", "B", "C", "D", "F")
+
+STATISTICS_QUERY = """SELECT c.course_id, c.title, c.semester, u.name,
+        s.count, s.mean, s.m2, s.min, s.max, s.buckets, s.version
+    FROM Courses c
+    LEFT JOIN Users u ON c.instructor_id = u.user_id
+    LEFT JOIN course_statistics s ON s.course_id = c.course_id
+    {where}
+    ORDER BY c.course_id"""
+
+
+def fetch_statistics(cursor, semester=None, course_ids=None):
+    """Return a statistics dict per course, keyed by course_id."""
+    conditions = []
+    params = []
+    if semester is not None:
+        conditions.append("c.semester = %s")
+        params.append(str(semester))
+    if course_ids:
+        conditions.append("c.course_id = ANY(%s)")
+        params.append(list(course_ids))
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    cursor.execute(STATISTICS_QUERY.format(where=where), params)
+    statistics = {}
+    for course_id, title, semester, instructor, count, mean, m2, low, high, buckets, version in cursor.fetchall():
+        stats = {"count": count or 0, "mean": mean, "m2": m2 or 0, "min": low, "max": high, "buckets": buckets}
+        has_marks = bool(count)
+        statistics[course_id] = {
+            "course_id": course_id,
+            "title": title,
+            "semester": semester,
+            "instructor": instructor,
+            "count": stats["count"],
+            "mean": mean if has_marks else None,
+            "stddev": stddev(stats) if has_marks else None,
+            "population_stddev": stddev(stats, sample=False) if has_marks else None,
+            "min": low,
+            "max": high,
+            "quartiles": [quantile(stats, q) for q in (0.25, 0.5, 0.75)] if has_marks else None,
+            "buckets": buckets,
+            "version": version or 0,
+        }
+    return statistics
+
+
+def fetch_grade_counts(cursor, course_ids):
+    """Return {course_id: {grade: count}} for the given courses in one query."""
+    cursor.execute(
+        """SELECT course_id, grade, COUNT(*) FROM Results
+        WHERE course_id = ANY(%s) AND grade = ANY(%s)
+        GROUP BY course_id, grade""",
+        (list(course_ids), list(GRADES)),
+    )
+    counts = {course_id: dict.fromkeys(GRADES, 0) for course_id in course_ids}
+    for course_id, grade, n in cursor.fetchall():
+        counts[course_id][grade] = n
+    return counts
+
+
+def fingerprint(stats):
+    # The title, semester and instructor are printed on the report, so a change to them needs a new one too.
+    return "|".join(str(stats[key]) for key in ("version", "title", "semester", "instructor"))
+
+
+def _format(value):
+    return "-" if value is None else f"{value:.2f}" if isinstance(value, float) else str(value)
+
+
+def render_report(job):
+    """Render one course's report. Runs in a worker process.
+
+    Args:
+        job (tuple): (stats, directory, formats).
+    Returns:
+        tuple: (course_id, list of file names written).
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    stats, directory, formats = job
+    figure = Figure(figsize=(8.27, 11.69))  # A4 portrait
+    FigureCanvasAgg(figure)
+    chart, table = figure.subplots(2, 1, gridspec_kw={"height_ratios": [3, 2]})
+    title = f"{stats['title']} ({stats['course_id']})"
+    if stats["count"]:
+        draw_bucket_distribution(chart, stats["buckets"], stats["mean"], stats["population_stddev"], title)
+    else:
+        chart.set_title(title)
+        chart.text(0.5, 0.5, "No marks entered", ha="center", va="center", transform=chart.transAxes)
+        chart.set_axis_off()
+
+    quartiles = stats["quartiles"] or [None, None, None]
+    rows = [
+        ("Semester", stats["semester"] or "-"),
+        ("Instructor", stats["instructor"] or "-"),
+        ("Students with marks", stats["count"]),
+        ("Mean", _format(stats["mean"])),
+        ("Standard deviation", _format(stats["stddev"])),
+        ("Minimum", _format(stats["min"])),
+        ("Lower quartile", _format(quartiles[0])),
+        ("Median", _format(quartiles[1])),
+        ("Upper quartile", _format(quartiles[2])),
+        ("Maximum", _format(stats["max"])),
+    ] + [(f"Grade {grade}", n) for grade, n in stats["grades"].items()]
+    table.set_axis_off()
+    table.table(cellText=[[name, str(value)] for name, value in rows], loc="center", colWidths=[0.4, 0.3])
+    figure.tight_layout()
+
+    files = []
+    for extension in formats:
+        name = f"course_{stats['course_id']}.{extension}"
+        figure.savefig(os.path.join(directory, name), format=extension)
+        files.append(name)
+    return stats["course_id"], files
+
+
+def write_index(directory, manifest):
+    rows = []
+    for entry in sorted(manifest.values(), key=lambda e: (str(e["semester"]), e["course_id"])):
+        links = " ".join(f'<a href="{html.escape(name)}">{html.escape(name.rsplit(".", 1)[1])}</a>' for name in entry["files"])
+        rows.append(
+            f"<tr><td>{entry['course_id']}</td><td>{html.escape(entry['title'] or '')}</td>"
+            f"<td>{html.escape(str(entry['semester'] or ''))}</td><td>{entry['count']}</td>"
+            f"<td>{_format(entry['mean'])}</td><td>{links}</td></tr>"
+        )
+    with open(os.path.join(directory, "index.html"), "w", encoding="utf-8") as f:
+        f.write(
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Grade reports</title></head><body>\n"
+            "<h1>Grade reports</h1>\n<table border=\"1\">\n"
+            "<tr><th>Course</th><th>Title</th><th>Semester</th><th>Students</th><th>Mean</th><th>Report</th></tr>\n"
+            + "\n".join(rows)
+            + "\n</table>\n</body></html>\n"
+        )
+
+
+def generate_reports(conn, cursor, directory, semester=None, course_ids=None, formats=("png", "pdf"), workers=None, force=False):
+    """Render reports for every matching course whose data changed since the last run.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        directory (str): Output directory. Holds the reports, manifest.json and index.html.
+        semester (str, optional): Only report on this semester.
+        course_ids (list, optional): Only report on these courses.
+        formats (tuple, optional): Any of 'png', 'pdf' and 'svg'.
+        workers (int, optional): Worker processes. Defaults to the number of CPUs.
+        force (bool, optional): Render every course even if it is unchanged.
+    Returns:
+        tuple: (rendered, skipped) course counts.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, "manifest.json")
+    try:
+        with open(manifest_path) as f:
+            manifest = {int(k): v for k, v in json.load(f).items()}
+    except (OSError, ValueError):
+        manifest = {}
+
+    statistics = fetch_statistics(cursor, semester, course_ids)
+    if semester is None and not course_ids:
+        # A full run also drops courses that no longer exist.
+        manifest = {c: entry for c, entry in manifest.items() if c in statistics}
+    stale = []
+    for course_id, stats in statistics.items():
+        entry = manifest.get(course_id)
+        if (
+            force
+            or not entry
+            or entry["fingerprint"] != fingerprint(stats)
+            or set(formats) - {name.rsplit(".", 1)[1] for name in entry["files"]}
+            or not all(os.path.exists(os.path.join(directory, name)) for name in entry["files"])
+        ):
+            stale.append(course_id)
+    grades = fetch_grade_counts(cursor, stale) if stale else {}
+    conn.commit()
+    for course_id in stale:
+        statistics[course_id]["grades"] = grades[course_id]
+
+    jobs = [(statistics[c], directory, tuple(formats)) for c in stale]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Larger chunks cut the per-task overhead when there are hundreds of small courses.
+        chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 4))
+        for course_id, files in pool.map(render_report, jobs, chunksize=chunksize):
+            entry = {key: value for key, value in statistics[course_id].items() if key != "buckets"}
+            manifest[course_id] = dict(entry, fingerprint=fingerprint(statistics[course_id]), files=files)
+
+    tmp = manifest_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+    os.replace(tmp, manifest_path)
+    write_index(directory, manifest)
+    return len(stale), len(statistics) - len(stale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="reports", help="Output directory. Defaults to reports.")
+    parser.add_argument("--semester", help="Only report on this semester.")
+    parser.add_argument("--course", type=int, action="append", help="Only report on this course_id. May be repeated.")
+    parser.add_argument("--format", nargs="+", choices=("png", "pdf", "svg"), default=["png", "pdf"])
+    parser.add_argument("--workers", type=int, help="Worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--force", action="store_true", help="Render every course even if it is unchanged.")
+    args = parser.parse_args()
+
+    from Project import close_db, connect_db
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        rendered, skipped = generate_reports(
+            conn, cursor, args.output, args.semester, args.course, args.format, args.workers, args.force
+        )
+    finally:
+        close_db(conn, cursor)
+    print(f"Rendered {rendered} report(s), {skipped} unchanged; see {os.path.join(args.output, 'index.html')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Multi-process load generator for the LMS database.
+
+Each worker process plays scripted student, instructor or admin sessions
+using the same queries as the application. Concurrency is ramped up in
+stages and throughput, tail latency, lock waits and errors are reported per
+operation.
+
+Usage:
+    python load_test.py --scale 10 --stages 1,4,16,64 --stage-seconds 30
+    python load_test.py --dsn "dbname=LMS user=postgres host=localhost" --stages 8,32
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing as mp
+import os
+import random
+import threading
+import time
+
+import psycopg2 as pg
+
+from Project import create_tables
+from benchmark import TempCluster, generate_data, percentiles, query_paths, scaled_counts
+
+SESSIONS = {
+    "student": [
+        "authenticate_user",
+        "view_courses",
+        "view_grades",
+        "view_attendance",
+        "view_calendar",
+        "view_discussion_threads",
+        "view_thread_replies",
+        "reply_to_thread",
+    ],
+    "instructor": [
+        "authenticate_user",
+        "populate_course_combobox",
+        "submit_marks.load",
+        "submit_marks",
+        "submit_marks.load",
+        "submit_marks",
+        "submit_marks.load",
+        "submit_marks",
+        "submit_marks.load",
+        "submit_marks.insert",
+        "view_rechecking_requests",
+        "view_rechecking_requests.held",
+        "claim_rechecking_requests",
+        "relative_grading.stats",
+        "relative_grading",
+        "absolute_grading",
+    ],
+    "admin": [
+        "authenticate_user",
+        "view_users",
+        "view_all_courses",
+        "view_feedback",
+        "view_feedback.comments",
+        "view_rechecking_requests",
+        "plot_percentage_distribution.all",
+    ],
+}
+
+ROLE_WEIGHTS = {"student": 80, "instructor": 15, "admin": 5}
+
+
+def worker(dsn, counts, role, deadline, think_time, seed, results):
+    """Run sessions for one simulated user until the deadline and report the samples."""
+    rng = random.Random(seed)
+    paths = {name: (query, params_fn) for name, _, query, params_fn in query_paths(counts)}
+    samples = {}
+    errors = {}
+    sessions = 0
+
+    conn = None
+    # Always report, even if the worker cannot connect or loses its connection;
+    # run_stage waits for one report per worker.
+    try:
+        conn = pg.connect(dsn)
+        cursor = conn.cursor()
+        while time.time() < deadline:
+            for name in SESSIONS[role]:
+                if time.time() >= deadline:
+                    break
+                query, params_fn = paths[name]
+                params = params_fn(rng) if params_fn else None
+                start = time.perf_counter()
+                try:
+                    cursor.execute(query, params)
+                    if cursor.description:
+                        cursor.fetchall()
+                    conn.commit()  # execute_query commits after every statement
+                    samples.setdefault(name, []).append(time.perf_counter() - start)
+                except pg.Error as e:
+                    key = f"{name}: {e.pgcode or type(e).__name__}"
+                    errors[key] = errors.get(key, 0) + 1
+                    conn.rollback()
+                if think_time:
+                    time.sleep(think_time)
+            sessions += 1
+    except Exception as e:
+        key = f"worker: {getattr(e, 'pgcode', None) or type(e).__name__}"
+        errors[key] = errors.get(key, 0) + 1
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except pg.Error:
+                pass
+        results.put({"role": role, "sessions": sessions, "samples": samples, "errors": errors})
+
+
+def sample_lock_waits(dsn, stop, out, interval=0.1):
+    """Record how many backends are waiting on a heavyweight lock, every interval seconds."""
+    conn = pg.connect(dsn)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    while not stop.is_set():
+        cursor.execute(
+            "SELECT COUNT(*) FROM pg_stat_activity WHERE wait_event_type = 'Lock' AND datname = current_database()"
+        )
+        out.append(cursor.fetchone()[0])
+        stop.wait(interval)
+    conn.close()
+
+
+def run_stage(dsn, counts, users, seconds, think_time, seed):
+    """Run one concurrency level and return its summary."""
+    rng = random.Random(seed)
+    roles = rng.choices(list(ROLE_WEIGHTS), weights=list(ROLE_WEIGHTS.values()), k=users)
+    results = mp.Queue()
+    deadline = time.time() + seconds
+    procs = [
+        mp.Process(target=worker, args=(dsn, counts, role, deadline, think_time, seed * 1000 + i, results))
+        for i, role in enumerate(roles)
+    ]
+
+    lock_samples = []
+    stop = threading.Event()
+    sampler = threading.Thread(target=sample_lock_waits, args=(dsn, stop, lock_samples))
+    sampler.start()
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    # Drain the queue before joining so large payloads cannot block the workers.
+    reports = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    sampler.join()
+
+    samples = {}
+    errors = {}
+    for report in reports:
+        for name, values in report["samples"].items():
+            samples.setdefault(name, []).extend(values)
+        for key, n in report["errors"].items():
+            errors[key] = errors.get(key, 0) + n
+
+    total_ops = sum(len(v) for v in samples.values())
+    return {
+        "users": users,
+        "roles": {role: roles.count(role) for role in ROLE_WEIGHTS},
+        "seconds": elapsed,
+        "sessions": sum(r["sessions"] for r in reports),
+        "throughput_ops": total_ops / elapsed,
+        "operations": {
+            name: dict(throughput_ops=len(values) / elapsed, **percentiles(values))
+            for name, values in sorted(samples.items())
+        },
+        "errors": errors,
+        "lock_waits": {
+            "mean_waiting_backends": sum(lock_samples) / len(lock_samples) if lock_samples else 0,
+            "max_waiting_backends": max(lock_samples, default=0),
+        },
+    }
+
+
+def find_collapse(stages, min_gain=1.1):
+    """Return the first user count where adding users stopped adding throughput."""
+    for previous, current in zip(stages, stages[1:]):
+        if current["throughput_ops"] < previous["throughput_ops"] * min_gain:
+            return current["users"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="Run against an existing database instead of a throwaway cluster.")
+    parser.add_argument("--scale", type=float, default=1, help="Data size for the throwaway cluster.")
+    parser.add_argument("--stages", default="1,2,4,8,16,32", help="Comma-separated concurrent user counts.")
+    parser.add_argument("--stage-seconds", type=float, default=20)
+    parser.add_argument("--think-ms", type=float, default=0, help="Pause between operations.")
+    parser.add_argument("--output", default="load_report.json")
+    parser.add_argument("--pg-bin", default=os.environ.get("PG_BIN"))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stages = [int(n) for n in args.stages.split(",")]
+    counts = scaled_counts(args.scale)
+
+    def ramp(dsn):
+        summaries = []
+        for i, users in enumerate(stages):
+            print(f"Stage {i + 1}/{len(stages)}: {users} users for {args.stage_seconds}s")
+            summary = run_stage(dsn, counts, users, args.stage_seconds, args.think_ms / 1000, args.seed + i)
+            print(f"  {summary['throughput_ops']:.0f} ops/s, {sum(summary['errors'].values())} errors")
+            summaries.append(summary)
+        return summaries
+
+    if args.dsn:
+        summaries = ramp(args.dsn)
+    else:
+        # Each user is a connection, plus one for the lock sampler.
+        with TempCluster(args.pg_bin, max_connections=max(stages) + 10) as cluster:
+            conn = cluster.create_database("lms_load")
+            cursor = conn.cursor()
+            create_tables(conn, cursor)
+            generate_data(conn, cursor, counts, args.seed)
+            conn.close()
+            summaries = ramp(f"dbname=lms_load user=postgres host={cluster.data_dir} port={cluster.port}")
+
+    report = {
+        "generated_at": datetime.datetime.now().isoformat(),
+        "counts": counts,
+        "stages": summaries,
+        "collapse_at_users": find_collapse(summaries),
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Local SQLite replica of a student's read-only screens.
+
+Courses, instructor names, the academic calendar, discussion threads and the
+student's own results and attendance are copied into a SQLite file on the
+client machine. A background thread keeps it up to date, and the student
+screens read from it instead of PostgreSQL. Writes still go to PostgreSQL.
+
+Every replicated PostgreSQL row carries change_txid, the transaction that last
+wrote it, and deletes leave a row in replica_tombstones. A sync runs in one
+REPEATABLE READ snapshot and fetches everything written by transactions at or
+after the previous snapshot's xmin. Those are the only transactions that may
+not have been visible last time, so no committed change is ever missed, and
+re-applying a row that was already copied is harmless.
+
+Settings (environment variables):
+    LMS_REPLICA_DIR: Directory for the replica files. The replica is off unless this is set.
+    LMS_REPLICA_SYNC_SECONDS: Seconds between syncs. Defaults to 30.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+
+from query_metrics import metrics
+
+logger = logging.getLogger("lms.replica")
+
+# SQLite table -> (PostgreSQL table, key column, PostgreSQL query, SQLite columns)
+REPLICATED_TABLES = {
+    "courses": (
+        "Courses",
+        "course_id",
+        "SELECT course_id, title, credit_hours, instructor_id, semester FROM Courses WHERE change_txid >= %(since)s",
+        ("course_id", "title", "credit_hours", "instructor_id", "semester"),
+    ),
+    "users": (
+        "Users",
+        "user_id",
+        # Only the names the screens show, never emails or passwords.
+        "SELECT user_id, name FROM Users WHERE role = 'instructor' AND change_txid >= %(since)s",
+        ("user_id", "name"),
+    ),
+    "results": (
+        "Results",
+        "result_id",
+        """SELECT result_id, course_id, quiz1, quiz2, midterm, final, total_marks, grade FROM Results
+        WHERE user_id = %(user_id)s AND change_txid >= %(since)s""",
+        ("result_id", "course_id", "quiz1", "quiz2", "midterm", "final", "total_marks", "grade"),
+    ),
+    "attendance": (
+        "Attendance",
+        "attendance_id",
+        """SELECT attendance_id, course_id, date::text, status FROM Attendance
+        WHERE user_id = %(user_id)s AND change_txid >= %(since)s""",
+        ("attendance_id", "course_id", "date", "status"),
+    ),
+    "academic_calendar": (
+        "academic_calendar",
+        "event_id",
+        """SELECT event_id, event_name, description, event_date::text FROM academic_calendar
+        WHERE change_txid >= %(since)s""",
+        ("event_id", "event_name", "description", "event_date"),
+    ),
+    "discussion_threads": (
+        "DiscussionThreads",
+        "thread_id",
+        """SELECT thread_id, course_id, instructor_id, message, status, created_at::text FROM DiscussionThreads
+        WHERE change_txid >= %(since)s""",
+        ("thread_id", "course_id", "instructor_id", "message", "status", "created_at"),
+    ),
+}
+
+REPLICA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    course_id INTEGER PRIMARY KEY, title TEXT, credit_hours INTEGER, instructor_id INTEGER, semester TEXT);
+CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE IF NOT EXISTS results (
+    result_id INTEGER PRIMARY KEY, course_id INTEGER, quiz1 REAL, quiz2 REAL, midterm REAL, final REAL,
+    total_marks REAL, grade TEXT);
+CREATE TABLE IF NOT EXISTS attendance (attendance_id INTEGER PRIMARY KEY, course_id INTEGER, date TEXT, status TEXT);
+CREATE TABLE IF NOT EXISTS academic_calendar (
+    event_id INTEGER PRIMARY KEY, event_name TEXT, description TEXT, event_date TEXT);
+CREATE INDEX IF NOT EXISTS academic_calendar_date_idx ON academic_calendar (event_date);
+CREATE TABLE IF NOT EXISTS discussion_threads (
+    thread_id INTEGER PRIMARY KEY, course_id INTEGER, instructor_id INTEGER, message TEXT, status TEXT,
+    created_at TEXT);
+CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value INTEGER);
+"""
+
+# Student screen -> SQLite query returning the same columns as the screen's PostgreSQL query.
+SCREEN_QUERIES = {
+    "view_courses": """SELECT c.course_id, c.title, c.credit_hours, u.name
+        FROM courses c JOIN users u ON c.instructor_id = u.user_id""",
+    "view_grades": """SELECT c.title, r.quiz1, r.quiz2, r.midterm, r.final, r.total_marks, r.grade
+        FROM results r JOIN courses c ON r.course_id = c.course_id""",
+    "view_attendance": """SELECT c.title, a.date, a.status
+        FROM attendance a JOIN courses c ON a.course_id = c.course_id""",
+    "view_calendar": """SELECT event_name, description, event_date FROM academic_calendar
+        WHERE event_date >= COALESCE(:start, event_date) AND event_date < COALESCE(:end, '9999-12-31')
+        ORDER BY event_date, event_id""",
+    "view_discussion_threads": """SELECT d.thread_id, c.title, u.name, d.message, d.status, d.created_at
+        FROM discussion_threads d
+        JOIN courses c ON d.course_id = c.course_id
+        JOIN users u ON d.instructor_id = u.user_id
+        WHERE d.status = 'active' ORDER BY d.created_at DESC""",
+}
+
+
+def replica_dir():
+    return os.environ.get("LMS_REPLICA_DIR")
+
+
+class LocalReplica:
+    """A student's SQLite replica, kept in sync by a background thread.
+
+    Args:
+        directory (str): Where to keep the replica file.
+        user_id (int): The student whose results and attendance are replicated.
+        connect (callable): Returns a new (conn, cursor) pair for PostgreSQL, raising on failure.
+        sync_seconds (float, optional): Seconds between syncs. Defaults to 30.
+    """
+
+    def __init__(self, directory, user_id, connect, sync_seconds=30):
+        os.makedirs(directory, exist_ok=True)
+        # One file per student, so nobody's marks end up in another student's replica.
+        self.path = os.path.join(directory, f"replica_{user_id}.sqlite3")
+        self.user_id = user_id
+        self.connect = connect
+        self.sync_seconds = sync_seconds
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.synced = threading.Event()
+        self.thread = None
+
+        self.db = sqlite3.connect(self.path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(REPLICA_SCHEMA)
+        self.db.commit()
+        if self._watermark(self.db) is not None:
+            self.synced.set()
+
+    @staticmethod
+    def _watermark(db):
+        row = db.execute("SELECT value FROM sync_state WHERE name = 'xmin'").fetchone()
+        return row[0] if row else None
+
+    def sync(self, conn, cursor, db):
+        """Copy every change since the last sync from PostgreSQL into db.
+
+        conn should be in REPEATABLE READ mode so that every query sees the
+        same snapshot as the xmin that becomes the next watermark.
+
+        Returns:
+            int: The number of rows upserted or deleted.
+        """
+        since = self._watermark(db) or 0
+        changed = 0
+        try:
+            cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+            xmin = cursor.fetchone()[0]
+
+            # Deletes first: a row deleted and then written again must survive.
+            sources = {source.lower(): (table, key) for table, (source, key, _, _) in REPLICATED_TABLES.items()}
+            cursor.execute(
+                "SELECT table_name, row_id FROM replica_tombstones WHERE change_txid >= %s",
+                (since,),
+            )
+            for source, row_id in cursor.fetchall():
+                if source in sources:
+                    table, key = sources[source]
+                    db.execute(f"DELETE FROM {table} WHERE {key} = ?", (row_id,))
+                    changed += 1
+
+            params = {"since": since, "user_id": self.user_id}
+            for table, (_, _, query, columns) in REPLICATED_TABLES.items():
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                db.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    rows,
+                )
+                changed += len(rows)
+            db.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES ('xmin', ?)", (xmin,))
+            db.commit()
+            conn.commit()
+        except Exception:
+            db.rollback()
+            conn.rollback()
+            raise
+        return changed
+
+    def _run(self):
+        try:
+            conn, cursor = self.connect()
+        except Exception as e:
+            logger.warning("Replica cannot connect, screens will read from PostgreSQL: %s", e)
+            return
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        db = sqlite3.connect(self.path)
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.sync(conn, cursor, db)
+                    self.synced.set()
+                except Exception as e:
+                    logger.warning("Replica sync failed: %s", e)
+                    metrics.increment("replica_sync_errors")
+                self.wake.wait(self.sync_seconds)
+                self.wake.clear()
+        finally:
+            db.close()
+            cursor.close()
+            conn.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def request_sync(self):
+        """Sync now rather than at the next interval, e.g. after the student wrote something."""
+        self.wake.set()
+
+    def close(self):
+        self.stop_event.set()
+        self.wake.set()
+        self.db.close()
+
+    def read(self, screen, start=None, end=None):
+        """Return the rows for a student screen, or None until the first sync has finished."""
+        if not self.synced.is_set():
+            return None
+        params = {"start": start and str(start), "end": end and str(end)}
+        return self.db.execute(SCREEN_QUERIES[screen], params).fetchall()
+
+
+def open_replica(user_id, connect):
+    """Start the replica for a student if LMS_REPLICA_DIR is set, else return None."""
+    directory = replica_dir()
+    if not directory:
+        return None
+    return LocalReplica(
+        directory, user_id, connect, float(os.environ.get("LMS_REPLICA_SYNC_SECONDS", 30))
+    ).start()
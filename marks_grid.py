@@ -0,0 +1,415 @@
+"""Spreadsheet-style marks entry for a whole course.
+
+All of a course's students and their marks are loaded with one query. Edits
+are kept on the client, and saving writes only the changed cells: one batched
+INSERT for students who have no Results row yet and one batched UPDATE for
+the rest, both in a single transaction.
+
+Results rows carry a version that moves whenever their marks change. Writes
+are compare-and-swap on that version, so two people editing the same course
+never silently overwrite each other, and no row is locked while someone is
+typing. Changes to different cells of a row are merged; cells both sides
+changed come back as MarksConflict for the user to settle.
+
+Keys: arrows move between cells, Enter or F2 or typing a digit edits a cell.
+While editing, Enter saves the cell and moves down, Tab and Shift-Tab move
+across, and Escape cancels.
+"""
+
+import tkinter as tk
+from collections import namedtuple
+from tkinter import ttk
+
+from psycopg2.extras import execute_values
+
+from transactions import unit_of_work
+
+MARK_COLUMNS = ("quiz1", "quiz2", "midterm", "final")
+HEADINGS = {"name": "Student", "quiz1": "Quiz 1", "quiz2": "Quiz 2", "midterm": "Midterm", "final": "Final", "total_marks": "Total"}
+MAX_MARK = 100
+ROW_COLUMNS = ("version",) + MARK_COLUMNS + ("total_marks",)
+
+# One student whose row changed under the edits. current is the stored row and
+# columns maps each clashing column to (yours, theirs).
+MarksConflict = namedtuple("MarksConflict", "user_id version current columns")
+
+
+def load_marks(cursor, course_id):
+    """Return (user_id, name, version, quiz1, quiz2, midterm, final, total_marks) for every student in a course.
+
+    version is None for students who have no Results row yet.
+    """
+    cursor.execute(
+        """SELECT u.user_id, u.name, r.version, r.quiz1, r.quiz2, r.midterm, r.final, r.total_marks
+        FROM Users u
+        JOIN (
+            SELECT user_id FROM Registrations WHERE course_id = %(course)s AND status <> 'dropped'
+            UNION
+            SELECT user_id FROM Results WHERE course_id = %(course)s
+        ) s ON s.user_id = u.user_id
+        LEFT JOIN Results r ON r.user_id = u.user_id AND r.course_id = %(course)s
+        ORDER BY u.name, u.user_id""",
+        {"course": course_id},
+    )
+    return cursor.fetchall()
+
+
+def current_marks(cursor, course_id, user_ids):
+    """Return {user_id: row} with the stored marks and version, or all None for students without a row."""
+    cursor.execute(
+        f"""SELECT user_id, {", ".join(ROW_COLUMNS)} FROM Results
+        WHERE course_id = %s AND user_id = ANY(%s)""",
+        (course_id, list(user_ids)),
+    )
+    rows = {user_id: dict.fromkeys(ROW_COLUMNS) for user_id in user_ids}
+    for user_id, *values in cursor.fetchall():
+        rows[user_id] = dict(zip(ROW_COLUMNS, values))
+    return rows
+
+
+def _write(cursor, course_id, pending, versions):
+    """Write each student's cells if their row is still at the expected version.
+
+    Returns:
+        dict: {user_id: stored row} for the students that were written.
+    """
+    rows = [[user_id, course_id, versions[user_id]] + [cells.get(c) for c in MARK_COLUMNS] for user_id, cells in pending.items()]
+    template = "(%s::int, %s::int, %s::int, %s::float8, %s::float8, %s::float8, %s::float8)"
+    returning = ", ".join("r." + column for column in ROW_COLUMNS)
+    written = []
+    inserts = [row for row in rows if row[2] is None]
+    updates = [row for row in rows if row[2] is not None]
+    if inserts:
+        # Cells not entered yet start at 0, as they do through add_marks. If
+        # someone else added the row first, nothing is written and the caller
+        # merges with their row.
+        written += execute_values(
+            cursor,
+            f"""INSERT INTO Results AS r (user_id, course_id, quiz1, quiz2, midterm, final, total_marks)
+            SELECT v.user_id, v.course_id, COALESCE(v.quiz1, 0), COALESCE(v.quiz2, 0),
+                COALESCE(v.midterm, 0), COALESCE(v.final, 0),
+                COALESCE(v.quiz1, 0) + COALESCE(v.quiz2, 0) + COALESCE(v.midterm, 0) + COALESCE(v.final, 0)
+            FROM (VALUES %s) AS v (user_id, course_id, version, quiz1, quiz2, midterm, final)
+            ON CONFLICT (user_id, course_id) DO NOTHING
+            RETURNING r.user_id, {returning}""",
+            inserts,
+            template=template,
+            fetch=True,
+        )
+    if updates:
+        # Only the edited cells are written; NULL means "leave as is". A row whose
+        # version moved is skipped; the results_version trigger bumps the rest.
+        written += execute_values(
+            cursor,
+            f"""UPDATE Results r SET
+                quiz1 = COALESCE(v.quiz1, r.quiz1),
+                quiz2 = COALESCE(v.quiz2, r.quiz2),
+                midterm = COALESCE(v.midterm, r.midterm),
+                final = COALESCE(v.final, r.final),
+                total_marks = COALESCE(v.quiz1, r.quiz1, 0) + COALESCE(v.quiz2, r.quiz2, 0)
+                    + COALESCE(v.midterm, r.midterm, 0) + COALESCE(v.final, r.final, 0)
+            FROM (VALUES %s) AS v (user_id, course_id, version, quiz1, quiz2, midterm, final)
+            WHERE r.user_id = v.user_id AND r.course_id = v.course_id AND r.version = v.version
+            RETURNING r.user_id, {returning}""",
+            updates,
+            template=template,
+            fetch=True,
+        )
+    return {user_id: dict(zip(ROW_COLUMNS, values)) for user_id, *values in written}
+
+
+def save_marks(conn, cursor, course_id, edits, base, attempts=3):
+    """Write edited marks in one transaction without overwriting anyone else's changes.
+
+    A student's row is only written if its version still matches the one the
+    edits were made against. If it has moved, the edits are merged with the
+    other writer's: cells only this side changed are written on top of their
+    version, and cells both sides changed to different values are returned as
+    conflicts. A student with a conflict is not written at all.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        course_id (int): The course being edited.
+        edits (dict): {user_id: {column: value}} for the changed cells only.
+        base (dict): {user_id: row} as loaded, with the mark columns and version.
+            version is None for students who had no Results row.
+        attempts (int, optional): Merge rounds before giving up on a row that keeps changing. Defaults to 3.
+    Returns:
+        tuple: ({user_id: stored row}, [MarksConflict]).
+    """
+    saved = {}
+    conflicts = []
+    bases = {user_id: base[user_id] for user_id in edits}
+    versions = {user_id: row["version"] for user_id, row in bases.items()}
+    pending = {user_id: dict(cells) for user_id, cells in edits.items() if cells}
+    with unit_of_work(conn):
+        for attempt in range(attempts):
+            written = _write(cursor, course_id, pending, versions)
+            saved.update(written)
+            missed = [user_id for user_id in pending if user_id not in written]
+            if not missed:
+                break
+            last = attempt + 1 == attempts
+            retry = {}
+            for user_id, theirs in current_marks(cursor, course_id, missed).items():
+                cells = {}
+                clashes = {}
+                for column, value in pending[user_id].items():
+                    if value == theirs[column]:
+                        continue  # both sides made the same change
+                    if theirs[column] == bases[user_id].get(column) and not last:
+                        cells[column] = value
+                    else:
+                        clashes[column] = (value, theirs[column])
+                if clashes:
+                    conflicts.append(MarksConflict(user_id, theirs["version"], theirs, clashes))
+                elif cells:
+                    retry[user_id] = cells
+                    versions[user_id] = theirs["version"]
+                    bases[user_id] = theirs
+                else:
+                    saved[user_id] = theirs
+            pending = retry
+            if not pending:
+                break
+    return saved, conflicts
+
+
+def describe_conflicts(conflicts, names=None):
+    """Return one line per conflicting cell, e.g. for a message box."""
+    lines = []
+    for conflict in conflicts:
+        who = (names or {}).get(conflict.user_id, f"Student {conflict.user_id}")
+        for column, (yours, theirs) in conflict.columns.items():
+            lines.append(f"{who}, {HEADINGS[column]}: yours {MarksGrid._format(yours)}, theirs {MarksGrid._format(theirs)}")
+    return "\n".join(lines)
+
+
+def parse_mark(text):
+    """Return the mark in text as a float, or raise ValueError with a message for the user."""
+    try:
+        value = float(text)
+    except ValueError:
+        raise ValueError(f"'{text}' is not a number.") from None
+    if not 0 <= value <= MAX_MARK:
+        raise ValueError(f"Marks must be between 0 and {MAX_MARK}.")
+    return value
+
+
+class MarksGrid(ttk.Frame):
+    """An editable grid of one course's marks.
+
+    Args:
+        master : The parent widget.
+        rows (list): Rows as returned by load_marks().
+        on_change (callable, optional): Called with the pending change count after every edit.
+        on_error (callable, optional): Called with a message when an entered mark is invalid.
+    """
+
+    columns = ("name",) + MARK_COLUMNS + ("total_marks",)
+
+    def __init__(self, master, rows, on_change=None, on_error=None):
+        super().__init__(master)
+        self.on_change = on_change
+        self.on_error = on_error
+        self.original = {}  # user_id -> stored row, as save_marks() expects for base
+        self.edits = {}
+        self.editor = None
+        self.column_index = 1
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings", height=18, selectmode="browse")
+        for column in self.columns:
+            self.tree.heading(column, text=HEADINGS[column])
+            self.tree.column(column, width=200 if column == "name" else 80, anchor="w" if column == "name" else "e")
+        self.tree.tag_configure("edited", background="#fff3b0")
+        scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="right", fill="y")
+
+        self.tree.tag_configure("conflict", background="#f8c8c8")
+        for user_id, name, *values in rows:
+            values = dict(zip(ROW_COLUMNS, values))
+            self.original[user_id] = values
+            self.tree.insert("", tk.END, iid=str(user_id), values=self._display(name, values))
+
+        self.tree.bind("<Double-1>", self._on_double_click)
+        self.tree.bind("<Return>", lambda e: self.edit())
+        self.tree.bind("<F2>", lambda e: self.edit())
+        self.tree.bind("<Left>", lambda e: self._move_column(-1))
+        self.tree.bind("<Right>", lambda e: self._move_column(1))
+        self.tree.bind("<Tab>", lambda e: self._move_column(1))
+        self.tree.bind("<Shift-Tab>", lambda e: self._move_column(-1))
+        self.tree.bind("<Key>", self._on_key)
+        children = self.tree.get_children()
+        if children:
+            self.tree.focus(children[0])
+            self.tree.selection_set(children[0])
+        self.tree.focus_set()
+
+    @staticmethod
+    def _format(value):
+        return "" if value is None else f"{value:g}"
+
+    def _display(self, name, values):
+        return [name] + [self._format(values.get(column)) for column in MARK_COLUMNS + ("total_marks",)]
+
+    def pending_count(self):
+        return len(self.edits)
+
+    def _current(self, user_id):
+        """Return the row's marks with the pending edits applied."""
+        values = dict(self.original[user_id])
+        values.update(self.edits.get(user_id, {}))
+        if user_id in self.edits:
+            values["total_marks"] = sum(values.get(column) or 0 for column in MARK_COLUMNS)
+        return values
+
+    def _move_column(self, step):
+        self.column_index = min(max(self.column_index + step, 1), len(MARK_COLUMNS))
+        self._show_cursor()
+        return "break"
+
+    def _show_cursor(self):
+        column = self.columns[self.column_index]
+        # Treeview has no cell cursor, so the heading of the current column is marked instead.
+        for name in MARK_COLUMNS:
+            self.tree.heading(name, text=HEADINGS[name] + (" ▾" if name == column else ""))
+
+    def _on_double_click(self, event):
+        item = self.tree.identify_row(event.y)
+        column = self.tree.identify_column(event.x)
+        if not item or not column:
+            return
+        index = int(column[1:]) - 1
+        if self.columns[index] in MARK_COLUMNS:
+            self.tree.focus(item)
+            self.tree.selection_set(item)
+            self.column_index = index
+            self.edit()
+
+    def _on_key(self, event):
+        if event.char and (event.char.isdigit() or event.char == "."):
+            self.edit(initial=event.char)
+            return "break"
+
+    def edit(self, initial=None):
+        """Open an editor over the focused row's current mark cell."""
+        item = self.tree.focus()
+        if not item:
+            return "break"
+        self._show_cursor()
+        self.tree.see(item)
+        column = self.columns[self.column_index]
+        bbox = self.tree.bbox(item, f"#{self.column_index + 1}")
+        if not bbox:
+            return "break"
+        x, y, width, height = bbox
+        self.editor = ttk.Entry(self.tree, justify="right")
+        self.editor.place(x=x, y=y, width=width, height=height)
+        current = self._current(int(item)).get(column)
+        self.editor.insert(0, initial if initial is not None else self._format(current))
+        if initial is None:
+            self.editor.select_range(0, tk.END)
+        self.editor.focus_set()
+        self.editor.bind("<Return>", lambda e: self._commit(item, column, down=1))
+        self.editor.bind("<Down>", lambda e: self._commit(item, column, down=1))
+        self.editor.bind("<Up>", lambda e: self._commit(item, column, down=-1))
+        self.editor.bind("<Tab>", lambda e: self._commit(item, column, across=1))
+        self.editor.bind("<Shift-Tab>", lambda e: self._commit(item, column, across=-1))
+        self.editor.bind("<Escape>", lambda e: self._close_editor())
+        self.editor.bind("<FocusOut>", lambda e: self._commit(item, column, reopen=False))
+        return "break"
+
+    def _close_editor(self):
+        if self.editor is not None:
+            editor, self.editor = self.editor, None
+            editor.destroy()
+            self.tree.focus_set()
+        return "break"
+
+    def _commit(self, item, column, down=0, across=0, reopen=True):
+        if self.editor is None:
+            return "break"
+        text = self.editor.get().strip()
+        user_id = int(item)
+        if text == "":
+            value = None
+        else:
+            try:
+                value = parse_mark(text)
+            except ValueError as e:
+                if not reopen:
+                    # Focus left the cell with an invalid value: drop the edit.
+                    return self._close_editor()
+                self.editor.configure(foreground="red")
+                if self.on_error:
+                    self.on_error(str(e))
+                return "break"
+        self._close_editor()
+        self._set(user_id, column, value)
+
+        children = self.tree.get_children()
+        if down:
+            index = min(max(children.index(item) + down, 0), len(children) - 1)
+            self.tree.focus(children[index])
+            self.tree.selection_set(children[index])
+            self.tree.see(children[index])
+        if across:
+            self._move_column(across)
+        if reopen and (down or across):
+            self.after_idle(self.edit)
+        return "break"
+
+    def _set(self, user_id, column, value):
+        cells = self.edits.setdefault(user_id, {})
+        # Clearing a cell, or typing its saved value back, drops the edit.
+        if value is None or value == self.original[user_id].get(column):
+            cells.pop(column, None)
+        else:
+            cells[column] = value
+        if not cells:
+            del self.edits[user_id]
+        self._refresh(user_id)
+        if self.on_change:
+            self.on_change(self.pending_count())
+
+    def _refresh(self, user_id, tags=None):
+        if tags is None:
+            tags = ("edited",) if user_id in self.edits else ()
+        name = self.tree.set(str(user_id), "name")
+        self.tree.item(str(user_id), values=self._display(name, self._current(user_id)), tags=tags)
+
+    def saved(self, rows, conflicts=()):
+        """Apply the result of save_marks().
+
+        Saved rows become the new baseline. Conflicting rows keep their edits and
+        are highlighted until resolve() is called.
+        """
+        for user_id, row in rows.items():
+            self.original[user_id] = row
+            self.edits.pop(user_id, None)
+            self._refresh(user_id)
+        for conflict in conflicts:
+            self._refresh(conflict.user_id, tags=("conflict",))
+        if self.on_change:
+            self.on_change(self.pending_count())
+
+    def resolve(self, conflicts, keep_mine):
+        """Rebase conflicting rows on the stored values.
+
+        With keep_mine the edits stay pending, so the next save overwrites the
+        other writer's values; otherwise the clashing cells take their values.
+        """
+        for conflict in conflicts:
+            self.original[conflict.user_id] = conflict.current
+            cells = self.edits.get(conflict.user_id, {})
+            for column in conflict.columns:
+                if not keep_mine or cells.get(column) == conflict.current[column]:
+                    cells.pop(column, None)
+            if not cells:
+                self.edits.pop(conflict.user_id, None)
+            self._refresh(conflict.user_id)
+        if self.on_change:
+            self.on_change(self.pending_count())
@@ -0,0 +1,305 @@
+"""Grade notifications through a transactional outbox.
+
+Grading queues one notification_outbox row per student whose grade changed,
+with a single INSERT ... SELECT over the Results change log in the grading
+transaction. The notifications therefore commit exactly when the grades do,
+and grading a 1,000-student course costs one extra statement rather than
+1,000 deliveries.
+
+A dispatcher drains the outbox BATCH_SIZE rows at a time, each batch in its
+own short transaction. Rows are claimed with FOR UPDATE SKIP LOCKED, so
+several dispatchers can run at once. Delivered rows are deleted. A failed row
+is retried after a delay that doubles on every attempt, and is parked after
+MAX_ATTEMPTS. Every notification has an event_key, and delivery skips keys it
+has seen, so a batch delivered twice after a crash shows up once.
+
+Notifications go to the in-app notifications inbox, or, when LMS_MAIL_SPOOL
+is set, into that directory as one .eml file each.
+
+Usage:
+    python notifications.py dispatch
+    python notifications.py dispatch --spool /var/spool/lms --once
+"""
+
+import argparse
+import logging
+import os
+import threading
+import time
+from email.message import EmailMessage
+
+from psycopg2.extras import execute_values
+
+from query_metrics import metrics
+from transactions import unit_of_work
+
+logger = logging.getLogger("lms.notifications")
+
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 3600
+
+SCHEMA_SCRIPT = """
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    outbox_id BIGSERIAL PRIMARY KEY,
+    event_key TEXT NOT NULL UNIQUE,
+    user_id INT NOT NULL REFERENCES Users(user_id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    available_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    failed_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS notification_outbox_due_idx
+    ON notification_outbox (available_at, outbox_id) WHERE failed_at IS NULL;
+CREATE TABLE IF NOT EXISTS notifications (
+    notification_id BIGSERIAL PRIMARY KEY,
+    event_key TEXT NOT NULL UNIQUE,
+    user_id INT NOT NULL REFERENCES Users(user_id) ON DELETE CASCADE,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    read_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS notifications_user_idx ON notifications (user_id, notification_id);
+"""
+
+
+def create_notifications(conn, cursor):
+    """Create the outbox and the in-app inbox."""
+    with unit_of_work(conn):
+        cursor.execute(SCHEMA_SCRIPT)
+
+
+def enqueue_grade_notifications(cursor, course_id):
+    """Queue a notification for every student whose grade in course_id changed in this transaction.
+
+    Must run in the grading transaction, after the grade update.
+
+    Returns:
+        int: The number of notifications queued.
+    """
+    cursor.execute(
+        """INSERT INTO notification_outbox (event_key, user_id, subject, body)
+        SELECT 'grade:' || ch.change_id, ch.user_id,
+            'Grade posted for ' || c.title,
+            'Your grade in ' || c.title || ' is now ' || COALESCE(ch.new_values ->> 'grade', 'not set') || '.'
+        FROM results_changes ch
+        JOIN Courses c ON c.course_id = ch.course_id
+        WHERE ch.txid = txid_current() AND ch.course_id = %s AND ch.operation = 'U'
+            AND ch.old_values ->> 'grade' IS DISTINCT FROM ch.new_values ->> 'grade'
+        ORDER BY ch.change_id
+        ON CONFLICT (event_key) DO NOTHING""",
+        (course_id,),
+    )
+    metrics.increment("notifications_queued", cursor.rowcount)
+    return cursor.rowcount
+
+
+def deliver_to_inbox(cursor, rows):
+    """Deliver claimed rows to the notifications table. Returns {} as nothing fails row by row."""
+    execute_values(
+        cursor,
+        """INSERT INTO notifications (event_key, user_id, subject, body, created_at) VALUES %s
+        ON CONFLICT (event_key) DO NOTHING""",
+        [(event_key, user_id, subject, body, created_at) for _, event_key, user_id, _, subject, body, created_at in rows],
+    )
+    return {}
+
+
+class SpoolDelivery:
+    """Deliver notifications as .eml files in a mail spool directory.
+
+    Args:
+        directory (str): The spool directory, created if missing.
+        sender (str, optional): The From address.
+    """
+
+    def __init__(self, directory, sender="lms@localhost"):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sender = sender
+
+    def __call__(self, cursor, rows):
+        failures = {}
+        for outbox_id, event_key, _, email, subject, body, created_at in rows:
+            path = os.path.join(self.directory, event_key.replace(":", "-") + ".eml")
+            if os.path.exists(path):
+                continue  # Delivered before a crash kept the outbox row.
+            message = EmailMessage()
+            message["From"] = self.sender
+            message["To"] = email
+            message["Subject"] = subject
+            message["Message-ID"] = f"<{event_key}@lms>"
+            message.set_content(body)
+            try:
+                # Renamed into place, so the mailer never picks up half a file.
+                with open(path + ".tmp", "wb") as f:
+                    f.write(message.as_bytes())
+                os.replace(path + ".tmp", path)
+            except OSError as e:
+                failures[outbox_id] = str(e)
+        return failures
+
+
+def dispatch_batch(conn, cursor, deliver=deliver_to_inbox, batch_size=BATCH_SIZE):
+    """Deliver one batch of due notifications.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        deliver (callable, optional): Takes (cursor, rows) and returns {outbox_id: error} for
+            the rows it could not deliver. Defaults to the in-app inbox.
+        batch_size (int, optional): Most notifications to deliver. Defaults to BATCH_SIZE.
+    Returns:
+        int: The number of notifications claimed, 0 if none are due.
+    """
+    with unit_of_work(conn):
+        cursor.execute(
+            """SELECT o.outbox_id, o.event_key, o.user_id, u.email, o.subject, o.body, o.created_at
+            FROM notification_outbox o
+            JOIN Users u ON u.user_id = o.user_id
+            WHERE o.failed_at IS NULL AND o.available_at <= CURRENT_TIMESTAMP
+            ORDER BY o.available_at, o.outbox_id
+            LIMIT %s
+            FOR UPDATE OF o SKIP LOCKED""",
+            (batch_size,),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        cursor.execute("SAVEPOINT deliver")
+        try:
+            failures = deliver(cursor, rows)
+        except Exception as e:
+            # The claim survives the failed delivery, so the batch can be rescheduled.
+            cursor.execute("ROLLBACK TO SAVEPOINT deliver")
+            logger.warning("Delivering %d notification(s) failed: %s", len(rows), e)
+            failures = {row[0]: str(e) for row in rows}
+        delivered = [row[0] for row in rows if row[0] not in failures]
+        cursor.execute("DELETE FROM notification_outbox WHERE outbox_id = ANY(%s)", (delivered,))
+        if failures:
+            execute_values(
+                cursor,
+                f"""UPDATE notification_outbox o
+                SET attempts = o.attempts + 1, last_error = f.error,
+                    available_at = CURRENT_TIMESTAMP + LEAST(power(2, o.attempts), {MAX_BACKOFF_SECONDS}) * INTERVAL '1 second',
+                    failed_at = CASE WHEN o.attempts + 1 >= {MAX_ATTEMPTS} THEN CURRENT_TIMESTAMP END
+                FROM (VALUES %s) AS f (outbox_id, error)
+                WHERE o.outbox_id = f.outbox_id""",
+                list(failures.items()),
+                template="(%s::bigint, %s)",
+            )
+    metrics.increment("notifications_delivered", len(delivered))
+    metrics.increment("notifications_failed", len(failures))
+    return len(rows)
+
+
+def default_delivery():
+    """Deliver to LMS_MAIL_SPOOL if it is set, else to the in-app inbox."""
+    spool = os.environ.get("LMS_MAIL_SPOOL")
+    return SpoolDelivery(spool) if spool else deliver_to_inbox
+
+
+class Dispatcher:
+    """Drains the outbox from a background thread.
+
+    Args:
+        connect (callable): Returns a new (conn, cursor) pair for PostgreSQL, raising on failure.
+        deliver (callable, optional): See dispatch_batch. Defaults to default_delivery().
+        idle_seconds (float, optional): Seconds between checks while the outbox is empty. Defaults to 10.
+    """
+
+    def __init__(self, connect, deliver=None, idle_seconds=10):
+        self.connect = connect
+        self.deliver = deliver or default_delivery()
+        self.idle_seconds = idle_seconds
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _run(self):
+        try:
+            conn, cursor = self.connect()
+        except Exception as e:
+            logger.warning("Notification dispatcher cannot connect: %s", e)
+            return
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    if dispatch_batch(conn, cursor, self.deliver):
+                        continue
+                except Exception as e:
+                    logger.warning("Notification dispatch failed: %s", e)
+                self.wake_event.wait(self.idle_seconds)
+                self.wake_event.clear()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def wake(self):
+        """Check the outbox now, e.g. after grading queued notifications."""
+        self.wake_event.set()
+
+    def close(self):
+        self.stop_event.set()
+        self.wake_event.set()
+
+
+def fetch_notifications(cursor, user_id, limit=100):
+    """Return a student's latest (notification_id, subject, body, created_at, read_at), newest first."""
+    cursor.execute(
+        """SELECT notification_id, subject, body, created_at, read_at FROM notifications
+        WHERE user_id = %s
+        ORDER BY notification_id DESC
+        LIMIT %s""",
+        (user_id, limit),
+    )
+    return cursor.fetchall()
+
+
+def mark_read(conn, cursor, user_id):
+    """Mark all of a student's notifications read."""
+    with unit_of_work(conn):
+        cursor.execute(
+            "UPDATE notifications SET read_at = CURRENT_TIMESTAMP WHERE user_id = %s AND read_at IS NULL",
+            (user_id,),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("dispatch",))
+    parser.add_argument("--spool", help="Write .eml files here instead of to the in-app inbox.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--once", action="store_true", help="Exit when nothing is due.")
+    args = parser.parse_args()
+
+    from Project import close_db, connect_db
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    deliver = SpoolDelivery(args.spool) if args.spool else default_delivery()
+    try:
+        while True:
+            if dispatch_batch(conn, cursor, deliver, args.batch_size):
+                continue
+            if args.once:
+                break
+            time.sleep(10)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_db(conn, cursor)
+
+
+if __name__ == "__main__":
+    main()
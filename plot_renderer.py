@@ -0,0 +1,101 @@
+"""Background rendering of the marks distribution chart.
+
+Charts are drawn with the headless Agg backend on a worker thread that has its
+own database connection, so the Tk main loop never waits on matplotlib or on
+the database. The chart is drawn from the course_statistics histogram, so a
+course costs one primary-key lookup however many students it has. Rendered
+PNGs are cached by course and by the statistics version, which moves whenever
+the course's Results rows change, so repeated views show up at once until
+marks change.
+"""
+
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from charts import draw_bucket_distribution
+from course_statistics import combine, fetch_course_statistics, stddev
+
+
+def render_distribution_png(statistics, title, size=(6.4, 4.8), dpi=100):
+    """Return the distribution chart for a course's statistics as PNG bytes."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    draw_bucket_distribution(
+        figure.add_subplot(), statistics["buckets"], statistics["mean"], stddev(statistics, sample=False), title
+    )
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+class PlotRenderer:
+    """Renders distribution charts off the Tk thread and caches them.
+
+    Args:
+        connect (callable): Returns a new (conn, cursor) pair, raising on failure.
+        cache_size (int, optional): Charts kept in memory. Defaults to 32.
+    """
+
+    def __init__(self, connect, cache_size=32):
+        self.connect = connect
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # (course_id, version) -> PNG bytes, or None if there were no marks
+        self.latest = {}  # course_id -> newest version seen
+        self.lock = threading.Lock()
+        # One worker, so its connection is never shared.
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plot-renderer")
+        self.conn = self.cursor = None
+
+    def cached(self, course_id):
+        """Return the newest cached PNG for a course, or None. Safe to call on the Tk thread."""
+        with self.lock:
+            return self.cache.get((course_id, self.latest.get(course_id)))
+
+    def submit(self, course_id, title):
+        """Start rendering a course's chart. The future's result is PNG bytes, or None if there are no marks."""
+        return self.executor.submit(self._render, course_id, title)
+
+    def _render(self, course_id, title):
+        if self.conn is None or self.conn.closed:
+            self.conn, self.cursor = self.connect()
+        try:
+            if course_id is None:
+                courses = list(fetch_course_statistics(self.cursor).values())
+                # Any course's change moves its version; the course count covers deletions.
+                version = (len(courses), max((c["version"] for c in courses), default=0))
+                statistics = combine(courses)
+            else:
+                statistics = fetch_course_statistics(self.cursor, [course_id]).get(course_id)
+                version = statistics["version"] if statistics else 0
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        key = (course_id, version)
+        with self.lock:
+            self.latest[course_id] = version
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        png = render_distribution_png(statistics, title) if statistics and statistics["count"] else None
+        with self.lock:
+            self.cache[key] = png
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return png
+
+    def _close_connection(self):
+        if self.conn is not None:
+            self.conn.close()
+
+    def close(self):
+        # Close the connection on the worker, after any render still using it.
+        self.executor.submit(self._close_connection)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,199 @@
+"""Course prerequisite engine.
+
+The CoursePrerequisites graph is loaded once and its transitive closure is
+cached as one bitmask per course, so checking a student against a course is a
+single integer AND. The cache is reloaded when the version counter that a
+trigger bumps on every change to CoursePrerequisites moves on.
+"""
+
+import threading
+
+# Grades that do not count as passing a prerequisite.
+FAILING_GRADES = ("F",)
+
+
+class PrerequisiteCycleError(ValueError):
+    """Raised when the prerequisite graph contains a cycle."""
+
+    def __init__(self, cycles):
+        self.cycles = cycles
+        super().__init__(
+            "Prerequisite cycle(s): " + "; ".join(" -> ".join(map(str, c)) for c in cycles)
+        )
+
+
+def _strongly_connected(nodes, edges):
+    """Return the strongly connected components of a graph (Tarjan, iterative)."""
+    index = {}
+    low = {}
+    on_stack = set()
+    stack = []
+    components = []
+    counter = 0
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(edges.get(root, ())))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            child = next(children, None)
+            if child is not None:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(edges.get(child, ()))))
+                elif child in on_stack:
+                    low[node] = min(low[node], index[child])
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+    return components
+
+
+class PrerequisiteGraph:
+    """Cached prerequisite graph with its transitive closure."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.prerequisites = {}
+        self.bit = {}
+        self.closure = {}
+        self.cycles = []
+
+    def invalidate(self):
+        with self.lock:
+            self.version = None
+
+    def refresh(self, conn, cursor):
+        """Reload the graph if CoursePrerequisites changed since the last load."""
+        cursor.execute("SELECT version FROM cache_versions WHERE name = 'course_prerequisites'")
+        row = cursor.fetchone()
+        version = row[0] if row else 0
+        with self.lock:
+            if version == self.version:
+                return self
+        cursor.execute("SELECT course_id, prerequisite_id FROM CoursePrerequisites")
+        edges = cursor.fetchall()
+        conn.commit()
+        self._build(edges, version)
+        return self
+
+    def _build(self, edges, version):
+        prerequisites = {}
+        for course_id, prerequisite_id in edges:
+            prerequisites.setdefault(course_id, set()).add(prerequisite_id)
+        nodes = set(prerequisites) | {p for ps in prerequisites.values() for p in ps}
+        bit = {course_id: 1 << i for i, course_id in enumerate(sorted(nodes))}
+
+        # Tarjan emits components in reverse topological order, i.e. every
+        # prerequisite's component before the courses that depend on it.
+        closure = {}
+        cycles = []
+        for component in _strongly_connected(sorted(nodes), prerequisites):
+            if len(component) > 1 or component[0] in prerequisites.get(component[0], ()):
+                cycles.append(sorted(component))
+            mask = 0
+            for course_id in component:
+                for prerequisite_id in prerequisites.get(course_id, ()):
+                    mask |= bit[prerequisite_id] | closure.get(prerequisite_id, 0)
+            for course_id in component:
+                closure[course_id] = mask
+
+        with self.lock:
+            self.prerequisites = prerequisites
+            self.bit = bit
+            self.closure = closure
+            self.cycles = cycles
+            self.version = version
+
+    def all_prerequisites(self, course_id):
+        """Return every course that must be passed before course_id, directly or not."""
+        mask = self.closure.get(course_id, 0)
+        return {c for c, b in self.bit.items() if mask & b}
+
+    def check_acyclic(self):
+        if self.cycles:
+            raise PrerequisiteCycleError(self.cycles)
+
+    def completed_mask(self, completed):
+        mask = 0
+        for course_id in completed:
+            mask |= self.bit.get(course_id, 0)
+        return mask
+
+    def is_eligible(self, completed_mask, course_id):
+        """Return True if the completed courses cover every prerequisite of course_id."""
+        required = self.closure.get(course_id, 0)
+        return required & ~completed_mask == 0 and not self.in_cycle(course_id)
+
+    def in_cycle(self, course_id):
+        return any(course_id in cycle for cycle in self.cycles)
+
+    def missing_prerequisites(self, completed, course_id):
+        return self.all_prerequisites(course_id) - set(completed)
+
+
+def passed_courses(cursor, student_ids):
+    """Return {student_id: set of passed course_ids} for a cohort in one query.
+
+    Does not commit, so it can run inside the caller's transaction.
+    """
+    cursor.execute(
+        """SELECT user_id, course_id FROM Results
+        WHERE user_id = ANY(%s) AND grade IS NOT NULL AND grade <> ALL(%s)
+        UNION
+        SELECT user_id, course_id FROM Registrations
+        WHERE user_id = ANY(%s) AND status = 'completed'""",
+        (list(student_ids), list(FAILING_GRADES), list(student_ids)),
+    )
+    completed = {student_id: set() for student_id in student_ids}
+    for user_id, course_id in cursor.fetchall():
+        completed.setdefault(user_id, set()).add(course_id)
+    return completed
+
+
+def completed_courses(conn, cursor, student_ids):
+    """Return {student_id: set of passed course_ids} for a cohort in one query."""
+    completed = passed_courses(cursor, student_ids)
+    conn.commit()
+    return completed
+
+
+def eligible_courses(conn, cursor, student_ids, course_ids, graph=None):
+    """Return {student_id: [course_ids the student may take]} for a whole cohort.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        student_ids (list): Students to check.
+        course_ids (list): Candidate courses.
+        graph (PrerequisiteGraph, optional): Defaults to the shared cached graph.
+    """
+    graph = (graph or prerequisite_graph).refresh(conn, cursor)
+    completed = completed_courses(conn, cursor, student_ids)
+    eligible = {}
+    for student_id in student_ids:
+        mask = graph.completed_mask(completed.get(student_id, ()))
+        eligible[student_id] = [c for c in course_ids if graph.is_eligible(mask, c)]
+    return eligible
+
+
+prerequisite_graph = PrerequisiteGraph()
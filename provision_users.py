@@ -0,0 +1,167 @@
+"""Bulk provisioning of users from a roster file.
+
+The roster is a CSV file with a header row. Required columns are name, email,
+password and role. Optional columns fill the role's profile table: program
+and semester for students, department and designation for instructors,
+role_description for admins.
+
+All rows are validated up front and existing emails are found with a single
+query. The remaining rows are then loaded into Users and the profile
+tables with COPY in one transaction. Rows whose email is already registered
+are reported as skipped, so running the same roster again changes nothing.
+
+Usage:
+    python provision_users.py roster.csv --report roster_report.csv
+"""
+
+import argparse
+import csv
+
+from bulk_copy import copy_rows
+
+# role -> (profile table, profile columns)
+PROFILE_TABLES = {
+    "student": ("StudentProfiles", ("program", "semester")),
+    "instructor": ("InstructorProfiles", ("department", "designation")),
+    "admin": ("AdminProfiles", ("role_description",)),
+}
+
+
+def read_roster(path):
+    """Read a roster CSV file and return its rows as dicts."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return [
+            {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+            for row in csv.DictReader(f)
+        ]
+
+
+def validate_roster(rows):
+    """Split roster rows into valid rows and rejections.
+
+    Returns:
+        tuple: (valid, report) where valid is a list of (line, row) and report
+        is a list of (line, email, status, reason).
+    """
+    valid = []
+    report = []
+    seen = {}
+    for line, row in enumerate(rows, start=2):  # line 1 is the header
+        email = row.get("email", "")
+        role = row.get("role", "").lower()
+        missing = [key for key in ("name", "email", "password", "role") if not row.get(key)]
+        if missing:
+            reason = f"Missing {', '.join(missing)}"
+        elif "@" not in email:
+            reason = "Invalid email address"
+        elif role not in PROFILE_TABLES:
+            reason = f"Invalid role '{row['role']}'"
+        elif role == "student" and row.get("semester") and not row["semester"].isdigit():
+            reason = "Semester must be a number"
+        elif email in seen:
+            reason = f"Duplicate of line {seen[email]}"
+        else:
+            seen[email] = line
+            valid.append((line, dict(row, role=role)))
+            continue
+        report.append((line, email, "rejected", reason))
+    return valid, report
+
+
+def provision_roster(conn, cursor, rows):
+    """Create users for every valid roster row that is not already registered.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        rows (list): Roster rows as returned by read_roster().
+    Returns:
+        tuple: (created, report) where created maps role to the number of users
+        inserted and report lists (line, email, status, reason) for every row
+        that was not inserted.
+    """
+    valid, report = validate_roster(rows)
+    created = {role: 0 for role in PROFILE_TABLES}
+    try:
+        # Stop registrations from slipping in between the check and the load.
+        cursor.execute("LOCK TABLE Users IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(
+            "SELECT email FROM Users WHERE email = ANY(%s)",
+            ([row["email"] for _, row in valid],),
+        )
+        existing = {email for (email,) in cursor.fetchall()}
+
+        by_role = {role: [] for role in PROFILE_TABLES}
+        for line, row in valid:
+            if row["email"] in existing:
+                report.append((line, row["email"], "skipped", "Email address already registered"))
+            else:
+                by_role[row["role"]].append(row)
+
+        new_rows = [row for role_rows in by_role.values() for row in role_rows]
+        if new_rows:
+            # Reserve all the user_ids up front so profiles can be loaded with COPY too.
+            cursor.execute(
+                """SELECT nextval(pg_get_serial_sequence('users', 'user_id'))
+                FROM generate_series(1, %s)""",
+                (len(new_rows),),
+            )
+            for row, (user_id,) in zip(new_rows, cursor.fetchall()):
+                row["user_id"] = user_id
+            copy_rows(
+                cursor,
+                "Users",
+                ("user_id", "name", "email", "password", "role"),
+                ([row["user_id"], row["name"], row["email"], row["password"], row["role"]] for row in new_rows),
+            )
+
+        for role, role_rows in by_role.items():
+            if not role_rows:
+                continue
+            table, extra = PROFILE_TABLES[role]
+            copy_rows(
+                cursor,
+                table,
+                ("user_id",) + extra,
+                ([row["user_id"]] + [row.get(column) or None for column in extra] for row in role_rows),
+            )
+            created[role] = len(role_rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    report.sort()
+    return created, report
+
+
+def write_report(path, report):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("line", "email", "status", "reason"))
+        writer.writerows(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("roster", help="Roster CSV file.")
+    parser.add_argument("--report", help="Where to write the per-row report. Defaults to <roster>.report.csv.")
+    args = parser.parse_args()
+
+    from Project import close_db, connect_db
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        created, report = provision_roster(conn, cursor, read_roster(args.roster))
+    finally:
+        close_db(conn, cursor)
+
+    report_path = args.report or f"{args.roster}.report.csv"
+    write_report(report_path, report)
+    print(", ".join(f"{n} {role}(s)" for role, n in created.items()) + " created")
+    print(f"{len(report)} row(s) not created, see {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Per-query tracing and metrics for the LMS.
+
+Every cursor created by connect_db() is a TracingCursor, so each statement's
+duration, row count and calling screen are recorded without touching the call
+sites. Latencies are kept as histograms per statement fingerprint and can be
+exported in the OpenMetrics text format to a file or a local HTTP endpoint.
+
+Settings (environment variables):
+    LMS_SLOW_QUERY_MS: Log statements slower than this many milliseconds. Defaults to 200.
+    LMS_METRICS_FILE: Write the metrics to this file periodically and on exit.
+    LMS_METRICS_PORT: Serve the metrics on http://127.0.0.1:<port>/metrics.
+"""
+
+import atexit
+import functools
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from psycopg2.extensions import cursor as _pg_cursor
+
+logger = logging.getLogger("lms.queries")
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Helper functions that sit between a screen and the cursor.
+_PASS_THROUGH = {"execute_query", "insert_record", "update_record", "delete_record"}
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|%\(\w+\)s")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(query):
+    """Normalise a statement and return (fingerprint, normalised text).
+
+    Literals and placeholders become '?' so that the same statement with
+    different parameters shares one fingerprint.
+    """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    text = _SPACES.sub(" ", _LITERALS.sub("?", str(query))).strip().rstrip(";").strip()
+    text = _IN_LISTS.sub("(?)", text)
+    return hashlib.md5(text.lower().encode()).hexdigest()[:12], text
+
+
+def calling_screen():
+    """Return the LMSApp handler (or other function) that issued the current query."""
+    fallback = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename != __file__ and code.co_name not in _PASS_THROUGH:
+            owner = frame.f_locals.get("self")
+            if owner is not None and type(owner).__name__ == "LMSApp":
+                return getattr(code, "co_qualname", code.co_name).replace(".<locals>", "")
+            if fallback is None and not isinstance(owner, _pg_cursor):
+                fallback = code.co_name
+        frame = frame.f_back
+    return fallback or "-"
+
+
+class Histogram:
+    """Cumulative latency histogram in seconds."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class QueryMetrics:
+    """Thread-safe store of query and operation metrics."""
+
+    def __init__(self, slow_query_ms=200):
+        self.slow_query_ms = slow_query_ms
+        self.lock = threading.Lock()
+        self.statements = {}
+        self.queries = {}
+        self.rows = {}
+        self.errors = {}
+        self.operations = {}
+        self.counters = {}
+
+    def record_query(self, query, duration, rows, screen, failed=False):
+        fp, text = fingerprint(query)
+        key = (fp, screen)
+        with self.lock:
+            self.statements.setdefault(fp, text)
+            self.queries.setdefault(key, Histogram()).observe(duration)
+            if rows and rows > 0:
+                self.rows[key] = self.rows.get(key, 0) + rows
+            if failed:
+                self.errors[key] = self.errors.get(key, 0) + 1
+        if duration * 1000 >= self.slow_query_ms:
+            logger.warning("Slow query %.1f ms in %s [%s]: %s", duration * 1000, screen, fp, text)
+
+    def record_operation(self, name, duration):
+        with self.lock:
+            self.operations.setdefault(name, Histogram()).observe(duration)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        with self.lock:
+            for store in (self.statements, self.queries, self.rows, self.errors, self.operations, self.counters):
+                store.clear()
+
+    def render(self):
+        """Return the metrics in the OpenMetrics text format."""
+
+        def labels(**values):
+            escaped = (
+                f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                for k, v in values.items()
+            )
+            return "{" + ",".join(escaped) + "}"
+
+        def histogram(lines, name, label_values, hist):
+            for bound, count in zip(BUCKETS, hist.counts):
+                lines.append(f"{name}_bucket{labels(**label_values, le=bound)} {count}")
+            lines.append(f"{name}_bucket{labels(**label_values, le='+Inf')} {hist.count}")
+            lines.append(f"{name}_count{labels(**label_values)} {hist.count}")
+            lines.append(f"{name}_sum{labels(**label_values)} {hist.sum:.6f}")
+
+        with self.lock:
+            lines = [
+                "# TYPE lms_query_duration_seconds histogram",
+                "# UNIT lms_query_duration_seconds seconds",
+                "# HELP lms_query_duration_seconds Statement latency by fingerprint and screen.",
+            ]
+            for (fp, screen), hist in sorted(self.queries.items()):
+                histogram(lines, "lms_query_duration_seconds", {"fingerprint": fp, "screen": screen}, hist)
+
+            lines.append("# TYPE lms_query_rows counter")
+            lines.append("# HELP lms_query_rows Rows returned or affected.")
+            for (fp, screen), n in sorted(self.rows.items()):
+                lines.append(f"lms_query_rows_total{labels(fingerprint=fp, screen=screen)} {n}")
+
+            lines.append("# TYPE lms_query_errors counter")
+            lines.append("# HELP lms_query_errors Statements that raised an error.")
+            for (fp, screen), n in sorted(self.errors.items()):
+                lines.append(f"lms_query_errors_total{labels(fingerprint=fp, screen=screen)} {n}")
+
+            lines.append("# TYPE lms_query info")
+            lines.append("# HELP lms_query Normalised statement text for each fingerprint.")
+            for fp, text in sorted(self.statements.items()):
+                lines.append(f"lms_query_info{labels(fingerprint=fp, statement=text[:200])} 1")
+
+            lines.append("# TYPE lms_operation_duration_seconds histogram")
+            lines.append("# UNIT lms_operation_duration_seconds seconds")
+            lines.append("# HELP lms_operation_duration_seconds Duration of multi-statement operations.")
+            for name, hist in sorted(self.operations.items()):
+                histogram(lines, "lms_operation_duration_seconds", {"operation": name}, hist)
+
+            for name, n in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}_total {n}")
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to a file, replacing it atomically."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+metrics = QueryMetrics(float(os.environ.get("LMS_SLOW_QUERY_MS", 200)))
+
+_thread_db = threading.local()
+
+
+def db_seconds():
+    """Return the total time the calling thread has spent in traced statements."""
+    return getattr(_thread_db, "seconds", 0.0)
+
+
+class TracingCursor(_pg_cursor):
+    """psycopg2 cursor that records every statement in `metrics`."""
+
+    def _traced(self, method, query, *args):
+        screen = calling_screen()
+        start = time.perf_counter()
+        try:
+            result = method(query, *args)
+        except Exception:
+            elapsed = time.perf_counter() - start
+            _thread_db.seconds = db_seconds() + elapsed
+            metrics.record_query(query, elapsed, 0, screen, failed=True)
+            raise
+        elapsed = time.perf_counter() - start
+        _thread_db.seconds = db_seconds() + elapsed
+        metrics.record_query(query, elapsed, self.rowcount, screen)
+        return result
+
+    def execute(self, query, vars=None):
+        return self._traced(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._traced(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._traced(super().copy_expert, sql, file, size)
+
+
+def timed_operation(name):
+    """Decorator that records how long a multi-statement operation takes."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.record_operation(name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve the metrics over HTTP from a daemon thread and return the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def export_metrics_periodically(path, interval=30):
+    """Write the metrics file every interval seconds and once more at exit."""
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            metrics.write(path)
+
+    threading.Thread(target=loop, daemon=True).start()
+    atexit.register(metrics.write, path)
+
+
+def configure_from_env():
+    """Start the exporters requested through LMS_METRICS_FILE and LMS_METRICS_PORT."""
+    if os.environ.get("LMS_METRICS_FILE"):
+        export_metrics_periodically(os.environ["LMS_METRICS_FILE"])
+    if os.environ.get("LMS_METRICS_PORT"):
+        serve_metrics(int(os.environ["LMS_METRICS_PORT"]))
@@ -0,0 +1,196 @@
+"""Work queue for rechecking requests.
+
+Staff claim pending requests for their courses a few at a time. The claim
+query takes the rows with FOR UPDATE SKIP LOCKED, so several instructors
+claiming at once each get different requests and never wait on each other.
+It then stamps them with claimed_by and claimed_at. A claim is a lease: once
+it is older than CLAIM_TIMEOUT, the request goes back in the queue, so an
+abandoned claim never strands a request. Deciding a request only succeeds
+while the claim is still held.
+
+The partial index on pending requests keeps claiming and the queue figures
+from scanning decided requests.
+
+Usage:
+    python rechecking.py stats
+"""
+
+import argparse
+
+from query_metrics import metrics
+from transactions import unit_of_work
+
+CLAIM_TIMEOUT = "30 minutes"
+STATS_WINDOW = "7 days"
+DECISIONS = ("approved", "rejected")
+
+
+class ClaimLostError(RuntimeError):
+    """Raised when deciding a request whose claim has expired or was never held."""
+
+
+def _free(prefix=""):
+    """SQL condition: nobody holds a live claim on the request."""
+    return f"({prefix}claimed_by IS NULL OR {prefix}claimed_at < CURRENT_TIMESTAMP - %(timeout)s::interval)"
+
+
+def _course_filter(course_ids):
+    return {"all": course_ids is None, "courses": list(course_ids or [])}
+
+
+def claim_requests(conn, cursor, staff_id, course_ids=None, limit=5):
+    """Claim up to limit of the oldest free requests, plus any the caller already holds.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        staff_id (int): The instructor or admin claiming.
+        course_ids (list, optional): Only claim requests for these courses. Defaults to all courses.
+        limit (int, optional): New requests to claim. Defaults to 5.
+    Returns:
+        list: (recheck_id, sender_id, student name, course_id, course title, exam_type, reason, created_at).
+    """
+    params = dict(_course_filter(course_ids), staff=staff_id, timeout=CLAIM_TIMEOUT, limit=limit)
+    with unit_of_work(conn):
+        cursor.execute(
+            f"""WITH next AS (
+                SELECT recheck_id FROM rechecking
+                WHERE status = 'pending' AND {_free()}
+                    AND (%(all)s OR course_id = ANY(%(courses)s))
+                ORDER BY created_at, recheck_id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE rechecking r SET claimed_by = %(staff)s, claimed_at = CURRENT_TIMESTAMP
+            FROM next WHERE r.recheck_id = next.recheck_id""",
+            params,
+        )
+        metrics.increment("rechecking_claims", cursor.rowcount)
+        return held_requests(cursor, staff_id)
+
+
+def held_requests(cursor, staff_id):
+    """Return the pending requests staff_id holds a live claim on, oldest first."""
+    cursor.execute(
+        """SELECT r.recheck_id, r.sender_id, u.name, r.course_id, c.title, r.exam_type, r.reason, r.created_at
+        FROM rechecking r
+        JOIN Users u ON u.user_id = r.sender_id
+        JOIN Courses c ON c.course_id = r.course_id
+        WHERE r.status = 'pending' AND r.claimed_by = %(staff)s
+            AND r.claimed_at >= CURRENT_TIMESTAMP - %(timeout)s::interval
+        ORDER BY r.created_at, r.recheck_id""",
+        {"staff": staff_id, "timeout": CLAIM_TIMEOUT},
+    )
+    return cursor.fetchall()
+
+
+def release_requests(conn, cursor, staff_id, recheck_ids=None):
+    """Put claimed requests back in the queue, or all of staff_id's claims if recheck_ids is None."""
+    with unit_of_work(conn):
+        cursor.execute(
+            """UPDATE rechecking SET claimed_by = NULL, claimed_at = NULL
+            WHERE status = 'pending' AND claimed_by = %(staff)s AND (%(all)s OR recheck_id = ANY(%(ids)s))""",
+            {"staff": staff_id, "all": recheck_ids is None, "ids": list(recheck_ids or [])},
+        )
+        return cursor.rowcount
+
+
+def decide_request(conn, cursor, staff_id, recheck_id, status, note=None):
+    """Approve or reject a request the caller has claimed.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        staff_id (int): The instructor or admin deciding. Must hold the claim.
+        recheck_id (int): The request.
+        status (str): 'approved' or 'rejected'.
+        note (str, optional): Shown to whoever looks at the request later.
+    Returns:
+        float: Seconds between the claim and the decision.
+    Raises:
+        ClaimLostError: If the claim expired and someone else took the request, or it was already decided.
+    """
+    if status not in DECISIONS:
+        raise ValueError(f"status must be one of {DECISIONS}")
+    with unit_of_work(conn):
+        cursor.execute(
+            """UPDATE rechecking
+            SET status = %(status)s, decided_by = %(staff)s, decided_at = CURRENT_TIMESTAMP, decision_note = %(note)s
+            WHERE recheck_id = %(id)s AND status = 'pending' AND claimed_by = %(staff)s
+            RETURNING EXTRACT(EPOCH FROM decided_at - claimed_at)""",
+            {"status": status, "staff": staff_id, "note": note or None, "id": recheck_id},
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise ClaimLostError(f"Request {recheck_id} is no longer claimed by you.")
+    # Reviews take minutes, past the latency histogram's buckets, so the total is
+    # counted instead; divided by the decision count it gives the mean.
+    metrics.increment(f"rechecking_{status}")
+    metrics.increment("rechecking_processing_seconds", float(row[0]))
+    return float(row[0])
+
+
+def queue_stats(cursor, course_ids=None):
+    """Return per-course queue figures, busiest course first.
+
+    Returns:
+        list: (course_id, title, pending, claimed, oldest pending age in seconds,
+        decided in the last STATS_WINDOW, median seconds from claim to decision
+        over the same window).
+    """
+    cursor.execute(
+        f"""SELECT c.course_id, c.title,
+            COUNT(*) FILTER (WHERE r.status = 'pending'),
+            COUNT(*) FILTER (WHERE r.status = 'pending' AND NOT {_free("r.")}),
+            EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - MIN(r.created_at) FILTER (WHERE r.status = 'pending')),
+            COUNT(*) FILTER (WHERE r.decided_at IS NOT NULL),
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM r.decided_at - r.claimed_at))
+        FROM rechecking r
+        JOIN Courses c ON c.course_id = r.course_id
+        WHERE (r.status = 'pending' OR r.decided_at >= CURRENT_TIMESTAMP - %(window)s::interval)
+            AND (%(all)s OR r.course_id = ANY(%(courses)s))
+        GROUP BY c.course_id, c.title
+        ORDER BY 3 DESC, c.course_id""",
+        dict(_course_filter(course_ids), timeout=CLAIM_TIMEOUT, window=STATS_WINDOW),
+    )
+    return cursor.fetchall()
+
+
+def format_seconds(seconds):
+    """Return a duration as e.g. '3d 4h', '12m' or '-' for None."""
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    if seconds >= 86400:
+        return f"{seconds // 86400}d {seconds % 86400 // 3600}h"
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+    return f"{seconds // 60}m"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("stats",))
+    parser.add_argument("--course", type=int, action="append", help="Only this course_id. May be repeated.")
+    args = parser.parse_args()
+
+    from Project import close_db, connect_db
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        with unit_of_work(conn, readonly=True):
+            rows = queue_stats(cursor, args.course)
+    finally:
+        close_db(conn, cursor)
+    print(f"{'Course':<40} {'Pending':>8} {'Claimed':>8} {'Oldest':>8} {'Decided':>8} {'Median':>8}")
+    for course_id, title, pending, claimed, oldest, decided, median in rows:
+        print(
+            f"{f'{title} ({course_id})'[:40]:<40} {pending:>8} {claimed:>8} {format_seconds(oldest):>8}"
+            f" {decided:>8} {format_seconds(median):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
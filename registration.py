@@ -0,0 +1,230 @@
+"""Course registration with seat allocation.
+
+Requests are allocated one course at a time, each in its own transaction that
+holds the course row locked, so seats for different courses are handed out in
+parallel while a course can never be overfilled. A request is enrolled if the
+student has passed every prerequisite, is not already registered for the
+course this semester and a seat is left; otherwise it is rejected with a
+reason.
+
+During registration week requests can be queued in registration_requests
+and drained by several workers. Each worker claims a course with
+FOR NO KEY UPDATE SKIP LOCKED, so workers never wait on each other.
+
+Usage:
+    python registration.py worker --workers 4
+    python registration.py worker --once
+"""
+
+import argparse
+import logging
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+from prerequisites import passed_courses, prerequisite_graph
+
+logger = logging.getLogger("lms.registration")
+
+
+def _allocate(cursor, course, requests, graph):
+    """Decide a batch of requests for one course whose row the caller has locked.
+
+    Args:
+        cursor : The database cursor object.
+        course (tuple): (course_id, capacity, semester).
+        requests (list): (key, user_id) pairs in the order seats are handed out.
+        graph (PrerequisiteGraph): A refreshed prerequisite graph.
+    Returns:
+        list: (key, user_id, status, reason) for every request.
+    """
+    course_id, capacity, semester = course
+    if semester is None:
+        return [(key, user_id, "rejected", "Course has no semester") for key, user_id in requests]
+
+    user_ids = sorted({user_id for _, user_id in requests})
+    cursor.execute(
+        """SELECT user_id FROM Registrations
+        WHERE course_id = %s AND semester = %s AND user_id = ANY(%s) AND status <> 'dropped'""",
+        (course_id, semester, user_ids),
+    )
+    registered = {user_id for (user_id,) in cursor.fetchall()}
+    cursor.execute(
+        "SELECT COUNT(*) FROM Registrations WHERE course_id = %s AND semester = %s AND status = 'enrolled'",
+        (course_id, semester),
+    )
+    seats = None if capacity is None else capacity - cursor.fetchone()[0]
+    passed = passed_courses(cursor, user_ids)
+
+    decisions = []
+    enrolled = []
+    for key, user_id in requests:
+        missing = graph.missing_prerequisites(passed.get(user_id, ()), course_id)
+        if user_id in registered:
+            decisions.append((key, user_id, "rejected", "Already registered"))
+        elif graph.in_cycle(course_id):
+            decisions.append((key, user_id, "rejected", "Course has circular prerequisites"))
+        elif missing:
+            reason = "Missing prerequisites: " + ", ".join(map(str, sorted(missing)))
+            decisions.append((key, user_id, "rejected", reason))
+        elif seats is not None and seats <= 0:
+            decisions.append((key, user_id, "rejected", "Course is full"))
+        else:
+            registered.add(user_id)
+            enrolled.append((user_id, course_id, "enrolled", semester))
+            if seats is not None:
+                seats -= 1
+            decisions.append((key, user_id, "enrolled", None))
+
+    if enrolled:
+        execute_values(
+            cursor,
+            "INSERT INTO Registrations (user_id, course_id, status, semester) VALUES %s",
+            enrolled,
+        )
+    return decisions
+
+
+def register_batch(conn, cursor, requests):
+    """Allocate seats for a batch of (user_id, course_id) requests.
+
+    Each course is handled in its own transaction, in course_id order so two
+    batches never deadlock on each other.
+
+    Args:
+        conn : The database connection object.
+        cursor : The database cursor object.
+        requests (list): (user_id, course_id) pairs, earliest first.
+    Returns:
+        list: (user_id, course_id, status, reason) for every request.
+    """
+    graph = prerequisite_graph.refresh(conn, cursor)
+    by_course = {}
+    for index, (user_id, course_id) in enumerate(requests):
+        by_course.setdefault(course_id, []).append((index, user_id))
+
+    results = [None] * len(requests)
+    for course_id in sorted(by_course):
+        try:
+            cursor.execute(
+                "SELECT course_id, capacity, semester FROM Courses WHERE course_id = %s FOR NO KEY UPDATE",
+                (course_id,),
+            )
+            course = cursor.fetchone()
+            if course is None:
+                decisions = [(i, u, "rejected", "No such course") for i, u in by_course[course_id]]
+            else:
+                decisions = _allocate(cursor, course, by_course[course_id], graph)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            decisions = [(i, u, "rejected", f"Error: {e}") for i, u in by_course[course_id]]
+        for index, user_id, status, reason in decisions:
+            results[index] = (user_id, course_id, status, reason)
+    return results
+
+
+def queue_requests(conn, cursor, requests):
+    """Queue (user_id, course_id) requests for the registration workers."""
+    execute_values(cursor, "INSERT INTO registration_requests (user_id, course_id) VALUES %s", list(requests))
+    conn.commit()
+
+
+def process_queue(conn, cursor, batch_size=500):
+    """Allocate one batch of queued requests for one course.
+
+    The course is claimed with SKIP LOCKED, so concurrent workers each pick a
+    different course instead of queueing behind the same lock.
+
+    Returns:
+        int: The number of requests decided, 0 if the queue is empty.
+    """
+    graph = prerequisite_graph.refresh(conn, cursor)
+    try:
+        cursor.execute(
+            """SELECT c.course_id, c.capacity, c.semester FROM Courses c
+            WHERE EXISTS (
+                SELECT 1 FROM registration_requests q
+                WHERE q.course_id = c.course_id AND q.status = 'pending'
+            )
+            LIMIT 1
+            FOR NO KEY UPDATE OF c SKIP LOCKED"""
+        )
+        course = cursor.fetchone()
+        if course is None:
+            conn.commit()
+            return 0
+        cursor.execute(
+            """SELECT request_id, user_id FROM registration_requests
+            WHERE course_id = %s AND status = 'pending'
+            ORDER BY request_id
+            LIMIT %s""",
+            (course[0], batch_size),
+        )
+        decisions = _allocate(cursor, course, cursor.fetchall(), graph)
+        execute_values(
+            cursor,
+            """UPDATE registration_requests q
+            SET status = d.status, reason = d.reason, processed_at = CURRENT_TIMESTAMP
+            FROM (VALUES %s) AS d (request_id, status, reason)
+            WHERE q.request_id = d.request_id""",
+            [(key, status, reason) for key, _, status, reason in decisions],
+            template="(%s::bigint, %s, %s)",
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(decisions)
+
+
+def run_worker(stop, batch_size=500, idle_seconds=1.0, once=False):
+    from Project import open_connection
+
+    try:
+        conn, cursor = open_connection()
+    except Exception as e:
+        logger.warning("Registration worker cannot connect: %s", e)
+        return
+    try:
+        while not stop.is_set():
+            try:
+                if process_queue(conn, cursor, batch_size):
+                    continue
+            except Exception as e:
+                logger.warning("Allocating registration requests failed: %s", e)
+            if once:
+                break
+            stop.wait(idle_seconds)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("worker",))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty.")
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=run_worker, args=(stop, args.batch_size, 1.0, args.once))
+        for _ in range(args.workers)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        stop.set()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Append-only change log for Results.
+
+Every insert, update and delete on Results adds one row per changed Results
+row to results_changes, with the row before and after the change, who made it
+and when. Statement-level triggers with transition tables write the log, so
+grading a whole course adds its rows with one INSERT ... SELECT rather than
+one trigger call per student. Updates that leave a row as it was, such as
+regrading with unchanged grades, are not logged.
+
+The actor is the lms.actor setting of the writing session, which the app sets
+at login to '<role>:<user_id>'. Sessions that never set it are logged under
+their database user.
+
+Incremental consumers read the log in (txid, change_id) order with
+changes_since() and keep the last position they saw. Only transactions older
+than every transaction still running are returned, so a transaction that
+commits late can never slip in behind a position a consumer has passed.
+
+Usage:
+    python results_changes.py export --state results_changes.pos --output changes.jsonl
+"""
+
+import argparse
+import json
+import os
+
+from transactions import create_statement_triggers, unit_of_work
+
+BATCH_SIZE = 1000
+
+# change_txid belongs to the local replica's bookkeeping and moves on every write.
+_ROW = "to_jsonb({}) - 'change_txid'"
+
+LOG_SCRIPT = """CREATE TABLE IF NOT EXISTS results_changes (
+    change_id BIGSERIAL PRIMARY KEY,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    actor TEXT NOT NULL,
+    operation CHAR(1) NOT NULL CHECK (operation IN ('I', 'U', 'D')),
+    result_id INT NOT NULL,
+    user_id INT NOT NULL,
+    course_id INT NOT NULL,
+    old_values JSONB,
+    new_values JSONB
+);
+CREATE INDEX IF NOT EXISTS results_changes_txid_idx ON results_changes (txid, change_id);
+CREATE INDEX IF NOT EXISTS results_changes_student_idx ON results_changes (user_id, course_id, change_id);
+"""
+
+# No foreign keys: the log outlives the Results rows, students and courses it describes.
+TRIGGER_FUNCTION_SCRIPT = f"""CREATE OR REPLACE FUNCTION log_results_changes() RETURNS trigger AS $$
+DECLARE
+    v_actor TEXT := COALESCE(NULLIF(current_setting('lms.actor', true), ''), session_user);
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO results_changes (actor, operation, result_id, user_id, course_id, new_values)
+        SELECT v_actor, 'I', n.result_id, n.user_id, n.course_id, {_ROW.format("n")}
+        FROM new_rows n ORDER BY n.result_id;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO results_changes (actor, operation, result_id, user_id, course_id, old_values)
+        SELECT v_actor, 'D', o.result_id, o.user_id, o.course_id, {_ROW.format("o")}
+        FROM old_rows o ORDER BY o.result_id;
+    ELSE
+        INSERT INTO results_changes (actor, operation, result_id, user_id, course_id, old_values, new_values)
+        SELECT v_actor, 'U', n.result_id, n.user_id, n.course_id, {_ROW.format("o")}, {_ROW.format("n")}
+        FROM old_rows o JOIN new_rows n ON n.result_id = o.result_id
+        WHERE {_ROW.format("o")} IS DISTINCT FROM {_ROW.format("n")}
+        ORDER BY n.result_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;"""
+
+CHANGE_COLUMNS = (
+    "change_id, txid, changed_at, actor, operation, result_id, user_id, course_id, old_values, new_values"
+)
+
+
+def create_results_changes(conn, cursor):
+    """Create results_changes and the triggers that write it."""
+    with unit_of_work(conn):
+        cursor.execute(LOG_SCRIPT)
+        cursor.execute(TRIGGER_FUNCTION_SCRIPT)
+        create_statement_triggers(cursor, "Results", "log_results_changes", "results_changes")
+
+
+def set_actor(conn, cursor, actor):
+    """Record actor against every Results change this session makes from now on; None clears it."""
+    with unit_of_work(conn):
+        cursor.execute("SELECT set_config('lms.actor', %s, false)", (actor or "",))
+
+
+def changes_since(cursor, after=(0, 0), limit=BATCH_SIZE):
+    """Return the next changes after a position, oldest first.
+
+    Args:
+        cursor : The database cursor object.
+        after (tuple, optional): (txid, change_id) of the last change already seen. Defaults to the start.
+        limit (int, optional): Most changes to return. Defaults to BATCH_SIZE.
+    Returns:
+        tuple: (changes, position). changes are (change_id, txid, changed_at, actor, operation,
+        result_id, user_id, course_id, old_values, new_values); position is what to pass as
+        after next time, and equals after when there was nothing new.
+    """
+    cursor.execute(
+        f"""SELECT {CHANGE_COLUMNS} FROM results_changes
+        WHERE (txid, change_id) > (%s, %s)
+            AND txid < txid_snapshot_xmin(txid_current_snapshot())
+        ORDER BY txid, change_id
+        LIMIT %s""",
+        (after[0], after[1], limit),
+    )
+    changes = cursor.fetchall()
+    if not changes:
+        return changes, tuple(after)
+    return changes, (changes[-1][1], changes[-1][0])
+
+
+def marks_history(cursor, user_id, course_id):
+    """Return every change to a student's Results row for a course, oldest first."""
+    cursor.execute(
+        f"""SELECT {CHANGE_COLUMNS} FROM results_changes
+        WHERE user_id = %s AND course_id = %s
+        ORDER BY change_id""",
+        (user_id, course_id),
+    )
+    return cursor.fetchall()
+
+
+def describe_change(operation, old_values, new_values, columns=None):
+    """Return a change as e.g. 'midterm 40 -> 45, grade C -> B'.
+
+    Args:
+        operation (str): 'I', 'U' or 'D'.
+        old_values (dict): The row before the change, or None.
+        new_values (dict): The row after the change, or None.
+        columns (list, optional): Only describe these columns. Defaults to all but the keys.
+    """
+    old_values = old_values or {}
+    new_values = new_values or {}
+    if columns is None:
+        columns = [c for c in (new_values or old_values) if c not in ("result_id", "user_id", "course_id", "version")]
+    if operation == "I":
+        return "created: " + ", ".join(f"{c} {new_values.get(c)}" for c in columns)
+    if operation == "D":
+        return "deleted: " + ", ".join(f"{c} {old_values.get(c)}" for c in columns)
+    return ", ".join(
+        f"{c} {old_values.get(c)} -> {new_values.get(c)}" for c in columns if old_values.get(c) != new_values.get(c)
+    )
+
+
+def _read_position(path):
+    try:
+        with open(path) as f:
+            txid, change_id = f.read().split()
+            return int(txid), int(change_id)
+    except FileNotFoundError:
+        return 0, 0
+
+
+def _write_position(path, position):
+    # Replaced in one step, so a crash leaves either the old or the new position.
+    with open(path + ".tmp", "w") as f:
+        f.write(f"{position[0]} {position[1]}\n")
+    os.replace(path + ".tmp", path)
+
+
+def export(cursor, state, output, batch_size=BATCH_SIZE):
+    """Append the changes since the position saved in state to output as JSON lines.
+
+    The position is saved after each batch is written, so an interrupted export
+    resumes where it stopped; a batch may be written twice, never skipped.
+
+    Returns:
+        int: The number of changes written.
+    """
+    position = _read_position(state)
+    total = 0
+    with open(output, "a") as out:
+        while True:
+            changes, position = changes_since(cursor, position, batch_size)
+            for row in changes:
+                record = dict(zip((c.strip() for c in CHANGE_COLUMNS.split(",")), row))
+                record["changed_at"] = record["changed_at"].isoformat()
+                out.write(json.dumps(record) + "\n")
+            out.flush()
+            _write_position(state, position)
+            total += len(changes)
+            if len(changes) < batch_size:
+                return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("export",))
+    parser.add_argument("--state", required=True, help="File holding the last exported position.")
+    parser.add_argument("--output", required=True, help="JSON lines file to append changes to.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    from Project import close_db, connect_db
+
+    conn, cursor = connect_db()
+    if not conn:
+        raise SystemExit(1)
+    try:
+        # Each batch reads in its own short transaction, so xmin can move on between batches.
+        conn.autocommit = True
+        print(f"Exported {export(cursor, args.state, args.output, args.batch_size)} change(s).")
+    finally:
+        close_db(conn, cursor)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Unit-of-work transactions.
+
+execute_query() commits after every statement. Inside a unit of work it
+leaves the commit to the unit instead, so a multi-step operation runs as one
+transaction: it commits once at the end, or rolls back as a whole if any step
+fails. That saves a WAL flush and a round trip per statement.
+
+    with unit_of_work(conn):
+        execute_query(conn, cursor, ...)
+        execute_query(conn, cursor, ...)
+
+Read-only units run in READ ONLY transactions, at REPEATABLE READ by default
+so that all their reads see one snapshot. Units nest: an inner unit joins the
+outer one, and only the outermost one commits.
+
+Commits, rollbacks and the commits saved by grouping statements are counted
+in query_metrics.metrics.
+
+create_statement_triggers() installs the statement-level triggers that the
+Results and feedback summaries use.
+"""
+
+import contextlib
+import threading
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from query_metrics import metrics
+
+_active = threading.local()
+
+
+class UnitOfWork:
+    """The transaction a `with unit_of_work(conn):` block runs in."""
+
+    def __init__(self, conn, readonly):
+        self.conn = conn
+        self.readonly = readonly
+        self.statements = 0
+
+
+def current_unit(conn):
+    """Return the unit of work conn is in on this thread, or None."""
+    return getattr(_active, "units", {}).get(id(conn))
+
+
+@contextlib.contextmanager
+def unit_of_work(conn, readonly=False, isolation=None):
+    """Run the block in one transaction that commits when it exits.
+
+    Args:
+        conn : The database connection object.
+        readonly (bool, optional): Run in a READ ONLY transaction. Defaults to False.
+        isolation (str, optional): 'READ COMMITTED', 'REPEATABLE READ' or 'SERIALIZABLE'.
+            Defaults to REPEATABLE READ for read-only units and the connection's default otherwise.
+    Yields:
+        UnitOfWork: The unit, or the enclosing one when nested.
+    """
+    units = _active.__dict__.setdefault("units", {})
+    outer = units.get(id(conn))
+    if outer is not None:
+        if outer.readonly and not readonly:
+            raise ValueError("Cannot start a read-write unit of work inside a read-only one.")
+        yield outer
+        return
+
+    if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+        # A statement run outside any unit left a transaction open; finish it as
+        # execute_query would have, so the settings below can apply.
+        conn.commit()
+        metrics.increment("db_commits")
+    if isolation is None and readonly:
+        isolation = "REPEATABLE READ"
+    previous = (conn.isolation_level, conn.readonly)
+    # set_session takes effect on the next BEGIN, so it costs no round trip.
+    conn.set_session(isolation_level=isolation or "DEFAULT", readonly=readonly)
+    unit = units[id(conn)] = UnitOfWork(conn, readonly)
+    try:
+        yield unit
+        conn.commit()
+        metrics.increment("db_commits")
+        metrics.increment("unit_of_work_commits")
+    except BaseException:
+        conn.rollback()
+        metrics.increment("db_rollbacks")
+        raise
+    finally:
+        del units[id(conn)]
+        # None means "server default" when read back, but "unchanged" when passed in.
+        conn.set_session(
+            isolation_level="DEFAULT" if previous[0] is None else previous[0],
+            readonly="DEFAULT" if previous[1] is None else previous[1],
+        )
+
+
+# Transition tables need one trigger per event.
+_STATEMENT_TRIGGERS = {
+    "insert": "AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows",
+    "update": "AFTER UPDATE ON {table} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "delete": "AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows",
+}
+
+
+def create_statement_triggers(cursor, table, function, prefix):
+    """(Re)create insert, update and delete statement triggers on table that call function.
+
+    The function sees the changed rows as new_rows and old_rows. The triggers
+    are named <prefix>_insert, <prefix>_update and <prefix>_delete.
+    """
+    for event, timing in _STATEMENT_TRIGGERS.items():
+        name = f"{prefix}_{event}"
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+        cursor.execute(
+            f"CREATE TRIGGER {name} {timing.format(table=table)} FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+        )
@@ -0,0 +1,198 @@
+"""Tk event-loop stall detector and UI latency profiler.
+
+When enabled, every Tk callback is timed and its time is split into
+database (traced statements), widget (Tk calls and idle layout) and Python
+phases. Callbacks that hold the main loop for longer than the stall limit are
+flagged, and the main thread's stack is captured while it is still stuck. A
+session report is written as JSON when the application exits.
+
+Enable with `python Project.py --profile-ui` or LMS_PROFILE_UI=1.
+
+Settings (environment variables):
+    LMS_UI_STALL_MS: Stall limit in milliseconds. Defaults to 100.
+    LMS_UI_PROFILE_REPORT: Where to write the report. Defaults to ui_profile.json.
+"""
+
+import atexit
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import tkinter
+import traceback
+
+from query_metrics import db_seconds
+
+
+def callback_name(func):
+    """Return a readable name for a Tk callback, e.g. 'LMSApp.view_feedback'."""
+    name = getattr(func, "__qualname__", None) or getattr(func, "__name__", None) or repr(func)
+    return name.replace(".<locals>", "")
+
+
+class _TimedTkApp:
+    """Wraps the Tcl interpreter so that time spent in Tk calls is counted."""
+
+    def __init__(self, app, profiler):
+        self._app = app
+        self._profiler = profiler
+
+    def call(self, *args):
+        start = time.perf_counter()
+        try:
+            return self._app.call(*args)
+        finally:
+            self._profiler.tk_seconds += time.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self._app, name)
+
+
+class UIProfiler:
+    """Times Tk callbacks on the main loop and records stalls.
+
+    Args:
+        root : The Tk root window. Install the profiler before building any widgets.
+        stall_ms (float, optional): Callbacks longer than this are stalls. Defaults to 100.
+        report_path (str, optional): Where write_report() saves the session report.
+    """
+
+    def __init__(self, root, stall_ms=100, report_path="ui_profile.json"):
+        self.root = root
+        self.stall = stall_ms / 1000
+        self.report_path = report_path
+        self.started_at = datetime.datetime.now()
+        self.main_thread = threading.get_ident()
+        self.callbacks = {}
+        self.stalls = []
+        self.tk_seconds = 0.0
+        self.depth = 0
+        self.current = None  # (name, start, stall entry) of the running callback
+        self.stop_event = threading.Event()
+
+    def install(self):
+        profiler = self
+
+        class ProfilingCallWrapper(tkinter.CallWrapper):
+            def __call__(self, *args):
+                if profiler.depth:
+                    return super().__call__(*args)
+                profiler.begin(callback_name(self.func))
+                try:
+                    return super().__call__(*args)
+                finally:
+                    profiler.end()
+
+        tkinter.CallWrapper = ProfilingCallWrapper
+        self.root.tk = _TimedTkApp(self.root.tk, self)
+        threading.Thread(target=self._watchdog, daemon=True).start()
+        atexit.register(self.write_report)
+        return self
+
+    def begin(self, name):
+        self.depth += 1
+        self.phase_start = (time.perf_counter(), db_seconds(), self.tk_seconds)
+        self.current = [name, self.phase_start[0], None]
+
+    def end(self):
+        # Run the pending geometry work now so it is charged to this callback.
+        layout_start = time.perf_counter()
+        tk_before = self.tk_seconds
+        try:
+            self.root.update_idletasks()
+        except tkinter.TclError:
+            pass  # the window was destroyed by the callback
+        layout = time.perf_counter() - layout_start
+        self.tk_seconds = tk_before
+
+        start, db_start, tk_start = self.phase_start
+        name, _, stall = self.current
+        total = time.perf_counter() - start
+        db = db_seconds() - db_start
+        widget = (self.tk_seconds - tk_start) + layout
+        python = max(0.0, total - db - widget)
+        self.current = None
+        self.depth -= 1
+
+        stats = self.callbacks.setdefault(
+            name, {"calls": 0, "durations": [], "db": 0.0, "widget": 0.0, "python": 0.0}
+        )
+        stats["calls"] += 1
+        stats["durations"].append(total)
+        stats["db"] += db
+        stats["widget"] += widget
+        stats["python"] += python
+
+        if total >= self.stall:
+            if stall is None:
+                stall = {"callback": name, "stack": None}
+                self.stalls.append(stall)
+            stall.update(
+                duration_ms=total * 1000,
+                db_ms=db * 1000,
+                widget_ms=widget * 1000,
+                python_ms=python * 1000,
+                at=datetime.datetime.now().isoformat(),
+            )
+
+    def _watchdog(self):
+        interval = max(self.stall / 4, 0.005)
+        while not self.stop_event.wait(interval):
+            current = self.current
+            if not current or current[2] is not None:
+                continue
+            name, start, _ = current
+            if time.perf_counter() - start < self.stall:
+                continue
+            frame = sys._current_frames().get(self.main_thread)
+            stall = {
+                "callback": name,
+                "stack": traceback.format_stack(frame) if frame else None,
+            }
+            current[2] = stall
+            self.stalls.append(stall)
+
+    def report(self):
+        callbacks = {}
+        for name, stats in self.callbacks.items():
+            durations = sorted(stats["durations"])
+            total = sum(durations)
+            callbacks[name] = {
+                "calls": stats["calls"],
+                "total_ms": total * 1000,
+                "mean_ms": total / len(durations) * 1000,
+                "p95_ms": durations[min(len(durations) - 1, int(0.95 * len(durations)))] * 1000,
+                "max_ms": durations[-1] * 1000,
+                "db_ms": stats["db"] * 1000,
+                "widget_ms": stats["widget"] * 1000,
+                "python_ms": stats["python"] * 1000,
+            }
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.datetime.now().isoformat(),
+            "stall_limit_ms": self.stall * 1000,
+            # Worst handlers first: these are the ones to fix.
+            "callbacks": dict(sorted(callbacks.items(), key=lambda item: -item[1]["total_ms"])),
+            "stalls": [s for s in self.stalls if "duration_ms" in s],
+        }
+
+    def write_report(self):
+        self.stop_event.set()
+        with open(self.report_path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def profiling_requested(argv=None):
+    argv = sys.argv if argv is None else argv
+    return "--profile-ui" in argv or os.environ.get("LMS_PROFILE_UI") == "1"
+
+
+def install_from_env(root):
+    """Install a UIProfiler on root using the LMS_UI_* settings."""
+    return UIProfiler(
+        root,
+        stall_ms=float(os.environ.get("LMS_UI_STALL_MS", 100)),
+        report_path=os.environ.get("LMS_UI_PROFILE_REPORT", "ui_profile.json"),
+    ).install()